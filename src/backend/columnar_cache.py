@@ -0,0 +1,278 @@
+"""
+Columnar Cache - Bản Parquet của cleaned_dataset.csv
+- Cột đã có kiểu (float, int, season dạng dictionary) và index Datetime gốc,
+  không phải parse lại chuỗi ngày giờ mỗi lần load
+- Chỉ đọc các cột được yêu cầu (column projection)
+- Mỗi row group là một tháng; min/max Datetime trong metadata là chỉ mục thời
+  gian, nên đọc "24h gần nhất" hay "tháng này" chỉ chạm vài row group
+- Cache cũ hơn CSV bị coi là stale -> load_dataset quay về đọc CSV và ghi lại cache
+Không phụ thuộc Streamlit để clean_data.py / train_build.py cũng dùng được.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.backend.feature_engine import compact_dtypes
+
+INDEX_COLUMN = 'Datetime'
+# to_csv ghi DatetimeIndex dạng ISO; báo trước để pandas bỏ bước đoán định dạng
+INDEX_FORMAT = 'ISO8601'
+
+
+def cache_path_for(csv_path):
+    """cleaned_dataset.csv -> cleaned_dataset.parquet (cùng thư mục)"""
+    root, _ = os.path.splitext(csv_path)
+    return root + ".parquet"
+
+
+def is_fresh(csv_path, cache_path=None):
+    """Cache tồn tại và không cũ hơn CSV (nếu không có CSV thì cache là nguồn duy nhất)"""
+    cache_path = cache_path or cache_path_for(csv_path)
+    if not os.path.exists(cache_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(cache_path) >= os.path.getmtime(csv_path)
+
+
+def read_csv_typed(csv_path, nrows=None):
+    """Đọc cleaned CSV theo cách chậm (fallback): parse Datetime và set index"""
+    df = pd.read_csv(csv_path, nrows=nrows)
+    if INDEX_COLUMN in df.columns:
+        df[INDEX_COLUMN] = pd.to_datetime(df[INDEX_COLUMN], format=INDEX_FORMAT)
+        df = df.set_index(INDEX_COLUMN)
+    return df
+
+
+def _month_slices(index):
+    """Cắt index Datetime (đã sort) thành các đoạn liên tiếp theo tháng"""
+    if len(index) == 0:
+        return [slice(0, 0)]
+    month_id = index.year.values * 12 + index.month.values
+    bounds = np.flatnonzero(np.diff(month_id)) + 1
+    edges = np.concatenate([[0], bounds, [len(index)]])
+    return [slice(a, b) for a, b in zip(edges[:-1], edges[1:])]
+
+
+class ColumnarCacheWriter:
+    """
+    Ghi cache theo từng phần (streaming): dữ liệu được gom theo tháng, mỗi tháng
+    thành một row group. File tạm chỉ được os.replace sang `cache_path` khi close(),
+    reader không bao giờ thấy file dở. Các phần phải theo thứ tự thời gian.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        directory = os.path.dirname(os.path.abspath(cache_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix=".cache-", suffix=".parquet")
+        os.close(fd)
+        self._writer = None
+        self._schema = None
+        self._buffer = []
+        self._month = None
+        self.rows = 0
+
+    def write(self, df, split_by_month=True):
+        if len(df) == 0:
+            return
+        if not split_by_month:
+            self._flush()
+            self._write_group([self._to_table(df)])
+            return
+        for part in _month_slices(df.index):
+            chunk = df.iloc[part]
+            month = (chunk.index[0].year, chunk.index[0].month)
+            if month != self._month:
+                self._flush()
+                self._month = month
+            self._buffer.append(self._to_table(chunk))
+
+    def write_table(self, table):
+        """Ghi nguyên một row group Arrow (ví dụ chép từ cache cũ, đã là một tháng trọn)"""
+        if table.num_rows == 0:
+            return
+        self._flush()
+        self._month = None
+        if self._schema is None:
+            self._schema = table.schema
+        self._write_group([table])
+
+    def _to_table(self, df):
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=True)
+        if self._schema is None:
+            self._schema = table.schema
+        return table
+
+    def _flush(self):
+        if self._buffer:
+            self._write_group(self._buffer)
+            self._buffer = []
+
+    def _write_group(self, tables):
+        table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._tmp_path, table.schema, compression='snappy')
+        self._writer.write_table(table, row_group_size=max(1, table.num_rows))
+        self.rows += table.num_rows
+
+    def close(self):
+        self._flush()
+        if self._writer is None:
+            self.abort()
+            return None
+        self._writer.close()
+        os.replace(self._tmp_path, self.cache_path)
+        return self.cache_path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_columnar_cache(df, cache_path):
+    """
+    Ghi DataFrame (index Datetime) ra Parquet, mỗi tháng một row group,
+    một cách atomic: ghi file tạm rồi os.replace, reader không bao giờ thấy file dở.
+    """
+    split = isinstance(df.index, pd.DatetimeIndex) and df.index.is_monotonic_increasing
+    with ColumnarCacheWriter(cache_path) as writer:
+        writer.write(df, split_by_month=split)
+    return cache_path
+
+
+def build_from_csv(csv_path, cache_path=None):
+    """Parse CSV một lần rồi ghi cache; trả về DataFrame đầy đủ"""
+    cache_path = cache_path or cache_path_for(csv_path)
+    df = compact_dtypes(read_csv_typed(csv_path))
+    write_columnar_cache(df, cache_path)
+    print(f"💾 Đã ghi columnar cache: {cache_path} ({len(df):,} dòng)")
+    return df
+
+
+def time_index(cache_path):
+    """
+    Chỉ mục thời gian từ metadata (không đọc dữ liệu):
+    list (row_group, min_time, max_time, num_rows), hoặc None nếu không dùng được
+    (không có cột Datetime, ví dụ cache ghi từ index không tên) -> caller đọc hết
+    """
+    metadata = pq.ParquetFile(cache_path).metadata
+    if INDEX_COLUMN not in metadata.schema.names:
+        return None
+    position = metadata.schema.names.index(INDEX_COLUMN)
+    entries = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        stats = row_group.column(position).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        entries.append((i, pd.Timestamp(stats.min), pd.Timestamp(stats.max), row_group.num_rows))
+    return entries
+
+
+def resolve_range(start=None, end=None, last=None, data_end=None):
+    """
+    Chuẩn hóa khoảng thời gian. `last` ('24h', '7D', Timedelta...) tính ngược từ
+    `end` (hoặc mốc cuối của dữ liệu) và loại trừ đầu trái, giống tail(n phút).
+    Trả về (start, end, start_inclusive).
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    if last is not None:
+        anchor = end if end is not None else data_end
+        if anchor is not None:
+            return anchor - pd.Timedelta(last), anchor, False
+    return start, end, True
+
+
+def _slice_frame(df, start, end, start_inclusive=True):
+    """Lọc DataFrame theo index thời gian (đã sort)"""
+    if start is not None:
+        side = 'left' if start_inclusive else 'right'
+        df = df.iloc[df.index.searchsorted(start, side=side):]
+    if end is not None:
+        df = df.iloc[:df.index.searchsorted(end, side='right')]
+    return df
+
+
+def select_range(df, start=None, end=None, last=None):
+    """Lọc DataFrame đã nằm trong RAM theo cùng quy ước start/end/last"""
+    if start is None and end is None and last is None:
+        return df
+    start, end, inclusive = resolve_range(start, end, last, df.index.max() if len(df) else None)
+    return _slice_frame(df, start, end, inclusive)
+
+
+def read_columnar(cache_path, columns=None, start=None, end=None, last=None):
+    """
+    Đọc cache, chỉ các cột `columns` (None = tất cả) và chỉ các row group giao với
+    khoảng [start, end] (hoặc `last` tính từ cuối dữ liệu). Index Datetime luôn được giữ.
+    """
+    parquet_file = pq.ParquetFile(cache_path)
+    if columns is not None:
+        available = parquet_file.schema_arrow.names
+        columns = [c for c in columns if c in available and c != INDEX_COLUMN]
+
+    if start is None and end is None and last is None:
+        return parquet_file.read(columns=columns, use_pandas_metadata=True).to_pandas()
+
+    index = time_index(cache_path)
+    if index is None:
+        # Không có thống kê -> đọc hết rồi lọc
+        df = parquet_file.read(columns=columns, use_pandas_metadata=True).to_pandas()
+        return select_range(df, start, end, last)
+
+    data_end = max((entry[2] for entry in index), default=None)
+    start, end, inclusive = resolve_range(start, end, last, data_end)
+    groups = [
+        i for i, group_min, group_max, _ in index
+        if (start is None or group_max >= start) and (end is None or group_min <= end)
+    ]
+    if not groups:
+        # Khoảng thời gian nằm ngoài dữ liệu -> DataFrame rỗng cùng schema
+        groups = [0] if index else []
+        return _slice_frame(parquet_file.read_row_groups(groups, columns=columns, use_pandas_metadata=True)
+                            .to_pandas().iloc[:0], None, None)
+    df = parquet_file.read_row_groups(groups, columns=columns, use_pandas_metadata=True).to_pandas()
+    return _slice_frame(df, start, end, inclusive)
+
+
+def load_cleaned(csv_path, columns=None, nrows=None, start=None, end=None, last=None):
+    """
+    Load cleaned dataset: ưu tiên cache còn mới, nếu không có thì đọc CSV
+    và ghi cache cho lần sau. Trả về DataFrame index Datetime.
+    """
+    cache_path = cache_path_for(csv_path)
+    if not is_fresh(csv_path, cache_path):
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(csv_path)
+        try:
+            build_from_csv(csv_path, cache_path)
+        except (OSError, pa.ArrowException) as e:
+            # Không ghi được cache (ví dụ thư mục read-only) -> dùng CSV như cũ
+            print(f"⚠️ Không ghi được columnar cache, đọc CSV: {e}")
+            df = read_csv_typed(csv_path, nrows=nrows if start is None and end is None and last is None else None)
+            if columns is not None:
+                df = df[[c for c in columns if c in df.columns]]
+            df = select_range(df, start, end, last)
+            return df.head(nrows) if nrows is not None else df
+
+    df = read_columnar(cache_path, columns, start=start, end=end, last=last)
+    return df.head(nrows) if nrows is not None else df
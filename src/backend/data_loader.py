@@ -3,29 +3,41 @@ import numpy as np
 import streamlit as st
 import os
 
+from src.backend.feature_engine import (
+    encode_season, compact_dtypes, frame_memory_mb
+)
+from src.backend.columnar_cache import load_cleaned, cache_path_for
+from src.backend.demo_data import load_demo
+
+def _compact(df):
+    """float32/int8 thay cho float64/int64 - báo cáo bộ nhớ nếu có thay đổi"""
+    before = frame_memory_mb(df)
+    df = compact_dtypes(df)
+    after = frame_memory_mb(df)
+    if before - after >= 0.1:
+        print(f"🗜️ Bộ nhớ DataFrame: {before:.1f} MB → {after:.1f} MB")
+    return df
+
 @st.cache_data
-def load_dataset(file_path="cleaned_dataset.csv", nrows=None):
+def load_dataset(file_path="cleaned_dataset.csv", nrows=None, columns=None, start=None, end=None, last=None):
     """
     Ưu tiên load dữ liệu thật từ cleaned_dataset.csv.
+    Đọc qua columnar cache (.parquet) nếu còn mới - chỉ các cột `columns`;
+    CSV chỉ được parse khi cache thiếu hoặc cũ hơn CSV.
+    Lọc theo thời gian: start/end (mốc bất kỳ pandas hiểu được) hoặc last='24h'
+    (tính từ mốc cuối của dữ liệu) - chỉ đọc các row group (tháng) liên quan.
     Nếu không thấy file, sẽ tự động chuyển sang chế độ DEMO.
     """
     
-    # Kiểm tra xem file dữ liệu thật (đã qua xử lý) có tồn tại không
-    if os.path.exists(file_path):
+    # Kiểm tra xem file dữ liệu thật (đã qua xử lý) hoặc cache của nó có tồn tại không
+    if os.path.exists(file_path) or os.path.exists(cache_path_for(file_path)):
         try:
-            # Load dữ liệu thật
-            df = pd.read_csv(file_path, nrows=nrows)
+            # Load dữ liệu thật (index Datetime có sẵn từ cache)
+            df = load_cleaned(file_path, columns=columns, nrows=nrows, start=start, end=end, last=last)
             
-            # Chuyển cột Datetime về đúng định dạng và set index
-            if 'Datetime' in df.columns:
-                df['Datetime'] = pd.to_datetime(df['Datetime'])
-                df = df.set_index('Datetime')
-            
-            # Đảm bảo các cột categorical được xử lý nếu cần (ví dụ season)
-            # Nếu model cần season là số (0,1,2,3), ta ánh xạ lại
-            if 'season' in df.columns and df['season'].dtype == 'object':
-                season_map = {'Spring': 0, 'Summer': 1, 'Autumn': 2, 'Winter': 3}
-                df['season'] = df['season'].map(season_map)
+            # Season dạng chuỗi -> mã số đúng như LabelEncoder lúc train
+            df = encode_season(df)
+            df = _compact(df)
                 
             print(f"✅ Đã load dữ liệu thật từ {file_path}")
             return df
@@ -37,41 +49,10 @@ def load_dataset(file_path="cleaned_dataset.csv", nrows=None):
     # --- CHẾ ĐỘ DEMO ---
     st.warning("⚠️ Không tìm thấy dữ liệu thật. Đang chạy chế độ DEMO (Dữ liệu giả lập).")
     
-    # 1. Tạo timeline
-    date_rng = pd.date_range(start='2006-12-16', end='2010-11-26', freq='min')
-    df = pd.DataFrame(date_rng, columns=['dt'])
-    df = df.set_index('dt')
-    n = len(df)
-    hours = df.index.hour.values + df.index.minute.values / 60.0
-
-    # --- A. Tạo dữ liệu mô phỏng ---
-    morning_peak = np.exp(-((hours - 8)**2) / 8)  
-    evening_peak = np.exp(-((hours - 19)**2) / 8) 
-    noise = np.random.normal(0, 0.2, n)
-    power = 0.5 + (1.5 * morning_peak) + (2.5 * evening_peak) + noise
-    df['Global_active_power'] = np.clip(power, 0.2, 8.0)
-    
-    df['Voltage'] = 240 + np.random.normal(0, 2, n)
-    df['Global_intensity'] = (df['Global_active_power'] * 1000) / df['Voltage']
-    df['Global_reactive_power'] = df['Global_active_power'] * 0.48 + np.random.normal(0, 0.05, n)
-    
-    # --- B. Thêm features cần thiết cho model ---
-    df['hour'] = df.index.hour
-    df['weekday'] = df.index.dayofweek
-    df['month'] = df.index.month
-    
-    # Season mapping (0: Spring, 1: Summer, 2: Autumn, 3: Winter)
-    df['season'] = df['month'].apply(lambda m: 3 if m in [12, 1, 2] else 0 if m in [3, 4, 5] else 1 if m in [6, 7, 8] else 2)
-    
-    # Rolling features
-    df['rolling_5'] = df['Global_active_power'].rolling(window=5, min_periods=1).mean()
-    df['rolling_15'] = df['Global_active_power'].rolling(window=15, min_periods=1).mean()
-    df['rolling_60'] = df['Global_active_power'].rolling(window=60, min_periods=1).mean()
-    df['rolling_1440'] = df['Global_active_power'].rolling(window=1440, min_periods=1).mean()
-    
-    df['energy_per_day_kwh'] = df['Global_active_power'] * (1/60) * 24
-    
-    return df
+    # Sinh vector hóa theo seed, lưu vào columnar cache để lần sau chỉ việc đọc
+    df = load_demo(start=start, end=end, last=last, columns=columns)
+    df = _compact(df)
+    return df.head(nrows) if nrows is not None else df
 
 
 # ================== TEST ==================
@@ -0,0 +1,154 @@
+"""
+Data Profiler - Thống kê chất lượng dữ liệu trong một lượt đọc streaming
+- Mỗi chunk chỉ được duyệt một lần: count, missing, min/max, mean/variance
+  (Welford/Chan: gộp mean + M2 của từng chunk), không giữ lại dữ liệu
+- Quantile xấp xỉ từ mẫu "bottom-k": giữ k dòng có hash(key) nhỏ nhất
+  (key = timestamp hoặc số thứ tự dòng raw).
+  Mẫu chỉ phụ thuộc tập dòng nên chia chunk / partition / incremental kiểu gì
+  cũng ra cùng một mẫu, và hai profiler gộp được với nhau (merge)
+- Cột không phải số (Date, Time, season...) chỉ đếm count/missing
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SAMPLE_SIZE = 4096
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _hash_keys(keys):
+    """splitmix64 trên int64 -> uint64, trộn đều để chọn mẫu"""
+    x = keys.astype(np.uint64, copy=True)
+    with np.errstate(over='ignore'):
+        x += np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class StreamingProfiler:
+    """Tích lũy thống kê theo cột qua nhiều lần update(chunk); merge() gộp hai profiler"""
+
+    def __init__(self, numeric_columns=None, sample_size=DEFAULT_SAMPLE_SIZE):
+        self.numeric_columns = set(numeric_columns or [])
+        self.sample_size = sample_size
+        self.columns = []     # thứ tự cột như lần đầu xuất hiện
+        self.rows = 0
+        self.missing = {}
+        self.numeric = {}     # col -> {'count', 'min', 'max', 'mean', 'm2'}
+        self.sample_keys = np.empty(0, dtype=np.uint64)
+        self.sample = {}      # col -> giá trị tại các dòng trong mẫu
+
+    # ---------- Cập nhật ----------
+
+    def update(self, df, keys=None):
+        """
+        Thêm một chunk. `keys` (int64, duy nhất trong toàn bộ dữ liệu) quyết định dòng
+        nào vào mẫu quantile; mặc định là timestamp nếu index là DatetimeIndex,
+        ngược lại là số thứ tự dòng trong luồng.
+        """
+        if len(df) == 0:
+            return
+        if keys is None:
+            if isinstance(df.index, pd.DatetimeIndex):
+                keys = df.index.asi8
+            else:
+                keys = np.arange(self.rows, self.rows + len(df), dtype=np.int64)
+        self.rows += len(df)
+        values = {}
+        for col, count in df.isna().sum().items():
+            if col not in self.missing:
+                self.columns.append(col)
+                self.missing[col] = 0
+            self.missing[col] += int(count)
+            series = df[col]
+            if col in self.numeric_columns or pd.api.types.is_numeric_dtype(series.dtype):
+                values[col] = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64)
+                self._update_moments(col, values[col])
+
+        if values:
+            self._update_sample(_hash_keys(np.asarray(keys, dtype=np.int64)), values)
+
+    def _update_moments(self, col, x):
+        x = x[~np.isnan(x)]
+        if len(x) == 0:
+            return
+        mean = x.mean()
+        chunk = {'count': len(x), 'min': x.min(), 'max': x.max(), 'mean': mean, 'm2': ((x - mean) ** 2).sum()}
+        self.numeric[col] = self._combine(self.numeric.get(col), chunk)
+
+    @staticmethod
+    def _combine(a, b):
+        """Công thức Chan et al. gộp (count, mean, M2) của hai phần"""
+        if a is None:
+            return dict(b)
+        if b is None:
+            return dict(a)
+        count = a['count'] + b['count']
+        delta = b['mean'] - a['mean']
+        return {
+            'count': count,
+            'min': min(a['min'], b['min']),
+            'max': max(a['max'], b['max']),
+            'mean': a['mean'] + delta * b['count'] / count,
+            'm2': a['m2'] + b['m2'] + delta ** 2 * a['count'] * b['count'] / count
+        }
+
+    def _update_sample(self, keys, values):
+        columns = sorted(set(self.sample) | set(values))
+        all_keys = np.concatenate([self.sample_keys, keys])
+        merged = {
+            col: np.concatenate([
+                self.sample.get(col, np.full(len(self.sample_keys), np.nan)),
+                values.get(col, np.full(len(keys), np.nan))
+            ])
+            for col in columns
+        }
+        if len(all_keys) > self.sample_size:
+            keep = np.argpartition(all_keys, self.sample_size - 1)[:self.sample_size]
+            all_keys = all_keys[keep]
+            merged = {col: v[keep] for col, v in merged.items()}
+        self.sample_keys = all_keys
+        self.sample = merged
+
+    def merge(self, other):
+        """Gộp profiler của partition khác (partition sau theo thời gian) vào profiler này"""
+        self.rows += other.rows
+        for col in other.columns:
+            if col not in self.missing:
+                self.columns.append(col)
+                self.missing[col] = 0
+            self.missing[col] += other.missing[col]
+        for col, moments in other.numeric.items():
+            self.numeric[col] = self._combine(self.numeric.get(col), moments)
+        if len(other.sample_keys):
+            self._update_sample(other.sample_keys, other.sample)
+        return self
+
+    # ---------- Kết quả ----------
+
+    def missing_counts(self):
+        return dict(self.missing)
+
+    def summary(self):
+        """{col: {'count', 'missing', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'}} cho cột số"""
+        result = {}
+        for col in self.columns:
+            moments = self.numeric.get(col)
+            if moments is None:
+                continue
+            count = moments['count']
+            row = {
+                'count': count,
+                'missing': self.missing[col],
+                'mean': moments['mean'],
+                'std': np.sqrt(moments['m2'] / (count - 1)) if count > 1 else np.nan,
+                'min': moments['min'],
+                'max': moments['max']
+            }
+            sample = self.sample.get(col)
+            sample = sample[~np.isnan(sample)] if sample is not None else np.empty(0)
+            for q in QUANTILES:
+                row[f"{int(q * 100)}%"] = np.quantile(sample, q) if len(sample) else np.nan
+            result[col] = row
+        return result
@@ -0,0 +1,116 @@
+"""
+Demo Data - Dữ liệu giả lập khi không có cleaned_dataset.csv
+- Vector hóa hoàn toàn (không .apply), tất định theo seed
+- Nhiễu sinh theo từng ngày với RNG khóa bởi (seed, ngày) nên sinh một đoạn
+  hay cả bộ đều cho cùng giá trị tại cùng một phút
+- Chỉ sinh khoảng được yêu cầu (+1439 phút trước đó cho rolling_1440)
+- Bộ đầy đủ được lưu vào columnar cache, lần khởi động sau chỉ việc đọc
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.backend.feature_engine import (
+    ROLLING_WINDOWS, add_calendar_features, add_rolling_features, compact_dtypes
+)
+from src.backend.columnar_cache import (
+    INDEX_COLUMN, resolve_range, select_range, read_columnar, write_columnar_cache
+)
+
+DEMO_SEED = 42
+DEMO_START = pd.Timestamp('2006-12-16 00:00')
+DEMO_END = pd.Timestamp('2010-11-26 23:59')
+DEMO_CACHE_PATH = "data/demo_dataset.parquet"
+
+MINUTES_PER_DAY = 1440
+_WARMUP_MINUTES = max(ROLLING_WINDOWS) - 1
+
+
+def _daily_noise(days, seed):
+    """Nhiễu (power, voltage, reactive) cho từng ngày, RNG riêng mỗi ngày"""
+    power = np.empty((len(days), MINUTES_PER_DAY))
+    voltage = np.empty_like(power)
+    reactive = np.empty_like(power)
+    for i, day in enumerate(days):
+        rng = np.random.default_rng([seed, int(day)])
+        power[i] = rng.normal(0, 0.2, MINUTES_PER_DAY)
+        voltage[i] = rng.normal(0, 2, MINUTES_PER_DAY)
+        reactive[i] = rng.normal(0, 0.05, MINUTES_PER_DAY)
+    return power.ravel(), voltage.ravel(), reactive.ravel()
+
+
+def generate_demo(start=None, end=None, last=None, seed=DEMO_SEED):
+    """
+    Sinh dữ liệu demo trong [start, end] (hoặc `last` tính từ DEMO_END).
+    Kết quả tại mỗi phút giống hệt khi sinh cả bộ.
+    """
+    range_start, range_end, _ = resolve_range(start, end, last, data_end=DEMO_END)
+    range_start = max(range_start, DEMO_START) if range_start is not None else DEMO_START
+    range_end = min(range_end, DEMO_END) if range_end is not None else DEMO_END
+    if range_start > range_end:
+        range_start = range_end
+
+    # Sinh theo ngày nguyên, kèm đủ phút trước đó để rolling khớp bản đầy đủ
+    first_day = max(DEMO_START, range_start - pd.Timedelta(minutes=_WARMUP_MINUTES)).normalize()
+    last_day = range_end.normalize()
+    day_index = pd.date_range(first_day, last_day, freq='D')
+    day_numbers = (day_index - DEMO_START.normalize()).days.values
+
+    index = pd.date_range(first_day, periods=len(day_index) * MINUTES_PER_DAY, freq='min', name=INDEX_COLUMN)
+    hours = index.hour.values + index.minute.values / 60.0
+    power_noise, voltage_noise, reactive_noise = _daily_noise(day_numbers, seed)
+
+    # --- Dữ liệu mô phỏng: 2 đỉnh sáng/tối ---
+    morning_peak = np.exp(-((hours - 8) ** 2) / 8)
+    evening_peak = np.exp(-((hours - 19) ** 2) / 8)
+    power = np.clip(0.5 + 1.5 * morning_peak + 2.5 * evening_peak + power_noise, 0.2, 8.0)
+    voltage = 240 + voltage_noise
+
+    df = pd.DataFrame({
+        'Global_active_power': power,
+        'Voltage': voltage,
+        'Global_intensity': power * 1000 / voltage,
+        'Global_reactive_power': power * 0.48 + reactive_noise
+    }, index=index)
+
+    # --- Features cho model (dùng chung feature_engine) ---
+    df = add_calendar_features(df, season_as='code')
+    df = add_rolling_features(df)
+    # Năng lượng mỗi ngày (kWh) như clean_data.py: tổng công suất phút / 60
+    df['energy_per_day_kwh'] = np.repeat(power.reshape(-1, MINUTES_PER_DAY).sum(axis=1) / 60, MINUTES_PER_DAY)
+
+    df = select_range(df, range_start if last is None else None, range_end, last)
+    return compact_dtypes(df)
+
+
+def load_demo(start=None, end=None, last=None, columns=None, cache_path=DEMO_CACHE_PATH, seed=DEMO_SEED):
+    """
+    Dữ liệu demo qua columnar cache: có cache thì chỉ đọc khoảng/cột cần thiết;
+    chưa có thì sinh cả bộ một lần và lưu lại. Không ghi được cache (thư mục
+    read-only) thì chỉ sinh đúng khoảng được yêu cầu.
+    """
+    if seed != DEMO_SEED:
+        cache_path = None  # cache chỉ dành cho seed mặc định
+    if cache_path and os.path.exists(cache_path):
+        try:
+            return read_columnar(cache_path, columns, start=start, end=end, last=last)
+        except Exception as e:
+            print(f"⚠️ Lỗi đọc demo cache, sinh lại: {e}")
+
+    if cache_path:
+        try:
+            full = generate_demo(seed=seed)
+            write_columnar_cache(full, cache_path)
+            print(f"💾 Đã lưu dữ liệu demo: {cache_path} ({len(full):,} dòng)")
+            df = select_range(full, start, end, last)
+        except OSError as e:
+            print(f"⚠️ Không lưu được dữ liệu demo: {e}")
+            df = generate_demo(start, end, last, seed=seed)
+    else:
+        df = generate_demo(start, end, last, seed=seed)
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
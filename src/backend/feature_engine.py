@@ -0,0 +1,254 @@
+"""
+Feature Engine - Đặc trưng dùng chung cho cleaning, loader và predictor
+- add_calendar_features / add_rolling_features: bản vector hóa cho cả DataFrame
+  (clean_data.py, data_loader.py)
+- StreamingFeatureState: trạng thái rolling tăng dần theo từng phút, dựng
+  một dòng đặc trưng sẵn sàng cho model trong vài micro-giây (EnergyPredictor)
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Cửa sổ rolling (phút): rolling_5 ... rolling_1440
+ROLLING_WINDOWS = (5, 15, 60, 1440)
+
+# Cột đo lường gốc của bộ dữ liệu UCI
+MEASUREMENT_COLUMNS = [
+    'Global_active_power', 'Global_reactive_power',
+    'Voltage', 'Global_intensity',
+    'Sub_metering_1', 'Sub_metering_2', 'Sub_metering_3'
+]
+CALENDAR_COLUMNS = ['hour', 'weekday', 'month', 'season']
+ROLLING_COLUMNS = [f'rolling_{w}' for w in ROLLING_WINDOWS]
+
+TARGET_COLUMN = 'Global_active_power'
+# Cột không được dùng làm đặc trưng (target + leakage)
+EXCLUDED_FEATURES = [TARGET_COLUMN, 'energy_per_day_kwh']
+# Thứ tự đặc trưng lúc train = thứ tự cột của cleaned_dataset.csv trừ cột bị loại
+MODEL_FEATURES = [c for c in MEASUREMENT_COLUMNS if c != TARGET_COLUMN] + CALENDAR_COLUMNS + ROLLING_COLUMNS
+
+# Mã season theo LabelEncoder lúc train (sắp xếp alphabet)
+SEASON_CODES = {'Autumn': 0, 'Spring': 1, 'Summer': 2, 'Winter': 3}
+SEASON_CATEGORIES = sorted(SEASON_CODES)
+_SEASON_NAMES = np.array(['', 'Winter', 'Winter', 'Spring', 'Spring', 'Spring',
+                          'Summer', 'Summer', 'Summer', 'Autumn', 'Autumn', 'Autumn', 'Winter'], dtype=object)
+_MONTH_TO_SEASON = np.array([SEASON_CODES.get(name, 0) for name in _SEASON_NAMES])
+
+
+def season_code(months):
+    """Tháng (1-12, scalar hoặc mảng) -> mã season như lúc train"""
+    return _MONTH_TO_SEASON[np.asarray(months)]
+
+
+def season_name(months):
+    """Tháng (1-12) -> tên mùa Bắc bán cầu ('Winter', 'Spring', ...)"""
+    return _SEASON_NAMES[np.asarray(months)]
+
+
+def add_calendar_features(df, season_as='name'):
+    """
+    Thêm hour/weekday/month/season từ DatetimeIndex (vector hóa, không .apply).
+    season_as='name' giữ chuỗi như cleaned_dataset.csv, 'code' dùng mã số của model.
+    """
+    index = df.index
+    months = index.month.values
+    df['hour'] = index.hour
+    df['weekday'] = index.weekday  # 0=Monday, 6=Sunday
+    df['month'] = months
+    df['season'] = season_name(months) if season_as == 'name' else season_code(months)
+    return df
+
+
+def rolling_mean_exact(values, window, context=None):
+    """
+    Rolling mean (min_periods=1) mà mỗi cửa sổ được cộng độc lập, nên kết quả
+    tại một vị trí chỉ phụ thuộc vào `window` giá trị của nó - xử lý theo chunk
+    (truyền `context` = tối đa window-1 giá trị trước đó) cho kết quả giống hệt
+    xử lý cả chuỗi một lần.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    context = np.asarray(context if context is not None else [], dtype=np.float64)[-(window - 1):] \
+        if window > 1 else np.empty(0)
+    full = np.concatenate([context, values])
+    out = np.empty(len(full), dtype=np.float64)
+
+    # Cửa sổ chưa đủ `window` phần tử: chỉ xảy ra ở đầu chuỗi (context ngắn)
+    head = min(window - 1, len(full))
+    if head > 0:
+        out[:head] = np.cumsum(full[:head]) / np.arange(1, head + 1)
+    if len(full) >= window:
+        out[window - 1:] = sliding_window_view(full, window).sum(axis=1) / window
+    return out[len(context):]
+
+
+def add_rolling_features(df, column=TARGET_COLUMN, windows=ROLLING_WINDOWS, context=None, exact=False):
+    """
+    Rolling mean theo phút (min_periods=1) giống lúc train.
+    exact=True dùng rolling_mean_exact (kết quả không phụ thuộc cách chia chunk),
+    `context` là các giá trị đứng trước df (dùng khi xử lý theo chunk).
+    """
+    series = df[column]
+    for w in windows:
+        if exact or context is not None:
+            df[f'rolling_{w}'] = rolling_mean_exact(series.values, w, context)
+        else:
+            df[f'rolling_{w}'] = series.rolling(window=w, min_periods=1).mean()
+    return df
+
+
+def encode_season(df):
+    """Chuyển cột season dạng chuỗi sang mã số của model (nếu cần)"""
+    if 'season' in df.columns and not pd.api.types.is_numeric_dtype(df['season']):
+        df['season'] = df['season'].astype(str).map(SEASON_CODES)
+    return df
+
+
+# Kiểu dữ liệu gọn: đo lường/rolling float32 (đủ 7 chữ số, dữ liệu gốc chỉ có 3),
+# lịch int8 (giờ < 24, tháng <= 12)
+FLOAT_COLUMNS = MEASUREMENT_COLUMNS + ROLLING_COLUMNS + ['energy_per_day_kwh']
+SMALL_INT_COLUMNS = ['hour', 'weekday', 'month']
+
+
+def frame_memory_mb(df):
+    """Bộ nhớ thực của DataFrame (MB, tính cả index và chuỗi)"""
+    return df.memory_usage(index=True, deep=True).sum() / 1024 ** 2
+
+
+def compact_dtypes(df):
+    """
+    Ép kiểu gọn tại chỗ: float32 cho đo lường/rolling, int8 cho lịch,
+    season int8 nếu là mã số hoặc category nếu là tên mùa.
+    """
+    for col in FLOAT_COLUMNS:
+        if col in df.columns and df[col].dtype != np.float32:
+            df[col] = df[col].astype(np.float32)
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns and df[col].dtype != np.int8:
+            df[col] = df[col].astype(np.int8)
+    if 'season' in df.columns:
+        if pd.api.types.is_numeric_dtype(df['season']):
+            df['season'] = df['season'].astype(np.int8)
+        elif not isinstance(df['season'].dtype, pd.CategoricalDtype):
+            # Danh mục cố định để mọi chunk/row group có cùng kiểu
+            df['season'] = pd.Categorical(df['season'], categories=SEASON_CATEGORIES)
+    return df
+
+
+def derive_intensity(active_power, reactive_power, voltage):
+    """Dòng điện (A) từ công suất biểu kiến: I = sqrt(P² + Q²) * 1000 / V"""
+    return np.sqrt(np.square(active_power) + np.square(reactive_power)) * 1000.0 / voltage
+
+
+class RollingWindowState:
+    """
+    Ring buffer giữ `capacity` giá trị gần nhất cùng tổng chạy cho từng cửa sổ.
+    push() và mean() đều O(1) bất kể độ dài cửa sổ.
+    """
+
+    def __init__(self, windows, capacity=None):
+        self.windows = tuple(int(w) for w in windows)
+        self.capacity = int(capacity or max(self.windows))
+        self.buffer = np.zeros(self.capacity, dtype=np.float64)
+        self.sums = {w: 0.0 for w in self.windows}
+        self.count = 0      # tổng số giá trị đã push
+        self.pos = 0        # vị trí ghi tiếp theo
+
+    def push(self, value):
+        value = float(value)
+        for w in self.windows:
+            self.sums[w] += value
+            if self.count >= w:
+                # Giá trị rơi khỏi cửa sổ w nằm ở w bước trước
+                self.sums[w] -= self.buffer[(self.pos - w) % self.capacity]
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.capacity
+        self.count += 1
+
+        # Mỗi vòng buffer tính lại tổng để sai số cộng dồn float không tích tụ
+        if self.pos == 0:
+            self._resync()
+
+    def extend(self, values):
+        """Nạp nhiều giá trị một lần (vector hóa) - dùng khi warm start"""
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        n = len(values)
+        if n == 0:
+            return
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.buffer[idx] = values
+        self.pos = (self.pos + n) % self.capacity
+        self.count += n
+        self._resync()
+
+    def _resync(self):
+        for w in self.windows:
+            n = min(w, self.count, self.capacity)
+            idx = (self.pos - 1 - np.arange(n)) % self.capacity
+            self.sums[w] = float(self.buffer[idx].sum())
+
+    def mean(self, window):
+        n = min(window, self.count)
+        return self.sums[window] / n if n > 0 else 0.0
+
+    def lag(self, k):
+        """Giá trị của k bước trước (k=1: giá trị mới nhất)"""
+        if self.count == 0:
+            return 0.0
+        k = min(k, self.count, self.capacity)
+        return float(self.buffer[(self.pos - k) % self.capacity])
+
+
+class StreamingFeatureState:
+    """
+    Trạng thái đặc trưng tại thời điểm phục vụ, cập nhật theo từng phút đo.
+    Tái tạo đúng các cột lúc train: đo lường, lịch, season và rolling_*.
+    """
+
+    def __init__(self, windows=ROLLING_WINDOWS):
+        self.windows = tuple(windows)
+        self.rolling = RollingWindowState(self.windows)
+        self.last = {}
+        self.timestamp = None
+
+    def update(self, timestamp, values):
+        """Thêm một phút đo (dict cột -> giá trị), O(1)"""
+        self.rolling.push(values[TARGET_COLUMN])
+        self.last.update(values)
+        self.timestamp = pd.Timestamp(timestamp)
+        return self
+
+    def warm_start(self, history_df):
+        """Nạp trạng thái từ cửa sổ lịch sử (chỉ dùng max(windows) phút cuối)"""
+        tail = history_df.tail(max(self.windows))
+        self.rolling.extend(tail[TARGET_COLUMN].values)
+        last_row = tail.iloc[-1]
+        self.last = {c: float(last_row[c]) for c in MEASUREMENT_COLUMNS if c in tail.columns}
+        if isinstance(tail.index, pd.DatetimeIndex):
+            self.timestamp = tail.index[-1]
+        return self
+
+    def features(self, timestamp=None):
+        """Dict đặc trưng tại `timestamp` (mặc định: phút đo cuối)"""
+        ts = pd.Timestamp(timestamp) if timestamp is not None else self.timestamp
+        feats = dict(self.last)
+        if ts is not None:
+            feats.update({
+                'hour': ts.hour, 'weekday': ts.weekday(), 'day_of_week': ts.weekday(),
+                'month': ts.month, 'season': int(_MONTH_TO_SEASON[ts.month])
+            })
+        for w in self.windows:
+            feats[f'rolling_{w}'] = self.rolling.mean(w)
+        return feats
+
+    def materialize(self, feature_names, timestamp=None, out=None):
+        """
+        Dựng một dòng đặc trưng đúng thứ tự `feature_names` (cột không biết -> 0).
+        Chỉ đọc trạng thái O(1) có sẵn nên mỗi lần gọi tốn vài micro-giây.
+        """
+        if out is None:
+            out = np.zeros(len(feature_names), dtype=np.float64)
+        feats = self.features(timestamp)
+        for j, name in enumerate(feature_names):
+            out[j] = feats.get(name, 0.0)
+        return out
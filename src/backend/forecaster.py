@@ -0,0 +1,175 @@
+"""
+Recursive Forecaster - Dự báo nhiều bước với trạng thái lag/rolling
+RecursiveForecaster đưa chính dự báo của model vào lại lag/rolling
+(ring buffer O(1) của feature_engine) để dự báo 30 ngày theo từng giờ
+hoặc trực tiếp theo horizon
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from src.backend.feature_engine import (
+    ROLLING_WINDOWS, RollingWindowState, StreamingFeatureState,
+    season_code, derive_intensity
+)
+
+
+class RecursiveForecaster:
+    """
+    Dự báo đệ quy theo bước `step_minutes` (mặc định 1 giờ): mỗi bước model
+    dự báo công suất trung bình (kW), giá trị này được push vào trạng thái
+    rolling/lag rồi dùng cho bước kế tiếp.
+
+    Cửa sổ rolling tính theo phút được quy về số bước; cửa sổ ngắn hơn một
+    bước (rolling_5, rolling_15) lấy giá trị bước gần nhất vì công suất được
+    giả định không đổi trong một bước.
+
+    Cột ngoại sinh (Voltage, Global_reactive_power, Sub_metering_*) không được
+    dự báo: mỗi bước lấy trung bình theo giờ trong ngày của cửa sổ warm start,
+    giờ không có dữ liệu thì giữ giá trị quan sát cuối.
+    """
+
+    def __init__(self, predict_fn, feature_names, step_minutes=60, min_value=0.1):
+        self.predict_fn = predict_fn
+        self.feature_names = list(feature_names)
+        self.step_minutes = int(step_minutes)
+        self.min_value = min_value
+
+        self.window_steps = {w: max(1, w // self.step_minutes) for w in ROLLING_WINDOWS}
+        self.lag_24h_steps = max(1, 1440 // self.step_minutes)
+        capacity = max(max(self.window_steps.values()), self.lag_24h_steps)
+        self.state = RollingWindowState(set(self.window_steps.values()), capacity)
+
+        self.exogenous = {}
+        self.exogenous_by_hour = {}
+        self.origin_rolling = {}
+        self.feature_state = None
+        self.origin = None
+        self._col = {name: j for j, name in enumerate(self.feature_names)}
+
+    # ---------- Khởi tạo trạng thái ----------
+
+    def warm_start(self, history_df, start_time=None):
+        """
+        Nạp trạng thái từ lịch sử: công suất trung bình theo bước (resample),
+        rolling_* chính xác theo phút tại gốc (StreamingFeatureState) và các cột
+        ngoại sinh (Voltage, Sub_metering...).
+        start_time: gốc dự báo, mặc định là mốc cuối của history_df để lịch
+        (hour/weekday/month) khớp với trạng thái lag/rolling lấy từ cuối lịch sử.
+        """
+        power = history_df['Global_active_power']
+        if isinstance(history_df.index, pd.DatetimeIndex):
+            step_means = power.resample(f'{self.step_minutes}min').mean().dropna().values
+        else:
+            n_steps = len(power) // self.step_minutes
+            step_means = power.values[len(power) - n_steps * self.step_minutes:] \
+                .reshape(n_steps, self.step_minutes).mean(axis=1) if n_steps else power.values[-1:]
+
+        self.state.extend(step_means[-self.state.capacity:])
+
+        # Đặc trưng tại gốc giống hệt lúc train (rolling theo phút, không theo bước)
+        self.feature_state = StreamingFeatureState().warm_start(history_df)
+        origin_feats = self.feature_state.features()
+        self.origin_rolling = {
+            name: origin_feats[name] for name in self._col if name.startswith('rolling_')
+        }
+
+        # Cột ngoại sinh: giá trị quan sát cuối + trung bình theo giờ trong ngày
+        self.exogenous = {
+            col: value for col, value in self.feature_state.last.items()
+            if col in self._col and col != 'Global_active_power'
+        }
+        self.exogenous_by_hour = {}
+        if isinstance(history_df.index, pd.DatetimeIndex):
+            # Global_intensity suy ra từ công suất dự báo nên không lấy theo giờ
+            profile_cols = [c for c in self.exogenous if c != 'Global_intensity' and c in history_df.columns]
+            if profile_cols:
+                hourly = history_df[profile_cols].groupby(history_df.index.hour).mean().reindex(range(24))
+                for col in profile_cols:
+                    self.exogenous_by_hour[col] = hourly[col].fillna(self.exogenous[col]).to_numpy(dtype=np.float64)
+
+        if start_time is None:
+            start_time = history_df.index[-1] if isinstance(history_df.index, pd.DatetimeIndex) else datetime.now()
+        self.origin = pd.Timestamp(start_time)
+        return self
+
+    # ---------- Đặc trưng ----------
+
+    def _calendar_block(self, steps, offsets=None):
+        """Ma trận (steps x n_features) với cột lịch và cột ngoại sinh đã điền sẵn"""
+        if offsets is None:
+            offsets = np.arange(1, steps + 1)
+        times = self.origin + pd.to_timedelta(np.asarray(offsets) * self.step_minutes, unit='min')
+
+        X = np.zeros((len(offsets), len(self.feature_names)), dtype=np.float64)
+        weekday = times.weekday.values
+        calendar = {
+            'hour': times.hour.values,
+            'weekday': weekday,
+            'day_of_week': weekday,
+            'month': times.month.values,
+            'season': season_code(times.month.values)
+        }
+        for name, values in calendar.items():
+            if name in self._col:
+                X[:, self._col[name]] = values
+        hours = times.hour.values
+        for name, value in self.exogenous.items():
+            by_hour = self.exogenous_by_hour.get(name)
+            X[:, self._col[name]] = value if by_hour is None else by_hour[hours]
+        return X
+
+    def _fill_state_columns(self, row):
+        """Điền rolling/lag từ trạng thái hiện tại vào một dòng đặc trưng (O(1))"""
+        for w, steps in self.window_steps.items():
+            name = f'rolling_{w}'
+            if name in self._col:
+                row[self._col[name]] = self.state.mean(steps)
+        if 'lag_24h' in self._col:
+            row[self._col['lag_24h']] = self.state.lag(self.lag_24h_steps)
+
+    # ---------- Dự báo ----------
+
+    def _intensity(self, active_power, row):
+        """Global_intensity suy ra từ công suất dự báo và Q, V của chính bước đó"""
+        q_col, v_col = self._col.get('Global_reactive_power'), self._col.get('Voltage')
+        return derive_intensity(
+            active_power,
+            row[q_col] if q_col is not None else self.exogenous.get('Global_reactive_power', 0.0),
+            row[v_col] if v_col is not None else self.exogenous.get('Voltage', 240.0)
+        )
+
+    def forecast(self, steps):
+        """Dự báo đệ quy `steps` bước: mỗi dự báo được đưa lại vào trạng thái"""
+        X = self._calendar_block(steps)
+        intensity_col = self._col.get('Global_intensity')
+        predictions = np.empty(steps, dtype=np.float64)
+        for i in range(steps):
+            row = X[i:i + 1]
+            if i == 0:
+                # Bước đầu dùng rolling theo phút tại gốc, khớp đặc trưng lúc train
+                for name, value in self.origin_rolling.items():
+                    row[0, self._col[name]] = value
+                if 'lag_24h' in self._col:
+                    row[0, self._col['lag_24h']] = self.state.lag(self.lag_24h_steps)
+            else:
+                self._fill_state_columns(row[0])
+                if intensity_col is not None:
+                    row[0, intensity_col] = self._intensity(predictions[i - 1], row[0])
+            value = max(self.min_value, float(self.predict_fn(row)[0]))
+            predictions[i] = value
+            self.state.push(value)
+        return predictions
+
+    def forecast_direct(self, horizons):
+        """
+        Dự báo trực tiếp tại các horizon (tính bằng bước) với trạng thái ở gốc,
+        không đệ quy - một lần predict cho mọi horizon.
+        """
+        X = self._calendar_block(len(horizons), offsets=horizons)
+        for name, value in self.origin_rolling.items():
+            X[:, self._col[name]] = value
+        if 'lag_24h' in self._col:
+            X[:, self._col['lag_24h']] = self.state.lag(self.lag_24h_steps)
+        return np.maximum(self.min_value, self.predict_fn(X))
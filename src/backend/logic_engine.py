@@ -1,3 +1,15 @@
+import numpy as np
+
+# Biểu giá bậc thang EVN: (số kWh của bậc, giá VNĐ/kWh) - dùng chung cho bản scalar và vector
+EVN_TIERS = [
+    (50, 1806),
+    (50, 1866),
+    (100, 2167),
+    (100, 2729),
+    (100, 3050),
+    (float('inf'), 3151)
+]
+
 def calculate_evn_bill(kwh):
     """
     Tính tiền điện theo biểu giá bậc thang sinh hoạt EVN (Cập nhật mới nhất)
@@ -10,14 +22,7 @@ def calculate_evn_bill(kwh):
     # Bậc 5: 301 - 400 kWh: 3.050 đồng/kWh
     # Bậc 6: 401 trở lên: 3.151 đồng/kWh
     
-    tiers = [
-        (50, 1806),
-        (50, 1866),  # 50 số tiếp theo (51-100)
-        (100, 2167), # 100 số tiếp theo (101-200)
-        (100, 2729), # 100 số tiếp theo (201-300)
-        (100, 3050), # 100 số tiếp theo (301-400)
-        (float('inf'), 3151) # Còn lại
-    ]
+    tiers = EVN_TIERS
     
     total_bill = 0
     remaining_kwh = kwh
@@ -36,6 +41,20 @@ def calculate_evn_bill(kwh):
         
     return int(total_bill), breakdown
 
+def calculate_evn_bill_array(kwh):
+    """
+    Bản vector hóa của calculate_evn_bill: nhận mảng kWh (shape bất kỳ),
+    trả về mảng tiền điện (VNĐ, đã làm tròn xuống như bản scalar).
+    """
+    kwh = np.maximum(np.asarray(kwh, dtype=float), 0.0)
+    bill = np.zeros_like(kwh)
+    lower = 0.0
+    for limit, price in EVN_TIERS:
+        # Số kWh rơi vào bậc [lower, lower + limit)
+        bill += np.clip(kwh - lower, 0.0, limit) * price
+        lower += limit
+    return np.floor(bill).astype(np.int64)
+
 def calculate_cost(power_kw, hour):
     PRICE_LOW = 1800
     PRICE_NORMAL = 2500
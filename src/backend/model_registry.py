@@ -0,0 +1,293 @@
+"""
+Model Registry - Quản lý phiên bản model dưới checkpoints/registry/
+- manifest.json: tên model, metrics, feature list, hash nội dung, version đang active
+- register() chỉ thêm version; deploy luôn bằng promote() tường minh
+- promote() / rollback(): đổi version active một cách atomic (ghi file tạm rồi os.replace)
+- ManagedPredictor: load version mới ở background rồi swap, không cần restart
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import tempfile
+from datetime import datetime
+
+import joblib
+
+from src.backend.predictor import EnergyPredictor
+from src.backend.tree_engine import (
+    CompiledTreeEnsemble, compiled_path_for, export_compiled_model, file_sha256
+)
+
+REGISTRY_DIR = "checkpoints/registry"
+MANIFEST_NAME = "manifest.json"
+DEFAULT_MODEL_PATH = "checkpoints/best_model_lightgbm.pkl"
+
+
+def _jsonable(value):
+    """Chuyển metrics (dict/Series, numpy scalar, NaN) về kiểu JSON được"""
+    if hasattr(value, 'to_dict'):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _compiled_matches(compiled_path, sha256):
+    """File .trees.pkl tồn tại và được build từ package có hash sha256"""
+    if not os.path.exists(compiled_path):
+        return False
+    try:
+        return CompiledTreeEnsemble.load(compiled_path).source_sha256 == sha256
+    except Exception:
+        return False
+
+
+class ModelRegistry:
+    """Registry phiên bản model dựa trên file, không cần dịch vụ ngoài"""
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+
+    # ---------- Manifest ----------
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'active': None, 'history': [], 'versions': {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        """Ghi atomic: reader luôn thấy manifest cũ hoặc mới, không bao giờ thấy file dở"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".manifest-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.manifest_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def manifest_signature(self):
+        """Chữ ký rẻ (mtime, size) để phát hiện manifest thay đổi mà không cần đọc file"""
+        try:
+            stat = os.stat(self.manifest_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    # ---------- Versions ----------
+
+    def list_versions(self):
+        return self.load_manifest()['versions']
+
+    def active_version(self):
+        return self.load_manifest().get('active')
+
+    def model_path(self, version):
+        info = self.list_versions()[version]
+        return os.path.join(self.root, info['path'])
+
+    def active_model_path(self):
+        version = self.active_version()
+        return self.model_path(version) if version else None
+
+    def register(self, package_path, promote=False):
+        """
+        Thêm một package .pkl (từ save_model_package) vào registry.
+        Trả về version id, ví dụ 'lightgbm-v3'. Package trùng hash không bị nhân bản.
+        Không tự đổi version active (kể cả registry còn trống) trừ khi promote=True.
+        """
+        sha256 = file_sha256(package_path)
+        manifest = self.load_manifest()
+
+        for version, info in manifest['versions'].items():
+            if info['sha256'] == sha256:
+                print(f"ℹ️ Package đã có trong registry: {version}")
+                if promote:
+                    self.promote(version)
+                return version
+
+        package = joblib.load(package_path)
+        model_name = package.get('model_name', 'model')
+        slug = model_name.replace(" ", "_").lower()
+        # max + 1 (không phải đếm) để id không trùng khi một version đã bị xóa
+        numbers = [
+            int(v[len(slug) + 2:]) for v in manifest['versions']
+            if v.startswith(f"{slug}-v") and v[len(slug) + 2:].isdigit()
+        ]
+        version = f"{slug}-v{max(numbers, default=0) + 1}"
+
+        version_dir = os.path.join(self.root, version)
+        os.makedirs(version_dir, exist_ok=True)
+        model_file = os.path.join(version_dir, "model.pkl")
+        shutil.copy2(package_path, model_file)
+
+        # Kèm bản cây đã compile (copy nếu có sẵn và build từ đúng package này, không thì export)
+        source_compiled = compiled_path_for(package_path)
+        target_compiled = compiled_path_for(model_file)
+        if _compiled_matches(source_compiled, sha256):
+            shutil.copy2(source_compiled, target_compiled)
+        else:
+            try:
+                export_compiled_model(package, target_compiled, sha256)
+            except NotImplementedError as e:
+                print(f"⚠️ Không compile được model: {e}")
+
+        metrics = package.get('metrics')
+        manifest['versions'][version] = {
+            'model_name': model_name,
+            'metrics': _jsonable(metrics) if metrics is not None else {},
+            'feature_names': list(package.get('feature_names') or []),
+            'sha256': sha256,
+            'path': f"{version}/model.pkl",
+            'trained_at': package.get('timestamp'),
+            'registered_at': datetime.now().isoformat()
+        }
+        self._write_manifest(manifest)
+        print(f"✅ Registered {version} (sha256 {sha256[:12]}…)")
+        if promote:
+            self.promote(version)
+        return version
+
+    def promote(self, version):
+        """Đặt version làm active - thay đổi có hiệu lực ngay với ManagedPredictor"""
+        manifest = self.load_manifest()
+        if version not in manifest['versions']:
+            raise KeyError(f"Version không tồn tại: {version}")
+        model_file = os.path.join(self.root, manifest['versions'][version]['path'])
+        if file_sha256(model_file) != manifest['versions'][version]['sha256']:
+            raise ValueError(f"Hash của {version} không khớp manifest - file có thể đã bị sửa")
+        if manifest.get('active') not in (None, version):
+            manifest.setdefault('history', []).append(manifest['active'])
+        manifest['active'] = version
+        self._write_manifest(manifest)
+        print(f"🚀 Promoted {version}")
+
+    def rollback(self):
+        """Quay về version active trước đó (theo thứ tự promote); trả về version đó"""
+        manifest = self.load_manifest()
+        history = manifest.get('history', [])
+        while history and history[-1] not in manifest['versions']:
+            history.pop()  # version đã bị xóa khỏi registry
+        if not history:
+            raise ValueError("Không có version trước đó để rollback")
+        version = history.pop()
+        model_file = os.path.join(self.root, manifest['versions'][version]['path'])
+        if file_sha256(model_file) != manifest['versions'][version]['sha256']:
+            raise ValueError(f"Hash của {version} không khớp manifest - file có thể đã bị sửa")
+        manifest['active'] = version
+        manifest['history'] = history
+        self._write_manifest(manifest)
+        print(f"⏪ Rolled back to {version}")
+        return version
+
+
+class ManagedPredictor:
+    """
+    Giữ EnergyPredictor đang phục vụ và tự cập nhật khi registry promote version mới.
+    Version mới được load đầy đủ ở thread nền; request vẫn dùng predictor cũ
+    cho tới khi swap xong, nên không có latency spike.
+    """
+
+    def __init__(self, registry=None, fallback_path=DEFAULT_MODEL_PATH, check_interval=5.0):
+        self.registry = registry or ModelRegistry()
+        self.fallback_path = fallback_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loading = False
+        self._last_check = 0.0
+        self._signature = self.registry.manifest_signature()
+
+        self.version = self.registry.active_version() if self._signature else None
+        path = self.registry.model_path(self.version) if self.version else fallback_path
+        self._predictor = EnergyPredictor(path)
+
+    def get(self):
+        """Predictor hiện tại (kiểm tra manifest tối đa mỗi check_interval giây)"""
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            self._last_check = now
+            self._maybe_reload()
+        return self._predictor
+
+    def _maybe_reload(self):
+        signature = self.registry.manifest_signature()
+        if signature == self._signature or signature is None:
+            return
+        version = self.registry.active_version()
+        if version == self.version:
+            self._signature = signature
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._load_and_swap, args=(version, signature), daemon=True).start()
+
+    def _load_and_swap(self, version, signature):
+        try:
+            predictor = EnergyPredictor(self.registry.model_path(version))
+            predictor._ensure_loaded()  # load xong TRƯỚC khi swap
+            with self._lock:
+                self._predictor = predictor
+                self.version = version
+                self._signature = signature
+            print(f"🔄 Đã chuyển sang model {version}")
+        except Exception as e:
+            print(f"❌ Lỗi load model {version}, giữ version cũ: {e}")
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+# ================== CLI ==================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý model registry")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_reg = sub.add_parser("register", help="Thêm package .pkl vào registry")
+    p_reg.add_argument("package_path")
+    p_reg.add_argument("--promote", action="store_true", help="Đặt làm version active ngay")
+
+    p_pro = sub.add_parser("promote", help="Đặt version làm active")
+    p_pro.add_argument("version")
+
+    sub.add_parser("rollback", help="Quay về version active trước đó")
+
+    sub.add_parser("list", help="Liệt kê các version")
+
+    args = parser.parse_args(argv)
+    registry = ModelRegistry()
+
+    if args.command == "register":
+        registry.register(args.package_path, promote=args.promote)
+    elif args.command == "promote":
+        registry.promote(args.version)
+    elif args.command == "rollback":
+        registry.rollback()
+    else:
+        manifest = registry.load_manifest()
+        for version, info in manifest['versions'].items():
+            marker = "⭐" if version == manifest.get('active') else "  "
+            print(f"{marker} {version:<20} {info['model_name']:<15} {info['sha256'][:12]}  {info['registered_at']}")
+
+
+if __name__ == "__main__":
+    # python -m src.backend.model_registry register best_model_lightgbm.pkl --promote
+    main(sys.argv[1:])
@@ -0,0 +1,231 @@
+"""
+Prediction Cache - Cache kết quả predict_user_consumption
+- Key = tham số hộ gia đình đã chuẩn hóa + version model + fingerprint lịch sử
+  + tháng dùng cho hệ số mùa: dữ liệu mới (fingerprint đổi), model mới hoặc sang
+  tháng mới tự ra key mới, nên kết quả cũ không bao giờ bị trả nhầm và không cần
+  hết hạn theo giờ; key cũ bị LRU đẩy ra
+- Tầng RAM: LRU có giới hạn, TTL tùy chọn (mặc định tắt)
+- Tầng đĩa (tùy chọn): pickle mỗi key một file, dùng chung giữa các process,
+  giữ tối đa max_entries file mới nhất
+- Đếm hit/miss để trang admin hiển thị
+"""
+
+import os
+import copy
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 512
+# Không hết hạn theo thời gian: key đã chứa fingerprint dữ liệu, version model và tháng
+DEFAULT_TTL_SECONDS = None
+DISK_CACHE_DIR = "checkpoints/prediction_cache"
+
+
+def normalize_params(user_params, defaults=None):
+    """
+    Chuẩn hóa form người dùng để các input tương đương cho cùng một key:
+    điền mặc định, số nguyên hóa số đếm, chuỗi bỏ khoảng trắng, sắp xếp theo tên.
+    """
+    params = dict(defaults or {})
+    params.update({k: v for k, v in user_params.items() if v is not None})
+
+    normalized = []
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value, str):
+            value = value.strip()
+        elif hasattr(value, 'item'):
+            value = value.item()  # numpy scalar -> Python
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+def make_key(user_params, model_version, fingerprint, days=30, defaults=None, month=None):
+    """
+    Key hashable dùng cho cả tầng RAM và tầng đĩa.
+    month: tháng mà kết quả phụ thuộc (hệ số mùa của thiết bị) - kết quả tính
+    trong tháng 6 không được trả lại vào tháng 12.
+    """
+    return (normalize_params(user_params, defaults), str(model_version), tuple(fingerprint), int(days),
+            int(month) if month is not None else None)
+
+
+class PredictionCache:
+    """Cache LRU + TTL an toàn đa luồng, có tầng đĩa tùy chọn"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, disk_dir=None):
+        self.max_entries = int(max_entries)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ---------- Tầng RAM ----------
+
+    def get(self, key):
+        """Trả về bản sao kết quả đã cache hoặc None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+                self._stats['expired'] += 1
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._store(key, value, now)
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        now = time.time()
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value, now)
+        self._disk_put(key, value)
+
+    def invalidate(self, fingerprint):
+        """
+        Xóa mọi entry tính trên cửa sổ lịch sử `fingerprint` (cả hai tầng), ví dụ khi
+        cửa sổ đó được làm mới tại chỗ mà fingerprint không đổi. Trả về số entry RAM bị xóa.
+        """
+        fingerprint = tuple(fingerprint)
+        with self._lock:
+            stale = [key for key in self._entries if key[2] == fingerprint]
+            for key in stale:
+                del self._entries[key]
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    with open(path, "rb") as f:
+                        stored_key, _ = pickle.load(f)
+                    if stored_key[2] == fingerprint:
+                        os.remove(path)
+                except (OSError, pickle.UnpicklingError, EOFError, ValueError, IndexError):
+                    pass
+        return len(stale)
+
+    def _store(self, key, value, now):
+        expires_at = now + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_or_compute(self, key, compute_fn):
+        """Lấy từ cache, nếu miss thì tính bằng compute_fn() rồi lưu lại"""
+        value = self.get(key)
+        if value is None:
+            value = compute_fn()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Xóa cả hai tầng (gọi khi dữ liệu lịch sử hoặc model thay đổi)"""
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pkl"):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        return stats
+
+    # ---------- Tầng đĩa ----------
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.pkl")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self.ttl and os.path.getmtime(path) + self.ttl <= now:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+            # Phòng trường hợp trùng hash: so lại key đầy đủ
+            return value if stored_key == key else None
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix=".entry-", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except OSError as e:
+            print(f"⚠️ Không ghi được prediction cache ra đĩa: {e}")
+
+    def _prune_disk(self):
+        """Giữ max_entries file mới nhất (không có TTL thì đây là giới hạn duy nhất)"""
+        names = [name for name in os.listdir(self.disk_dir) if name.endswith(".pkl")]
+        if len(names) <= self.max_entries:
+            return
+        paths = [os.path.join(self.disk_dir, name) for name in names]
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                pass
+        for path in sorted(mtimes, key=mtimes.get, reverse=True)[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Cache dùng chung cho cả process: predictor mới (sau hot swap) vẫn dùng cache này,
+# key chứa version model nên kết quả của model cũ không bị trả nhầm
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = PredictionCache()
+    return _default_cache
@@ -7,10 +7,18 @@ import numpy as np
 import pandas as pd
 import joblib
 import os
+import threading
 from datetime import datetime, timedelta
 import warnings
+from sklearn.preprocessing import StandardScaler
 warnings.filterwarnings('ignore')
 
+from src.backend.tree_engine import CompiledTreeEnsemble, compiled_path_for, file_sha256
+from src.backend.forecaster import RecursiveForecaster
+from src.backend.feature_engine import StreamingFeatureState, season_code
+from src.backend.logic_engine import calculate_evn_bill_array
+from src.backend.prediction_cache import get_default_cache, make_key
+
 class EnergyPredictor:
     """
     Predictor with smart user adjustment based on:
@@ -36,64 +44,217 @@ class EnergyPredictor:
         'area_base': 50, 'area_increment': 0.01
     }
     
-    def __init__(self, model_path='checkpoints/best_model_random_forest.pkl'):
+    def __init__(self, model_path='checkpoints/best_model_lightgbm.pkl', use_compiled=True, lazy=True,
+                 cache=None):
         self.model_path = model_path
-        self.model = None
-        self.scaler = None
-        self.feature_names = None
-        self.load_model_if_exists()
+        # Ưu tiên bản cây đã compile (.trees.pkl) nếu có - suy luận bằng NumPy thuần
+        self.use_compiled = use_compiled
+        self._model = None
+        self._scaler = None
+        self._feature_names = None
+        # Lazy load: chỉ đọc model ở lần dự báo đầu tiên để khởi động nhanh
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # Cache pattern theo giờ: fingerprint cửa sổ lịch sử -> {'shape', 'peak_hours'}
+        # (predictor được chia sẻ giữa các session Streamlit -> mọi thao tác qua lock)
+        self._profile_cache = {}
+        self._profile_lock = threading.Lock()
+        # Cache kết quả dự báo (mặc định dùng chung cả process)
+        self.cache = cache if cache is not None else get_default_cache()
+        if not lazy:
+            self._ensure_loaded()
+
+    def _ensure_loaded(self):
+        """Load model đúng một lần (an toàn khi nhiều thread Streamlit cùng gọi)"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self.load_model_if_exists()
+
+    @property
+    def model(self):
+        self._ensure_loaded()
+        return self._model
+
+    @property
+    def scaler(self):
+        self._ensure_loaded()
+        return self._scaler
+
+    @property
+    def feature_names(self):
+        self._ensure_loaded()
+        return self._feature_names
+
+    @property
+    def model_version(self):
+        """
+        Định danh model cho cache key: đường dẫn + mtime của .pkl và của bản
+        compile .trees.pkl (registry mỗi version một thư mục)
+        """
+        try:
+            version = f"{self.model_path}@{os.stat(self.model_path).st_mtime_ns}"
+        except OSError:
+            version = f"{self.model_path}@missing"
+        if self.use_compiled:
+            try:
+                version += f"+trees@{os.stat(compiled_path_for(self.model_path)).st_mtime_ns}"
+            except OSError:
+                pass
+        return version
     
     def load_model_if_exists(self):
-        """Load package chứa model, scaler và feature names"""
+        """
+        Load package chứa model, scaler và feature names.
+        Mảng NumPy được memory-map read-only (mmap_mode='r') nên các worker
+        trên cùng máy dùng chung trang bộ nhớ thay vì mỗi process một bản.
+        """
+        try:
+            self._load_package()
+        finally:
+            self._loaded = True
+
+    def _load_package(self):
+        self._model, self._scaler, self._feature_names = None, None, None
+        compiled_path = compiled_path_for(self.model_path)
+        if self.use_compiled and os.path.exists(compiled_path):
+            try:
+                engine = CompiledTreeEnsemble.load(compiled_path, mmap_mode='r')
+                # Chỉ dùng bản compile build từ đúng file .pkl hiện tại: .pkl được thay/train
+                # lại mà export bị bỏ qua thì bản cây cũ không được phục vụ
+                if not os.path.exists(self.model_path) or engine.source_sha256 != file_sha256(self.model_path):
+                    print(f"⚠️ {compiled_path} không khớp {self.model_path} - dùng package gốc")
+                else:
+                    # Engine tự áp dụng scaler bên trong predict()
+                    self._model = engine
+                    self._feature_names = engine.feature_names
+                    print(f"✅ AI Ready: Đã tích hợp mô hình {engine.model_name} (compiled, {engine.n_trees} cây)")
+                    return
+            except Exception as e:
+                print(f"⚠️ Lỗi load compiled model, dùng package gốc: {e}")
+
         if os.path.exists(self.model_path):
             try:
-                package = joblib.load(self.model_path)
+                package = joblib.load(self.model_path, mmap_mode='r')
                 # Truy xuất từ dict package
-                self.model = package['model']
-                self.scaler = package['scaler']
-                self.feature_names = package['feature_names']
+                self._model = package['model']
+                self._scaler = package['scaler']
+                self._feature_names = package['feature_names']
                 print(f"✅ AI Ready: Đã tích hợp mô hình {package.get('model_name', 'Random Forest')}")
             except Exception as e:
                 print(f"❌ Lỗi load model package: {e}")
-                self.model = None
+                self._model = None
         else:
             print(f"⚠️ Không tìm thấy model tại {self.model_path} - Chạy chế độ Heuristic")
-            self.model = None
 
-    def predict_next_24h(self, last_sequence):
-        """Dự báo 24 giờ tới sử dụng model AI thật"""
+    def _build_feature_matrix(self, last_sequence, hours, start_time=None, history_df=None):
+        """
+        Dựng ma trận đặc trưng (hours x n_features) một lần duy nhất bằng NumPy,
+        đúng thứ tự cột của model. Nếu có history_df, các cột đo lường/rolling
+        lấy từ StreamingFeatureState (giống lúc train) thay vì điền 0 và mốc bắt
+        đầu mặc định là cuối history_df.
+        """
+        if start_time is None and history_df is not None and isinstance(history_df.index, pd.DatetimeIndex):
+            start_time = history_df.index[-1]
+        now = start_time or datetime.now()
+        last_sequence = np.asarray(last_sequence, dtype=float)
+
+        # Mốc thời gian tương lai: now + 1h ... now + hours
+        future_times = pd.DatetimeIndex([now + timedelta(hours=i) for i in range(1, hours + 1)])
+        months = future_times.month.values
+
+        # lag_24h: giá trị thứ i của chuỗi đầu vào, hết chuỗi thì giữ giá trị cuối
+        lag_idx = np.minimum(np.arange(hours), len(last_sequence) - 1)
+
+        columns = {
+            'hour': future_times.hour.values,
+            'weekday': future_times.weekday.values,
+            'day_of_week': future_times.weekday.values,
+            'month': months,
+            'season': season_code(months),
+            'lag_24h': last_sequence[lag_idx]
+        }
+
+        feature_names = self.feature_names or list(columns.keys())
+        if history_df is not None:
+            base_row = StreamingFeatureState().warm_start(history_df).materialize(feature_names)
+            X = np.tile(base_row, (hours, 1))
+        else:
+            X = np.zeros((hours, len(feature_names)), dtype=float)
+        for j, col in enumerate(feature_names):
+            if col in columns:
+                X[:, j] = columns[col]
+        return X
+
+    def predict_horizon(self, last_sequence, hours=24, start_time=None, history_df=None):
+        """
+        Dự báo `hours` giờ tới bằng MỘT lần transform + MỘT lần predict
+        (thay vì 24 lần DataFrame/transform/predict riêng lẻ).
+        """
         if self.model is None:
-            return np.full(24, np.mean(last_sequence))
+            return np.full(hours, np.mean(last_sequence))
 
         try:
-            now = datetime.now()
-            predictions = []
-            for i in range(1, 25):
-                future_time = now + timedelta(hours=i)
-                feat_dict = {
-                    'hour': future_time.hour,
-                    'day_of_week': future_time.weekday(),
-                    'month': future_time.month,
-                    'lag_24h': last_sequence[i-1] if i <= len(last_sequence) else last_sequence[-1]
-                }
-                X_df = pd.DataFrame([feat_dict])
-                if self.feature_names:
-                    for col in self.feature_names:
-                        if col not in X_df.columns: X_df[col] = 0
-                    X_df = X_df[self.feature_names]
-                
-                X_scaled = self.scaler.transform(X_df)
-                pred = self.model.predict(X_scaled)[0]
-                predictions.append(max(0.1, pred))
-            return np.array(predictions)
+            X = self._build_feature_matrix(last_sequence, hours, start_time, history_df)
+            return np.maximum(0.1, self._model_predict(X))
         except Exception as e:
             print(f"❌ Lỗi AI Predict: {e}")
-            return last_sequence
+            # Giống nhánh không có model: luôn trả đúng `hours` giá trị
+            return np.full(hours, np.mean(last_sequence))
+
+    def predict_next_24h(self, last_sequence, history_df=None, start_time=None):
+        """
+        Dự báo 24 giờ tới sử dụng model AI thật.
+        history_df (dữ liệu theo phút): dự báo đệ quy với đặc trưng đo lường/rolling
+        từ StreamingFeatureState như lúc train. Không có history_df thì các cột
+        đó bị điền 0 và dự báo gần như hằng số - chỉ còn để tương thích.
+        """
+        if history_df is not None and self.model is not None:
+            try:
+                return self.forecast_recursive(history_df, hours=24, start_time=start_time)
+            except Exception as e:
+                print(f"❌ Lỗi AI Forecast: {e}")
+        return self.predict_horizon(last_sequence, hours=24, start_time=start_time, history_df=history_df)
+
+    def _model_predict(self, X):
+        """
+        Scale (nếu dùng package gốc) rồi predict một ma trận đặc trưng.
+        StandardScaler và LightGBM được gọi thẳng (công thức / Booster) để bỏ phần
+        kiểm tra input của sklearn (~1ms mỗi lần): dự báo đệ quy gọi hàm này
+        với từng dòng một, 720 lần cho 30 ngày.
+        """
+        scaler = self.scaler
+        if scaler is None:
+            X_scaled = X
+        elif type(scaler) is StandardScaler and scaler.mean_ is not None and scaler.scale_ is not None:
+            X_scaled = (X - scaler.mean_) / scaler.scale_
+        else:
+            X_scaled = scaler.transform(X)
+        model = self.model
+        if hasattr(model, 'booster_'):
+            return model.booster_.predict(X_scaled)
+        return model.predict(X_scaled)
+
+    def forecast_recursive(self, history_df, hours, start_time=None):
+        """
+        Dự báo đệ quy `hours` giờ tới (có thể nhiều ngày): mỗi giờ dự báo được
+        đưa lại vào trạng thái lag/rolling cho giờ kế tiếp.
+        start_time mặc định là mốc cuối của history_df.
+        """
+        if self.model is None or not self.feature_names:
+            last_24h_data = history_df['Global_active_power'].values[-24:]
+            return self.predict_horizon(last_24h_data, hours=hours, start_time=start_time,
+                                        history_df=history_df)
+
+        forecaster = RecursiveForecaster(self._model_predict, self.feature_names, step_minutes=60)
+        return forecaster.warm_start(history_df, start_time).forecast(hours)
 
     def calculate_baseline_consumption(self, history_df):
         """Tính baseline từ dữ liệu lịch sử (Fallback)"""
         if 'Global_active_power' in history_df.columns:
-            return history_df['Global_active_power'].mean() * 24
+            # float(): cột float32 (compact dtypes) -> Python float để JSON/cache dùng được
+            return float(history_df['Global_active_power'].mean()) * 24
         return 8.0
 
     def calculate_user_adjustment_factor(self, user_params, current_month=None):
@@ -155,31 +316,111 @@ class EnergyPredictor:
             'confidence': confidence,
             'season': season
         }
-    def predict_user_consumption(self, history_df, user_params, days=30):
+
+    # Giá trị mặc định của form người dùng (giống các .get() ở trên)
+    USER_PARAM_DEFAULTS = {
+        'num_people': 3, 'area_m2': 60, 'house_type': 'Nhà phố',
+        'num_ac': 0, 'num_fridge': 1, 'num_tv': 0, 'num_washer': 0, 'num_water_heater': 0
+    }
+
+    def calculate_adjustment_arrays(self, params_frame, current_month=None):
         """
-        DỰ BÁO CHÍNH: Kết hợp AI RandomForest và Heuristic
+        Phiên bản vector hóa của calculate_user_adjustment_factor:
+        nhận DataFrame (mỗi dòng một hộ), trả về dict các cột NumPy.
+        """
+        n = len(params_frame)
+
+        def col(name):
+            default = self.USER_PARAM_DEFAULTS[name]
+            if name not in params_frame.columns:
+                return np.full(n, default, dtype=float)
+            return params_frame[name].fillna(default).to_numpy(dtype=float)
+
+        house_types = params_frame['house_type'] if 'house_type' in params_frame.columns else pd.Series(['Nhà phố'] * n)
+        house_factor = house_types.map(self.HOUSEHOLD_FACTORS['house_type']).fillna(1.0).to_numpy(dtype=float)
+
+        num_people = col('num_people')
+        area_m2 = col('area_m2')
+        people_factor = 1.0 + (num_people - self.HOUSEHOLD_FACTORS['people_base']) * self.HOUSEHOLD_FACTORS['people_increment']
+        area_factor = 1.0 + (area_m2 - self.HOUSEHOLD_FACTORS['area_base']) * self.HOUSEHOLD_FACTORS['area_increment']
+
+        month = current_month or datetime.now().month
+        season = 'summer' if month in [6,7,8] else 'winter' if month in [12,1,2] else 'spring'
+
+        ac = self.DEVICE_PROFILES['ac']
+        fridge = self.DEVICE_PROFILES['fridge']
+        tv = self.DEVICE_PROFILES['tv']
+        washer = self.DEVICE_PROFILES['washer']
+        heater = self.DEVICE_PROFILES['water_heater']
+        device_kwh = {
+            'Máy lạnh': col('num_ac') * ac['power_kw'] * ac['hours_per_day'] * ac['seasonal_factor'][season] * 30,
+            'Tủ lạnh': col('num_fridge') * fridge['power_kw'] * fridge['hours_per_day'] * fridge['duty_cycle'] * 30,
+            'TV': col('num_tv') * tv['power_kw'] * tv['hours_per_day'] * 30,
+            'Máy giặt': col('num_washer') * washer['power_kw'] * washer['times_per_week'] * washer['hours_per_time'] * 4,
+            'Bình nóng lạnh': col('num_water_heater') * heater['power_kw'] * heater['hours_per_day'] * 30
+        }
+        total_device_kwh = np.sum(list(device_kwh.values()), axis=0)
+
+        # Độ tin cậy: cùng quy tắc với bản scalar
+        people_conf = np.where((num_people >= 1) & (num_people <= 6), 1.0,
+                               np.maximum(0.8, 1.0 - np.abs(num_people - 6) * 0.02))
+        area_conf = np.where((area_m2 >= 25) & (area_m2 <= 150), 1.0,
+                             np.maximum(0.8, 1.0 - np.abs(area_m2 - 150) / 200))
+        model_bonus = 0.1 if self.model is not None else 0.0
+        confidence = np.clip((people_conf + area_conf) / 2 + model_bonus, 0.6, 0.95)
+
+        return {
+            'overall_factor': house_factor * people_factor * area_factor,
+            'device_kwh': device_kwh,
+            'total_device_kwh': total_device_kwh,
+            'confidence': confidence,
+            'season': season
+        }
+
+    def _effective_baseline_daily(self, history_df, days=1):
+        """
+        Baseline kWh/ngày: ưu tiên dự báo AI đệ quy cho cả `days` ngày
+        (trung bình mỗi ngày), fallback về trung bình lịch sử
         """
-        # --- BƯỚC 1: LẤY BASELINE 
         ai_forecast_daily_kwh = None
         if self.model is not None:
             try:
-                # Lấy 24h gần nhất từ history làm đầu vào AI
-                last_24h_data = history_df['Global_active_power'].values[-24:]
-                forecast_24h = self.predict_next_24h(last_24h_data)
-                ai_forecast_daily_kwh = np.sum(forecast_24h) 
-                print(f"🤖 AI Forecast (24h): {ai_forecast_daily_kwh:.2f} kWh")
+                # Mỗi giờ dự báo công suất TB (kW) x 1h = kWh
+                forecast_hourly = self.forecast_recursive(history_df, hours=days * 24)
+                ai_forecast_daily_kwh = np.sum(forecast_hourly) / days
+                print(f"🤖 AI Forecast ({days} ngày): {ai_forecast_daily_kwh:.2f} kWh/ngày")
             except:
                 pass
 
         # Fallback về baseline lịch sử nếu AI lỗi hoặc không có model
         history_baseline_daily = self.calculate_baseline_consumption(history_df)
-        
-        # Baseline sử dụng để tính toán tháng
-        effective_baseline_daily = ai_forecast_daily_kwh if ai_forecast_daily_kwh else history_baseline_daily
+        return ai_forecast_daily_kwh if ai_forecast_daily_kwh else history_baseline_daily
+
+    def predict_user_consumption(self, history_df, user_params, days=30, use_cache=True, current_month=None):
+        """
+        DỰ BÁO CHÍNH: Kết hợp AI RandomForest và Heuristic.
+        Form giống nhau trên cùng cửa sổ lịch sử, cùng model và cùng tháng được lấy từ cache.
+        current_month: tháng cho hệ số mùa (mặc định tháng hiện tại).
+        """
+        # Chốt tháng một lần: vừa vào key vừa dùng để tính, không lệch nhau khi qua tháng
+        month = current_month or datetime.now().month
+        if not use_cache or self.cache is None:
+            return self._predict_user_consumption(history_df, user_params, days, month)
+
+        key = make_key(user_params, self.model_version, self.history_fingerprint(history_df),
+                       days, defaults=self.USER_PARAM_DEFAULTS, month=month)
+        return self.cache.get_or_compute(
+            key, lambda: self._predict_user_consumption(history_df, user_params, days, month)
+        )
+
+    def _predict_user_consumption(self, history_df, user_params, days=30, current_month=None):
+        """Pipeline đầy đủ (baseline AI + thiết bị + blend), không qua cache"""
+        # --- BƯỚC 1: LẤY BASELINE 
+        effective_baseline_daily = self._effective_baseline_daily(history_df, days)
         baseline_monthly = effective_baseline_daily * days
         
         # --- BƯỚC 2: TÍNH TOÁN USER ADJUSTMENT (Thiết bị) ---
-        adjustment = self.calculate_user_adjustment_factor(user_params)
+        adjustment = self.calculate_user_adjustment_factor(user_params, current_month)
         device_monthly = adjustment['total_device_kwh']
         
         # --- BƯỚC 3: BLEND (Trộn AI và Heuristic) ---
@@ -199,7 +440,8 @@ class EnergyPredictor:
         predicted_kwh = raw_predicted_kwh * 0.9
         
         # --- BƯỚC 4: KẾT QUẢ ---
-        raw_shape = self._extract_hourly_pattern(history_df)
+        profile = self.get_hourly_profile(history_df)
+        raw_shape = profile['shape']
         # Tính mức kWh trung bình mỗi giờ dựa trên dự báo mới
         avg_hourly_kwh = (predicted_kwh / days) / 24
         # Nhân hình dạng với mức trung bình để ra pattern thực tế
@@ -224,20 +466,159 @@ class EnergyPredictor:
                 'pattern': pattern_weight,
                 'device': device_weight
             },
-            'peak_hours': [i for i, h in enumerate(self._extract_hourly_pattern(history_df)) if h > 1.2]
+            'peak_hours': list(profile['peak_hours'])
         }
         
+    def predict_many(self, history_df, params_frame, days=30, baseline_monthly=None):
+        """
+        Dự báo hàng loạt cho nhiều hộ gia đình (mỗi dòng params_frame là một hộ).
+        Baseline AI và hình dạng theo giờ được tính MỘT lần từ history_df rồi
+        dùng chung; phần thiết bị và blend tính bằng phép toán cột NumPy.
+        baseline_monthly: baseline (kWh) đã có cho cùng history_df và days, ví dụ
+        result['baseline_kwh'] của predict_user_consumption -> bỏ qua dự báo đệ quy.
+        Trả về DataFrame cùng index với params_frame.
+        """
+        # Baseline dùng chung cho cả đợt
+        if baseline_monthly is None:
+            baseline_monthly = self._effective_baseline_daily(history_df, days) * days
+        adjustment = self.calculate_adjustment_arrays(params_frame)
+        device_monthly = adjustment['total_device_kwh']
+
+        # Blend: cùng công thức với predict_user_consumption
+        if baseline_monthly > 0:
+            ratio = device_monthly / baseline_monthly
+        else:
+            ratio = np.ones_like(device_monthly)
+        pattern_weight = np.clip(1.0 - np.abs(1.0 - ratio), 0.3, 0.8)
+        device_weight = 1.0 - pattern_weight
+
+        raw_predicted_kwh = (baseline_monthly * pattern_weight + device_monthly * device_weight) * adjustment['overall_factor']
+        predicted_kwh = raw_predicted_kwh * 0.9
+
+        confidence = adjustment['confidence']
+        margin = predicted_kwh * (1 - confidence) * 0.5
+
+        result = pd.DataFrame({
+            'total_kwh': predicted_kwh,
+            'lower_bound': predicted_kwh - margin,
+            'upper_bound': predicted_kwh + margin,
+            'confidence': confidence,
+            'daily_avg_kwh': predicted_kwh / days,
+            'device_kwh': device_monthly,
+            'baseline_kwh': baseline_monthly,
+            'overall_factor': adjustment['overall_factor'],
+            'pattern_weight': pattern_weight,
+            'device_weight': device_weight
+        }, index=params_frame.index)
+        for device_name, kwh in adjustment['device_kwh'].items():
+            result[f'kwh_{device_name}'] = kwh
+
+        # Hình dạng theo giờ và giờ cao điểm giống nhau cho mọi hộ
+        profile = self.get_hourly_profile(history_df)
+        result.attrs['ai_used'] = self.model is not None
+        result.attrs['season'] = adjustment['season']
+        result.attrs['hourly_shape'] = list(profile['shape'])
+        result.attrs['peak_hours'] = list(profile['peak_hours'])
+        return result
+
+    def scenario_sweep(self, history_df, grid, base_params=None, days=30, baseline_monthly=None):
+        """
+        What-if: đánh giá toàn bộ lưới tham số trong MỘT lần predict_many.
+        grid: dict tham số -> list giá trị, ví dụ
+              {'num_ac': range(6), 'house_type': ['Chung cư', 'Nhà phố', 'Biệt thự']}
+        base_params: các tham số còn lại giữ cố định (mặc định USER_PARAM_DEFAULTS).
+        baseline_monthly: như predict_many - truyền result['baseline_kwh'] để không
+        chạy lại dự báo đệ quy days*24 bước.
+        Trả về DataFrame MultiIndex theo các trục của grid với total_kwh, cost...;
+        attrs['axes'] giữ giá trị từng trục để reshape thành cube.
+        """
+        axes = {name: list(values) for name, values in grid.items()}
+        index = pd.MultiIndex.from_product(list(axes.values()), names=list(axes.keys()))
+
+        params_frame = index.to_frame(index=False)
+        for name, value in {**self.USER_PARAM_DEFAULTS, **(base_params or {})}.items():
+            if name not in axes:
+                params_frame[name] = value
+
+        result = self.predict_many(history_df, params_frame, days=days, baseline_monthly=baseline_monthly)
+        result.index = index
+        result['cost'] = calculate_evn_bill_array(result['total_kwh'].to_numpy())
+        result.attrs['axes'] = axes
+        return result
+
+    @staticmethod
+    def scenario_cube(sweep, column='total_kwh'):
+        """Reshape một cột của scenario_sweep thành mảng N chiều theo thứ tự trục"""
+        shape = tuple(len(v) for v in sweep.attrs['axes'].values())
+        return sweep[column].to_numpy().reshape(shape)
+
+    # Số profile tối đa giữ trong cache (mỗi profile chỉ 24 số + list giờ)
+    PROFILE_CACHE_SIZE = 16
+
+    @staticmethod
+    def history_fingerprint(history_df):
+        """
+        Fingerprint rẻ (O(1)) của cửa sổ lịch sử: số dòng, mốc đầu/cuối
+        và giá trị đầu/cuối. Dữ liệu mới được append sẽ đổi fingerprint.
+        Giá trị NaN được quy về None: float('nan') != float('nan') nên key chứa
+        NaN sẽ không bao giờ khớp lại.
+        """
+        n = len(history_df)
+        if n == 0:
+            return (0,)
+        power = history_df['Global_active_power'] if 'Global_active_power' in history_df.columns else None
+
+        def edge(i):
+            if power is None:
+                return None
+            value = float(power.iloc[i])
+            return None if np.isnan(value) else value
+
+        return (n, str(history_df.index[0]), str(history_df.index[-1]), edge(0), edge(-1))
+
+    def get_hourly_profile(self, history_df):
+        """
+        Trả về {'shape': 24 giá trị, 'peak_hours': [...]} của cửa sổ lịch sử,
+        chỉ tính một lần cho mỗi fingerprint rồi dùng lại.
+        """
+        key = self.history_fingerprint(history_df)
+        with self._profile_lock:
+            profile = self._profile_cache.get(key)
+        if profile is not None:
+            return profile
+
+        # Tính ngoài lock; hai thread cùng miss chỉ tính trùng, kết quả như nhau
+        shape = tuple(self._extract_hourly_pattern(history_df))
+        profile = {
+            'shape': shape,
+            'peak_hours': tuple(i for i, h in enumerate(shape) if h > 1.2)
+        }
+        with self._profile_lock:
+            if key not in self._profile_cache and len(self._profile_cache) >= self.PROFILE_CACHE_SIZE:
+                # Bỏ profile cũ nhất (dict giữ thứ tự chèn)
+                self._profile_cache.pop(next(iter(self._profile_cache)))
+            self._profile_cache[key] = profile
+        return profile
+
+    def invalidate_profile_cache(self):
+        """Xóa cache pattern theo giờ và cache kết quả - gọi khi có dữ liệu lịch sử mới"""
+        with self._profile_lock:
+            self._profile_cache.clear()
+        if self.cache is not None:
+            self.cache.clear()
+
     def _extract_hourly_pattern(self, history_df):
         """Trích xuất pattern tiêu thụ thực tế từ dữ liệu lịch sử"""
         try:
-            # Kiểm tra nếu chưa có cột 'hour', tạo từ index (nếu index là datetime)
-            df = history_df.copy()
-            if 'hour' not in df.columns:
-                df['hour'] = df.index.hour
+            # Dùng cột 'hour' nếu có, nếu không lấy từ index (không copy DataFrame)
+            if 'hour' in history_df.columns:
+                hours = history_df['hour']
+            else:
+                hours = history_df.index.hour
                 
-            if 'Global_active_power' in df.columns:
+            if 'Global_active_power' in history_df.columns:
                 # Tính giá trị trung bình tiêu thụ cho mỗi khung giờ (0-23h)
-                hourly_avg = df.groupby('hour')['Global_active_power'].mean()
+                hourly_avg = history_df['Global_active_power'].groupby(hours).mean()
                 # Đảm bảo đủ 24 giờ, điền 0 nếu giờ đó không có dữ liệu
                 pattern = hourly_avg.reindex(range(24), fill_value=0).values
                 
@@ -253,11 +634,12 @@ class EnergyPredictor:
         return [0.5, 0.4, 0.3, 0.3, 0.4, 0.6, 1.2, 1.5, 1.0, 0.8, 0.7, 0.7, 
                 0.8, 0.9, 0.8, 0.9, 1.1, 1.8, 2.2, 2.1, 1.5, 1.0, 0.7, 0.6]
     
-    def get_saving_recommendations(self, result, user_params):
+    def get_saving_recommendations(self, result, user_params, history_df=None):
         """
         Tạo đề xuất tiết kiệm THÔNG MINH dựa trên:
         1. Thiết bị nào tiêu thụ nhiều nhất
-        2. Giờ nào cao điểm
+        2. Giờ nào cao điểm (result['peak_hours'], hoặc tính từ history_df của
+           chính người dùng này; không có thì bỏ qua đề xuất giờ cao điểm)
         3. Mùa hiện tại
         """
         
@@ -329,8 +711,10 @@ class EnergyPredictor:
                     'saving': f'{saving_kwh:.0f} kWh ≈ {saving_money:,.0f}đ/tháng'
                 })
         
-        # Đề xuất về giờ cao điểm
-        peak_hours = result['peak_hours']
+        # Đề xuất về giờ cao điểm (profile theo fingerprint của history_df nếu result không có)
+        peak_hours = result.get('peak_hours')
+        if peak_hours is None:
+            peak_hours = self.get_hourly_profile(history_df)['peak_hours'] if history_df is not None else []
         if len(peak_hours) > 0:
             peak_str = ", ".join([f"{h}h" for h in sorted(peak_hours)[:5]])
             
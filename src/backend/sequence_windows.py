@@ -0,0 +1,86 @@
+"""
+Sequence Windows - Chuỗi đầu vào cho LSTM không copy dữ liệu
+- sliding_windows: view (n - seq_length, seq_length, n_features) trên mảng gốc
+  bằng stride, windows[i] = X[i:i+seq_length], không tốn thêm bộ nhớ
+- WindowBatches: sinh batch (X, y) theo yêu cầu, chỉ batch hiện tại được copy
+  (64 x 1440 x 13 float32 ≈ 4.8 MB), nên lookback 1 ngày vẫn vừa RAM.
+  Train / validation dùng chung một mảng gốc qua subset()
+Không phụ thuộc TensorFlow: train_build.py bọc lại thành keras Sequence.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(X, seq_length):
+    """
+    View chỉ đọc các cửa sổ X[i:i+seq_length] với i = 0 .. n - seq_length - 1
+    (mỗi cửa sổ có target y[i + seq_length], giống create_sequences cũ)
+    """
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X[:, None]
+    n_windows = max(len(X) - seq_length, 0)
+    if n_windows == 0:
+        return np.empty((0, seq_length, X.shape[1]), dtype=X.dtype)
+    # sliding_window_view cho (n - seq + 1, n_features, seq) -> đổi trục, vẫn là view
+    return sliding_window_view(X, seq_length, axis=0).transpose(0, 2, 1)[:n_windows]
+
+
+class WindowBatches:
+    """
+    Batch (X_window, y_next) sinh khi cần. Dùng được như list batch
+    (len / [i]) hoặc iterator; shuffle=True đảo thứ tự cửa sổ mỗi epoch.
+    """
+
+    def __init__(self, X, y, seq_length, batch_size=64, shuffle=False, seed=42, dtype=np.float32):
+        self.seq_length = seq_length
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self._rng = np.random.default_rng(seed)
+        # Bản float32 duy nhất của dữ liệu; mọi cửa sổ là view trên mảng này
+        self.X = np.ascontiguousarray(X, dtype=dtype)
+        self.windows = sliding_windows(self.X, seq_length)
+        self.targets = np.asarray(y, dtype=dtype)[seq_length:seq_length + len(self.windows)]
+        self.indices = np.arange(len(self.windows))
+        if shuffle:
+            self._rng.shuffle(self.indices)
+
+    def subset(self, start, stop, shuffle=False, batch_size=None):
+        """Các cửa sổ [start, stop) - dùng chung mảng gốc, không copy dữ liệu"""
+        part = object.__new__(WindowBatches)
+        part.seq_length = self.seq_length
+        part.batch_size = batch_size or self.batch_size
+        part.shuffle = shuffle
+        part._rng = np.random.default_rng(self._rng.integers(2**32))
+        part.X, part.windows, part.targets = self.X, self.windows, self.targets
+        part.indices = np.arange(start, min(stop, len(self.windows)))
+        if shuffle:
+            part._rng.shuffle(part.indices)
+        return part
+
+    def __len__(self):
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, batch):
+        if batch < 0 or batch >= len(self):
+            raise IndexError(batch)
+        # Fancy indexing chỉ copy đúng các cửa sổ của batch này
+        idx = self.indices[batch * self.batch_size:(batch + 1) * self.batch_size]
+        return self.windows[idx], self.targets[idx]
+
+    def __iter__(self):
+        for batch in range(len(self)):
+            yield self[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self.indices)
+
+    @property
+    def sample_count(self):
+        return len(self.indices)
+
+    def target_values(self):
+        """y theo đúng thứ tự batch (dùng để tính metric sau predict)"""
+        return self.targets[self.indices]
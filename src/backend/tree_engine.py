@@ -0,0 +1,337 @@
+"""
+Compiled Tree Engine - Suy luận ensemble cây bằng NumPy thuần
+Làm phẳng các cây LightGBM / RandomForest thành mảng liên tục
+(feature, threshold, children, leaf value) và dự báo theo batch,
+bỏ qua toàn bộ chi phí cố định của predict stack trong thư viện.
+"""
+
+import os
+import sys
+import hashlib
+import numpy as np
+import joblib
+
+# Mã missing_type theo quy ước của LightGBM
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_CODES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+# LightGBM coi |x| <= kZeroThreshold là 0
+_ZERO_THRESHOLD = 1e-35
+
+
+def compiled_path_for(model_path):
+    """checkpoints/best_model_x.pkl -> checkpoints/best_model_x.trees.pkl"""
+    root, _ = os.path.splitext(model_path)
+    return f"{root}.trees.pkl"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash nội dung file (đọc theo chunk để không tốn RAM)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _NodeBuffer:
+    """Gom node của mọi cây vào các list phẳng trước khi chuyển sang NumPy"""
+
+    def __init__(self):
+        self.feature, self.threshold = [], []
+        self.left, self.right = [], []
+        self.value, self.default_left, self.missing_type = [], [], []
+
+    def add(self, feature=-1, threshold=0.0, value=0.0, default_left=False, missing_type=MISSING_NONE):
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.value.append(value)
+        self.default_left.append(default_left)
+        self.missing_type.append(missing_type)
+        return len(self.feature) - 1
+
+    def to_arrays(self):
+        return {
+            'feature': np.asarray(self.feature, dtype=np.int32),
+            'threshold': np.asarray(self.threshold, dtype=np.float64),
+            'left': np.asarray(self.left, dtype=np.int32),
+            'right': np.asarray(self.right, dtype=np.int32),
+            'value': np.asarray(self.value, dtype=np.float64),
+            'default_left': np.asarray(self.default_left, dtype=bool),
+            'missing_type': np.asarray(self.missing_type, dtype=np.int8)
+        }
+
+
+def _flatten_lightgbm(booster):
+    """Làm phẳng booster LightGBM (dump_model) thành mảng node"""
+    dump = booster.dump_model()
+    if dump.get('num_class', 1) != 1:
+        raise NotImplementedError("Chỉ hỗ trợ LightGBM hồi quy (num_class=1)")
+
+    buf = _NodeBuffer()
+    roots, depths = [], []
+
+    for tree in dump['tree_info']:
+        if tree.get('num_cat', 0) > 0:
+            raise NotImplementedError("Chưa hỗ trợ split categorical")
+
+        # Duyệt bằng stack để không bị giới hạn đệ quy
+        root_struct = tree['tree_structure']
+        root = buf.add()
+        roots.append(root)
+        max_depth = 0
+        stack = [(root_struct, root, 0)]
+        while stack:
+            node, idx, depth = stack.pop()
+            max_depth = max(max_depth, depth)
+            if 'leaf_value' in node:
+                buf.value[idx] = node['leaf_value']
+                continue
+            if node.get('decision_type', '<=') != '<=':
+                raise NotImplementedError(f"decision_type không hỗ trợ: {node['decision_type']}")
+            buf.feature[idx] = node['split_feature']
+            buf.threshold[idx] = node['threshold']
+            buf.default_left[idx] = node.get('default_left', True)
+            buf.missing_type[idx] = _MISSING_CODES.get(node.get('missing_type', 'None'), MISSING_NONE)
+            left, right = buf.add(), buf.add()
+            buf.left[idx], buf.right[idx] = left, right
+            stack.append((node['left_child'], left, depth + 1))
+            stack.append((node['right_child'], right, depth + 1))
+        depths.append(max_depth)
+
+    arrays = buf.to_arrays()
+    arrays.update({
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': int(max(depths) if depths else 0),
+        'aggregation': 'mean' if dump.get('average_output') else 'sum',
+        'float32_inputs': False
+    })
+    return arrays
+
+
+def _flatten_sklearn_forest(forest):
+    """Làm phẳng RandomForest/ExtraTrees/GradientBoosting... (sklearn) thành mảng node"""
+    buf = _NodeBuffer()
+    roots, depths = [], []
+
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        offset = len(buf.feature)
+        roots.append(offset)
+        depths.append(int(tree.max_depth))
+        is_leaf = tree.children_left == -1
+        missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=bool))
+
+        buf.feature.extend(np.where(is_leaf, -1, tree.feature).tolist())
+        buf.threshold.extend(tree.threshold.tolist())
+        buf.left.extend(np.where(is_leaf, -1, tree.children_left + offset).tolist())
+        buf.right.extend(np.where(is_leaf, -1, tree.children_right + offset).tolist())
+        buf.value.extend(tree.value[:, 0, 0].tolist())
+        buf.default_left.extend(np.asarray(missing_left, dtype=bool).tolist())
+        buf.missing_type.extend([MISSING_NAN] * tree.node_count)
+
+    arrays = buf.to_arrays()
+    arrays.update({
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': int(max(depths) if depths else 0),
+        'aggregation': 'mean',
+        # sklearn ép input về float32 trước khi so sánh với threshold
+        'float32_inputs': True
+    })
+    return arrays
+
+
+def flatten_model(model):
+    """Chuyển model đã train thành dict các mảng NumPy liên tục"""
+    if hasattr(model, 'booster_'):
+        return _flatten_lightgbm(model.booster_)
+    if hasattr(model, 'dump_model'):
+        return _flatten_lightgbm(model)
+    if hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'tree_'):
+        return _flatten_sklearn_forest(model)
+    raise NotImplementedError(f"Không hỗ trợ compile model loại {type(model).__name__}")
+
+
+def _build_eval_arrays(arrays):
+    """
+    Mảng phục vụ duyệt cây: lá trỏ về chính nó (feature 0, threshold +inf)
+    nên mọi dòng có thể đi đúng max_depth bước mà không cần mask.
+    """
+    feature = arrays['feature']
+    n_nodes = len(feature)
+    is_leaf = feature < 0
+    self_index = np.arange(n_nodes)
+    children = np.empty(2 * n_nodes, dtype=np.intp)
+    children[0::2] = np.where(is_leaf, self_index, arrays['left'])
+    children[1::2] = np.where(is_leaf, self_index, arrays['right'])
+    return {
+        'eval_feature': np.where(is_leaf, 0, feature).astype(np.intp),
+        'eval_threshold': np.where(is_leaf, np.inf, arrays['threshold']),
+        'children': children
+    }
+
+
+def export_compiled_model(package, output_path, source_sha256=None):
+    """
+    Xuất package (dict model/scaler/feature_names như save_model_package)
+    sang định dạng mảng phẳng, lưu bằng joblib cạnh file .pkl gốc.
+    source_sha256: hash file .pkl đã ghi của package - predictor chỉ dùng bản
+    compile khi hash này khớp file .pkl hiện tại.
+    """
+    compiled = flatten_model(package['model'])
+    compiled.update(_build_eval_arrays(compiled))
+
+    scaler = package.get('scaler')
+    metrics = package.get('metrics')
+    if hasattr(metrics, 'to_dict'):
+        metrics = metrics.to_dict()
+    n_features = len(package['feature_names']) if package.get('feature_names') else None
+    compiled.update({
+        'feature_names': list(package['feature_names']) if package.get('feature_names') else None,
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64) if scaler is not None else None,
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64) if scaler is not None else None,
+        'n_features': n_features,
+        'model_name': package.get('model_name'),
+        'metrics': metrics,
+        'timestamp': package.get('timestamp'),
+        'source_sha256': source_sha256
+    })
+
+    # Không nén: joblib chỉ memory-map được mảng NumPy trong file không nén
+    joblib.dump(compiled, output_path, compress=0)
+    print(f"   ✅ Compiled trees saved: {output_path} "
+          f"({len(compiled['roots'])} trees, {len(compiled['feature'])} nodes)")
+    return output_path
+
+
+def export_from_checkpoint(model_path):
+    """Đọc package .pkl và ghi file .trees.pkl bên cạnh"""
+    package = joblib.load(model_path)
+    return export_compiled_model(package, compiled_path_for(model_path), file_sha256(model_path))
+
+
+class CompiledTreeEnsemble:
+    """
+    Evaluator batch bằng NumPy cho ensemble cây đã làm phẳng.
+    predict() nhận ma trận đặc trưng CHƯA scale (scaler được áp dụng bên trong).
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.default_left = arrays['default_left']
+        self.missing_type = arrays['missing_type']
+        self.roots = arrays['roots']
+        self.max_depth = arrays['max_depth']
+        self.aggregation = arrays['aggregation']
+        self.float32_inputs = arrays['float32_inputs']
+        self.feature_names = arrays.get('feature_names')
+        self.scaler_mean = arrays.get('scaler_mean')
+        self.scaler_scale = arrays.get('scaler_scale')
+        self.model_name = arrays.get('model_name')
+        self.metrics = arrays.get('metrics')
+        # Hash của package .pkl nguồn (None với file export trước khi có trường này)
+        self.source_sha256 = arrays.get('source_sha256')
+        self.has_missing_rules = bool(np.any(self.missing_type != MISSING_NONE))
+
+        # Mảng duyệt cây được tính sẵn lúc export để có thể mmap chung giữa các worker;
+        # file cũ không có thì tính lại trong bộ nhớ
+        if 'eval_feature' not in arrays:
+            arrays = {**arrays, **_build_eval_arrays(arrays)}
+        self._eval_feature = arrays['eval_feature']
+        self._eval_threshold = arrays['eval_threshold']
+        self._children = arrays['children']
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load file .trees.pkl. Mặc định memory-map read-only: mọi process trên
+        cùng máy dùng chung các trang vật lý của file (page cache).
+        """
+        return cls(joblib.load(path, mmap_mode=mmap_mode))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def _prepare(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.scaler_mean is not None:
+            X = (X - self.scaler_mean) / self.scaler_scale
+        if self.float32_inputs:
+            X = X.astype(np.float32).astype(np.float64)
+        return X
+
+    # Số dòng xử lý mỗi khối: giữ mảng node đủ nhỏ để nằm trong cache CPU
+    BLOCK_ROWS = 512
+
+    def predict(self, X):
+        """Dự báo cho cả batch, chia thành các khối BLOCK_ROWS dòng"""
+        X = self._prepare(X)
+        if X.shape[0] <= self.BLOCK_ROWS:
+            return self._predict_block(X)
+        return np.concatenate([
+            self._predict_block(X[start:start + self.BLOCK_ROWS])
+            for start in range(0, X.shape[0], self.BLOCK_ROWS)
+        ])
+
+    def _predict_block(self, X):
+        """Duyệt đồng thời (n_rows x n_trees) theo từng tầng cây"""
+        n, n_features = X.shape
+        X_flat = X.ravel()
+
+        # node[i * n_trees + t]: vị trí hiện tại của dòng i trong cây t
+        node = np.tile(self.roots.astype(np.intp), n)
+        row_offset = np.repeat(np.arange(n, dtype=np.intp) * n_features, self.n_trees)
+        # Chỉ áp dụng quy tắc missing khi thật sự cần (input có NaN hoặc model có rule Zero/NaN)
+        check_missing = self.has_missing_rules or bool(np.isnan(X_flat).any())
+
+        for _ in range(self.max_depth):
+            feat = self._eval_feature.take(node)
+            x = X_flat.take(row_offset + feat)
+            go_right = ~(x <= self._eval_threshold.take(node))
+
+            if check_missing:
+                go_right = self._apply_missing_rules(node, x, go_right)
+
+            node = self._children.take(2 * node + go_right)
+
+        leaf_values = self.value.take(node).reshape(n, self.n_trees)
+        if self.aggregation == 'mean':
+            return leaf_values.mean(axis=1)
+        return leaf_values.sum(axis=1)
+
+    def _apply_missing_rules(self, node, x, go_right):
+        """Quy tắc missing value của LightGBM/sklearn (chỉ chạy khi input có NaN/0)"""
+        is_nan = np.isnan(x)
+        maybe_zero = np.abs(x) <= _ZERO_THRESHOLD
+        if not (is_nan.any() or maybe_zero.any()):
+            return go_right
+
+        mtype = self.missing_type.take(node)
+        # Missing-type khác NaN: NaN được coi như 0
+        nan_as_zero = is_nan & (mtype != MISSING_NAN)
+        x = np.where(nan_as_zero, 0.0, x)
+        go_right = np.where(nan_as_zero, ~(x <= self._eval_threshold.take(node)), go_right)
+
+        use_default = ((mtype == MISSING_ZERO) & (np.abs(x) <= _ZERO_THRESHOLD)) | \
+                      ((mtype == MISSING_NAN) & is_nan)
+        # Lá không bao giờ dùng default (giữ nguyên vị trí)
+        use_default &= self.feature.take(node) >= 0
+        return np.where(use_default, ~self.default_left.take(node), go_right)
+
+
+# ================== CLI ==================
+
+if __name__ == "__main__":
+    # python -m src.backend.tree_engine checkpoints/best_model_lightgbm.pkl
+    paths = sys.argv[1:] or ['checkpoints/best_model_lightgbm.pkl']
+    for path in paths:
+        print(f"🔧 Compiling {path}...")
+        export_from_checkpoint(path)
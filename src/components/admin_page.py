@@ -8,6 +8,7 @@ import time
 from datetime import datetime, timedelta
 from src.backend.auth import load_users, USER_DB_PATH
 from src.backend.history import load_history
+from src.backend.prediction_cache import get_default_cache
 from src.utils.style import card_container
 
 try:
@@ -88,6 +89,24 @@ def analyze_data(users):
         })
     return total, active_now, table_data
 
+def render_prediction_cache_stats():
+    """Thống kê cache kết quả dự báo (hit/miss, kích thước, TTL)"""
+    cache = get_default_cache()
+    stats = cache.stats()
+    with st.container(border=True):
+        st.markdown("##### ⚡ Cache Dự Báo")
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Hit rate", f"{stats['hit_rate']*100:.1f}%")
+        m2.metric("Hits", f"{stats['hits'] + stats['disk_hits']:,}", delta=f"{stats['disk_hits']} từ đĩa", delta_color="off")
+        m3.metric("Misses", f"{stats['misses']:,}")
+        m4.metric("Kích thước", f"{stats['size']}/{stats['max_entries']}", delta=f"{stats['evictions']} bị loại", delta_color="off")
+        ttl_text = f"{stats['ttl'] // 60:.0f} phút" if stats['ttl'] else "không giới hạn"
+        st.caption(f"TTL: {ttl_text} · Hết hạn: {stats['expired']}")
+        if st.button("🧹 Xóa cache dự báo"):
+            cache.clear()
+            log_info("Admin đã xóa cache dự báo")
+            st.rerun()
+
 def render_admin_page():
     # Header & Nút Làm mới
     c_head, c_ref = st.columns([5, 1])
@@ -138,6 +157,8 @@ def render_admin_page():
                 fig_pie.update_layout(height=300, margin=dict(l=10,r=10,t=10,b=10), paper_bgcolor='rgba(0,0,0,0)', showlegend=True, legend=dict(orientation="h", y=-0.2))
                 st.plotly_chart(fig_pie, width='stretch')
 
+        render_prediction_cache_stats()
+
     # --- TAB 2: USER MANAGEMENT ---
     with tabs[1]:
         with st.container(border=True):
@@ -19,9 +19,14 @@ def render_forecast(predictor, history_df, current_time):
     input_data = past_24h['Global_active_power'].values[-24:] 
     
     # 3. Thực hiện dự báo thông qua Predictor
+    # Truyền cả lịch sử (đến current_time) để model có đủ đặc trưng đo lường/rolling như lúc train
     # Sử dụng spinner để thông báo cho người dùng khi AI đang xử lý
     with st.spinner('AI đang tính toán dựa trên mô hình RandomForest...'):
-        forecast_vals = predictor.predict_next_24h(input_data)
+        forecast_vals = predictor.predict_next_24h(
+            input_data,
+            history_df=history_df.loc[:current_time],
+            start_time=current_time
+        )
         
     # 4. Tạo trục thời gian cho 24 giờ tiếp theo trong tương lai
     future_time = [current_time + pd.Timedelta(hours=i) for i in range(1, 25)]
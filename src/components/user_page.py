@@ -13,19 +13,66 @@ import time
 
 from src.backend.history import save_history, load_history
 from src.backend.logic_engine import calculate_evn_bill
-from src.backend.predictor import EnergyPredictor
+from src.backend.model_registry import ManagedPredictor
 from src.backend.data_loader import load_dataset
 from src.utils.style import render_hero_section
 
 @st.cache_resource(show_spinner=False)
+def get_predictor_handle():
+    """Một handle cho mỗi process - tự swap sang model mới khi registry promote"""
+    return ManagedPredictor()
+
 def get_predictor():
-    return EnergyPredictor()
+    return get_predictor_handle().get()
 
 @st.cache_data(show_spinner=False)
 def get_historical_data():
-    """Load dữ liệu lịch sử - lấy sample lớn hơn để có pattern tốt"""
-    return load_dataset(nrows=200000)  # 200k điểm ≈ 138 ngày
+    """Load 24h dữ liệu MỚI NHẤT - chỉ đọc row group của tháng cuối, không phụ thuộc kích thước file"""
+    return load_dataset(last='24h')
+
+
+# Lưới kịch bản what-if: 0-5 máy lạnh x 3 loại nhà x các mức diện tích
+SENSITIVITY_GRID = {
+    'num_ac': list(range(6)),
+    'house_type': ["Chung cư", "Nhà phố", "Biệt thự"],
+    'area_m2': [40, 60, 100, 150, 200]
+}
 
+def render_sensitivity_chart(sweep, user_params):
+    """Biểu đồ độ nhạy chi phí theo số máy lạnh / loại nhà / diện tích"""
+    st.markdown("#### 📉 Phân tích What-if")
+    
+    areas = sweep.attrs['axes']['area_m2']
+    user_area = user_params.get('area_m2', 60)
+    default_area = min(areas, key=lambda a: abs(a - user_area))
+    area = st.select_slider(
+        "📐 Diện tích so sánh (m²)",
+        options=areas,
+        value=default_area,
+        key="sensitivity_area"
+    )
+    
+    view = sweep.xs(area, level='area_m2').reset_index()
+    fig = px.line(
+        view,
+        x='num_ac',
+        y='cost',
+        color='house_type',
+        markers=True,
+        custom_data=['total_kwh']
+    )
+    fig.update_traces(hovertemplate='%{x} máy lạnh<br>%{y:,.0f} đ<br>%{customdata[0]:.0f} kWh<extra></extra>')
+    fig.update_layout(
+        height=350,
+        xaxis=dict(title="Số máy lạnh", dtick=1),
+        yaxis=dict(title="Chi phí dự kiến (đ/tháng)"),
+        legend_title_text='Loại nhà',
+        margin=dict(t=20, b=20, l=20, r=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig, width='stretch')
+    st.caption(f"Các thông số khác giữ nguyên như bạn đã nhập ({len(sweep)} kịch bản tính trong một lần).")
 
 def render_confidence_indicator(confidence):
     """Hiển thị độ tin cậy bằng color-coded badge"""
@@ -223,12 +270,23 @@ def render_user_page(username, name):
                         total_kwh = result['total_kwh']
                         total_cost, cost_breakdown = calculate_evn_bill(total_kwh)
                         
+                        # What-if: cả lưới kịch bản trong một lần tính vector hóa,
+                        # dùng lại baseline AI vừa tính ở trên
+                        sweep = predictor.scenario_sweep(
+                            input_df,
+                            SENSITIVITY_GRID,
+                            base_params=user_params,
+                            days=30,
+                            baseline_monthly=result['baseline_kwh']
+                        )
+                        
                         # Lưu session
                         st.session_state['prediction_result'] = {
                             'result': result,
                             'user_params': user_params,
                             'total_cost': total_cost,
                             'cost_breakdown': cost_breakdown,
+                            'sweep': sweep,
                             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         }
                         
@@ -363,6 +421,9 @@ def render_user_page(username, name):
                     for line in pred['cost_breakdown']:
                         st.text(line)
                 
+                if pred.get('sweep') is not None:
+                    render_sensitivity_chart(pred['sweep'], pred['user_params'])
+                
             else:
                 st.info("""
                 👈 **Hướng dẫn:**
@@ -0,0 +1,211 @@
+# ============================================
+# backtest.py - Rolling-origin backtesting
+# Đánh giá mọi model ứng viên trên N mốc cắt (TimeSeriesSplit, train mở rộng
+# dần) thay vì một lần chia 80/20:
+# - mean/scale của StandardScaler cho mọi prefix tính bằng tổng cộng dồn theo
+#   block (một lượt qua dữ liệu), không fit lại scaler mỗi fold
+# - mỗi fold chuẩn hóa một lần ra .npy (memmap), mọi model dùng chung
+# - các cặp (fold, model) chạy song song trong process pool
+# - metric từng fold + tổng hợp (mean/std), gồm sai số kWh theo tháng
+# ============================================
+
+import os
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+METRIC_COLUMNS = ['MAE', 'RMSE', 'R2', 'MAPE', 'Monthly_Error']
+SCALE_CHUNK_ROWS = 200_000
+BASELINE_WINDOW = 1440  # Moving Average baseline: trung bình 24h cuối của train
+
+# ================== FOLDS & SCALER ==================
+
+def rolling_origins(n_samples, n_folds=5, test_size=None, gap=0):
+    """Các fold (train_end, test_start, test_end) của TimeSeriesSplit; train luôn từ 0"""
+    splitter = TimeSeriesSplit(n_splits=n_folds, test_size=test_size, gap=gap)
+    folds = []
+    for train_idx, test_idx in splitter.split(np.empty((n_samples, 1))):
+        folds.append((int(train_idx[-1]) + 1, int(test_idx[0]), int(test_idx[-1]) + 1))
+    return folds
+
+def prefix_scalers(X, train_ends):
+    """
+    {end: (mean, scale)} giống StandardScaler().fit(X[:end]) cho mọi end, tính
+    trong một lượt: cộng dồn sum(x) và sum(x²) theo block giữa các mốc. Dữ liệu được
+    dịch theo trung bình đoạn đầu để sum(x²) không bị triệt tiêu (Voltage ~ 240).
+    """
+    ends = sorted(set(train_ends))
+    shift = np.asarray(X[:min(len(X), SCALE_CHUNK_ROWS)], dtype=np.float64).mean(axis=0)
+    s1 = np.zeros(X.shape[1])
+    s2 = np.zeros(X.shape[1])
+    scalers = {}
+    start = 0
+    for end in ends:
+        for a in range(start, end, SCALE_CHUNK_ROWS):
+            block = np.asarray(X[a:min(end, a + SCALE_CHUNK_ROWS)], dtype=np.float64) - shift
+            s1 += block.sum(axis=0)
+            s2 += (block ** 2).sum(axis=0)
+        mean_shifted = s1 / end
+        var = np.maximum(s2 / end - mean_shifted ** 2, 0.0)
+        scale = np.sqrt(var)
+        scale[scale < 10 * np.finfo(np.float64).eps] = 1.0  # như StandardScaler
+        scalers[end] = (mean_shifted + shift, scale)
+        start = end
+    return scalers
+
+def write_fold_blocks(X, folds, scalers, cache_dir):
+    """Chuẩn hóa X[:test_end] của từng fold một lần, ghi .npy để các model mmap"""
+    paths = []
+    for k, (train_end, _, test_end) in enumerate(folds):
+        mean, scale = scalers[train_end]
+        path = os.path.join(cache_dir, f"fold{k}_X.npy")
+        block = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(test_end, X.shape[1]))
+        for a in range(0, test_end, SCALE_CHUNK_ROWS):
+            b = min(test_end, a + SCALE_CHUNK_ROWS)
+            block[a:b] = (np.asarray(X[a:b], dtype=np.float64) - mean) / scale
+        block.flush()
+        del block
+        paths.append(path)
+    return paths
+
+# ================== METRICS ==================
+
+def regression_metrics(y_true, y_pred, datetime_index=None):
+    """MAE/RMSE/R²/MAPE (kW) + Monthly_Error: MAE của kWh cộng theo tháng (kW x 1/60 h)"""
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    mask = y_true != 0
+    metrics = {
+        'MAE': mean_absolute_error(y_true, y_pred),
+        'RMSE': np.sqrt(mean_squared_error(y_true, y_pred)),
+        'R2': r2_score(y_true, y_pred),
+        'MAPE': np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100,
+        'Monthly_Error': None
+    }
+    if datetime_index is not None:
+        dt_hours = 1 / 60
+        true_monthly = pd.Series(y_true * dt_hours, index=datetime_index).resample('ME').sum()
+        pred_monthly = pd.Series(y_pred * dt_hours, index=datetime_index).resample('ME').sum()
+        metrics['Monthly_Error'] = mean_absolute_error(true_monthly, pred_monthly)
+    return metrics
+
+def baseline_predictions(y_train, n_test):
+    """Naive (giá trị cuối) và Moving Average (24h cuối), giống baseline_models"""
+    return {
+        'Naive': np.full(n_test, y_train[-1]),
+        'Moving Average': np.full(n_test, np.mean(y_train[-BASELINE_WINDOW:]))
+    }
+
+# ================== WORKER ==================
+
+def _run_fold(fold, name, factory, x_path, data_dir, train_end, test_start, test_end, threads):
+    """Chạy trong process con: fit model trên block đã chuẩn hóa của fold"""
+    from threadpoolctl import threadpool_limits
+
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(os.path.join(data_dir, "y.npy"), mmap_mode='r')
+    datetimes = np.load(os.path.join(data_dir, "datetime.npy"), mmap_mode='r')
+    start = time.time()
+    with threadpool_limits(limits=threads):
+        model = factory(n_jobs=threads)
+        if getattr(model, 'fit_needs_datetime', False):
+            # LightGBM early stopping cần mốc thời gian của train để tính Monthly_Error
+            model.fit(X[:train_end], y[:train_end], pd.DatetimeIndex(datetimes[:train_end]))
+        else:
+            model.fit(X[:train_end], y[:train_end])
+        y_pred = model.predict(X[test_start:test_end])
+    metrics = regression_metrics(y[test_start:test_end], y_pred,
+                                 pd.DatetimeIndex(datetimes[test_start:test_end]))
+    return fold, name, metrics, time.time() - start
+
+# ================== ENGINE ==================
+
+def run_backtest(X, y, datetime_index, factories, n_folds=5, test_size=None, gap=0,
+                 workers=None, total_threads=None, include_baselines=True):
+    """
+    Backtest rolling-origin. factories = {tên: hàm(n_jobs) -> estimator chưa fit}
+    (hàm cấp module để pickle được sang process con). Estimator có
+    fit_needs_datetime=True (EarlyStoppedLightGBM) được fit(X, y, datetime_index).
+    Trả về (folds_df: một dòng mỗi (fold, model), summary_df: mean/std theo model).
+    """
+    X = np.asarray(X)
+    y = np.asarray(y, dtype=np.float64)
+    datetime_index = pd.DatetimeIndex(datetime_index)
+    folds = rolling_origins(len(X), n_folds, test_size, gap)
+
+    total = max(1, total_threads or os.cpu_count() or 1)
+    n_tasks = len(folds) * len(factories)
+    workers = max(1, min(workers or total, n_tasks or 1))
+    threads = max(1, total // workers)
+
+    print("\n" + "="*60)
+    print(f"🔁 ROLLING-ORIGIN BACKTEST ({len(folds)} folds x {len(factories)} models, "
+          f"{workers} process x {threads} thread)")
+    print("="*60)
+
+    rows = []
+    def add_row(fold, name, metrics, elapsed):
+        train_end, test_start, test_end = folds[fold]
+        rows.append({
+            'fold': fold, 'model': name,
+            'train_end': datetime_index[train_end - 1],
+            'test_start': datetime_index[test_start],
+            'test_end': datetime_index[test_end - 1],
+            'n_train': train_end, 'n_test': test_end - test_start,
+            **metrics, 'seconds': elapsed
+        })
+
+    start = time.time()
+    scalers = prefix_scalers(X, [train_end for train_end, _, _ in folds])
+    with tempfile.TemporaryDirectory(prefix="backtest-") as data_dir:
+        x_paths = write_fold_blocks(X, folds, scalers, data_dir)
+        np.save(os.path.join(data_dir, "y.npy"), y)
+        np.save(os.path.join(data_dir, "datetime.npy"), datetime_index.values)
+        print(f"   ✅ Scaled fold blocks ready in {time.time() - start:.1f}s")
+
+        # Fold lớn (train dài) trước để process rảnh sớm nhận việc nhỏ
+        tasks = [(fold, name) for fold in reversed(range(len(folds))) for name in factories]
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_run_fold, fold, name, factories[name], x_paths[fold], data_dir,
+                            *folds[fold], threads)
+                for fold, name in tasks
+            ]
+            # Baseline rất nhẹ -> tính ở process chính trong lúc chờ
+            if include_baselines:
+                for fold, (train_end, test_start, test_end) in enumerate(folds):
+                    for name, y_pred in baseline_predictions(y[:train_end], test_end - test_start).items():
+                        add_row(fold, name, regression_metrics(
+                            y[test_start:test_end], y_pred, datetime_index[test_start:test_end]), 0.0)
+
+            for future in as_completed(futures):
+                fold, name, metrics, elapsed = future.result()
+                add_row(fold, name, metrics, elapsed)
+                print(f"   • fold {fold} {name}: R²={metrics['R2']:.4f}, "
+                      f"Monthly={metrics['Monthly_Error']:.2f} kWh ({elapsed:.1f}s)")
+
+    folds_df = pd.DataFrame(rows).sort_values(['fold', 'model']).reset_index(drop=True)
+    summary_df = summarize_backtest(folds_df)
+    print(f"   ⏱️  Backtest wall-clock: {time.time() - start:.1f}s")
+    print("\n" + summary_df.to_string())
+    return folds_df, summary_df
+
+def summarize_backtest(folds_df):
+    """mean/std của từng metric qua các fold, sắp theo R² trung bình"""
+    summary = folds_df.groupby('model')[METRIC_COLUMNS].agg(['mean', 'std'])
+    summary.columns = [f"{metric}_{stat}" for metric, stat in summary.columns]
+    return summary.sort_values('R2_mean', ascending=False)
+
+def mean_metrics(summary_df):
+    """{model: {'MAE', 'RMSE', 'R2', 'MAPE', 'Monthly_Error'}} (trung bình qua fold) cho bảng so sánh"""
+    return {
+        model: {metric: row[f"{metric}_mean"] for metric in METRIC_COLUMNS}
+        for model, row in summary_df.iterrows()
+    }
@@ -1,11 +1,56 @@
 # ============================================
 # clean_data.py - OPTIMIZED VERSION
 # Data Cleaning – Household Power Consumption
+# Streaming theo chunk: bộ nhớ tỉ lệ với chunksize thay vì kích thước file,
+# kết quả giống hệt chạy một lần trên cả file (chunksize=0)
 # ============================================
 
 import pandas as pd
 import numpy as np
 import os
+import io
+import copy
+import pickle
+import shutil
+import hashlib
+import argparse
+import tempfile
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+
+from src.backend.feature_engine import (
+    MEASUREMENT_COLUMNS, ROLLING_WINDOWS,
+    add_calendar_features, add_rolling_features, compact_dtypes
+)
+from src.backend.data_profiler import StreamingProfiler
+from src.backend.datetime_parser import parse_date_time, parse_dates
+from src.backend.columnar_cache import cache_path_for, time_index, ColumnarCacheWriter
+
+RAW_PATH = "data/household_power_consumption.txt"
+OUTPUT_FILE = "cleaned_dataset.csv"
+REPORT_FILE = "cleaning_report.txt"
+WATERMARK_VERSION = 2
+
+# Số dòng raw mỗi chunk (~200k dòng ≈ 140 ngày); 0/None = đọc cả file một lần
+DEFAULT_CHUNKSIZE = 200_000
+# Chế độ song song: overlap ban đầu mỗi phía của partition (dòng raw), tự nhân đôi khi thiếu
+PARTITION_OVERLAP = 2 * 1440
+
+INTERPOLATE_LIMIT = 6   # nội suy khi khoảng trống <= 6 phút
+FFILL_LIMIT = 30        # forward fill tối đa 30 phút
+BFILL_LIMIT = 30        # backward fill tối đa 30 phút (đầu dataset)
+ROLLING_CONTEXT = max(ROLLING_WINDOWS) - 1
+
+OUTLIER_CRITERIA = [
+    "Global_active_power: 0 < x < 15 kW",
+    "Global_reactive_power: 0 ≤ x < 5 kW",
+    "Voltage: 200V < x < 260V",
+    "Global_intensity: 0 ≤ x < 50A"
+]
+
+ENGINEERED_FEATURES = ['hour', 'weekday', 'month', 'season',
+                       'rolling_5', 'rolling_15', 'rolling_60', 'rolling_1440',
+                       'energy_per_day_kwh']
 
 def print_section(title):
     """Print section header for better readability"""
@@ -13,25 +58,236 @@ def print_section(title):
     print(f"  {title}")
     print("="*60)
 
-def generate_cleaning_report(df_original, df_cleaned, missing_info, outlier_info):
+# ================== CÁC BƯỚC LÀM SẠCH ==================
+
+def read_raw(filepath, chunksize=None):
+    """Đọc file raw UCI ('?' -> NaN); có chunksize thì trả về iterator các chunk"""
+    return pd.read_csv(
+        filepath,
+        sep=";",
+        low_memory=False,
+        na_values=['?', ''],  # Trực tiếp xử lý '?' thành NaN
+        dtype={'Date': str, 'Time': str},
+        chunksize=chunksize or None
+    )
+
+def parse_datetime(df):
+    """Ép kiểu số cho cột đo lường, tạo index Datetime, bỏ dòng ngày giờ lỗi"""
+    for col in MEASUREMENT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Parse từng ngày/giờ duy nhất một lần thay vì 2 triệu chuỗi "date time"
+    df['Datetime'] = parse_date_time(df['Date'], df['Time'])
+    df = df.dropna(subset=['Datetime'])
+    df = df.set_index('Datetime')
+    df = df.drop(columns=['Date', 'Time'])
+    return df.sort_index()  # Đảm bảo sắp xếp theo thời gian
+
+def outlier_mask(df):
+    """
+    True = giữ lại. Ngưỡng dựa trên phân tích thực tế
+    (Global_active_power: min=0.076, max≈11). Dòng NaN ở các cột này cũng bị loại.
+    """
+    return (
+        (df['Global_active_power'] > 0) & (df['Global_active_power'] < 15) &
+        (df['Global_reactive_power'] >= 0) & (df['Global_reactive_power'] < 5) &
+        (df['Voltage'] > 200) & (df['Voltage'] < 260) &  # Điện áp châu Âu ~230V
+        (df['Global_intensity'] >= 0) & (df['Global_intensity'] < 50)
+    )
+
+def fill_missing(df):
+    """Interpolate (<= 6 phút) -> ffill (<= 30 phút) -> bfill (<= 30 phút)"""
+    df = df.interpolate(method='linear', limit=INTERPOLATE_LIMIT, limit_direction='forward')
+    df = df.ffill(limit=FFILL_LIMIT)
+    return df.bfill(limit=BFILL_LIMIT)
+
+def add_daily_energy(df):
+    """
+    Energy per day (kWh): Global_active_power đơn vị kW, mỗi điểm là 1 phút
+    -> tổng mỗi ngày chia 60. df phải chứa trọn vẹn các ngày.
+    """
+    df['energy_per_day_kwh'] = (
+        df.groupby(df.index.date)['Global_active_power']
+        .transform('sum') / 60
+    )
+    return df
+
+# ================== THỐNG KÊ ==================
+
+def empty_stats():
+    """
+    Thống kê tích lũy khi làm sạch. raw_profile / clean_profile thu count, missing,
+    min/max, mean/std và quantile của từng cột ngay trong lượt streaming, báo cáo
+    được tạo từ đó mà không đọc lại dữ liệu.
+    """
+    return {
+        'raw_rows': 0,
+        'raw_columns': None,
+        'valid_rows': 0,
+        'outliers_removed': 0,
+        'missing': {},
+        'first_timestamp': None,
+        'last_timestamp': None,
+        'cleaned_rows': 0,
+        'raw_profile': StreamingProfiler(numeric_columns=MEASUREMENT_COLUMNS),
+        'clean_profile': StreamingProfiler()
+    }
+
+def collect_raw_stats(stats, raw, first_row=None):
+    """
+    Cộng một đoạn raw vào stats. first_row = số thứ tự dòng raw đầu tiên của đoạn
+    (mặc định: nối tiếp các đoạn trước) - làm key chọn mẫu quantile.
+    """
+    first_row = stats['raw_rows'] if first_row is None else first_row
+    stats['raw_rows'] += len(raw)
+    if stats['raw_columns'] is None:
+        stats['raw_columns'] = list(raw.columns)
+    stats['raw_profile'].update(raw, keys=np.arange(first_row, first_row + len(raw), dtype=np.int64))
+    stats['missing'] = stats['raw_profile'].missing_counts()
+
+def merge_stats(parts):
+    """Gộp stats của các partition (theo thứ tự thời gian) thành stats của cả file"""
+    merged = empty_stats()
+    for stats in parts:
+        for key in ('raw_rows', 'valid_rows', 'outliers_removed', 'cleaned_rows'):
+            merged[key] += stats[key]
+        if merged['raw_columns'] is None:
+            merged['raw_columns'] = stats['raw_columns']
+        merged['raw_profile'].merge(stats['raw_profile'])
+        merged['clean_profile'].merge(stats['clean_profile'])
+        if stats['first_timestamp'] is not None:
+            if merged['first_timestamp'] is None or stats['first_timestamp'] < merged['first_timestamp']:
+                merged['first_timestamp'] = stats['first_timestamp']
+            if merged['last_timestamp'] is None or stats['last_timestamp'] > merged['last_timestamp']:
+                merged['last_timestamp'] = stats['last_timestamp']
+    merged['missing'] = merged['raw_profile'].missing_counts()
+    return merged
+
+# ================== STREAMING CLEANER ==================
+
+class StreamingCleaner:
+    """
+    Làm sạch theo từng chunk raw, chỉ giữ trạng thái biên cần thiết:
+    - carry: các dòng raw (đã lọc outlier) từ dòng "neo" cuối cùng - dòng có đủ mọi
+      cột - trở đi. Nội suy/ffill/bfill của một khoảng trống chỉ phụ thuộc giá trị
+      hợp lệ hai đầu, nên các dòng trước neo đã có kết quả cuối cùng.
+    - rolling_context: 1439 giá trị công suất cuối cho rolling_1440.
+    - pending: các dòng đã sạch của ngày chưa kết thúc (cho energy_per_day_kwh).
+    Bộ nhớ ~ chunksize + khoảng trống dữ liệu dài nhất + 1 ngày.
+    """
+
+    def __init__(self):
+        self.carry = None
+        self.anchor_emitted = False
+        self.rolling_context = np.empty(0)
+        self.pending = None
+        self.last_timestamp = None
+        self.last_emitted = None   # mốc cuối của các dòng đã trả ra
+        self.stats = empty_stats()
+
+    def process(self, raw_chunk):
+        """Nhận một chunk raw, trả về các dòng đã sạch hoàn toàn (có thể rỗng)"""
+        self._collect_raw_stats(raw_chunk)
+        df = parse_datetime(raw_chunk)
+        if len(df) == 0:
+            return self._emit(df.iloc[:0])
+        if self.last_timestamp is not None and df.index[0] <= self.last_timestamp:
+            raise ValueError(
+                f"Dữ liệu raw không theo thứ tự thời gian ({df.index[0]} <= {self.last_timestamp}) "
+                "- hãy chạy với chunksize=0"
+            )
+        self.last_timestamp = df.index[-1]
+        self.stats['valid_rows'] += len(df)
+        if self.stats['first_timestamp'] is None:
+            self.stats['first_timestamp'] = df.index[0]
+        self.stats['last_timestamp'] = df.index[-1]
+
+        mask = outlier_mask(df)
+        self.stats['outliers_removed'] += int((~mask).sum())
+        df = df[mask]
+
+        block = df if self.carry is None else pd.concat([self.carry, df])
+        complete = np.flatnonzero(block.notna().all(axis=1).values)
+        if len(complete) == 0:
+            self.carry = block
+            return self._emit(block.iloc[:0])
+
+        anchor = complete[-1]
+        filled = fill_missing(block.iloc[:anchor + 1])
+        ready = filled.iloc[1 if self.anchor_emitted else 0:].dropna()
+        self.carry = block.iloc[anchor:]
+        self.anchor_emitted = True
+        return self._emit(ready)
+
+    def finish(self):
+        """Xả phần còn lại (cuối file) - gọi một lần sau chunk cuối"""
+        if self.carry is None:
+            return self._emit(None, final=True)
+        filled = fill_missing(self.carry)
+        ready = filled.iloc[1 if self.anchor_emitted else 0:].dropna()
+        self.carry = None
+        return self._emit(ready, final=True)
+
+    def _collect_raw_stats(self, raw_chunk):
+        collect_raw_stats(self.stats, raw_chunk)
+
+    def _emit(self, ready, final=False):
+        """Thêm đặc trưng cho các dòng đã sạch, giữ lại ngày chưa trọn"""
+        if ready is not None and len(ready) > 0:
+            ready = add_calendar_features(ready.copy(), season_as='name')
+            ready = add_rolling_features(ready, context=self.rolling_context)
+            power = np.concatenate([self.rolling_context, ready['Global_active_power'].values])
+            self.rolling_context = power[-ROLLING_CONTEXT:]
+            ready = ready if self.pending is None else pd.concat([self.pending, ready])
+        else:
+            ready = self.pending
+        self.pending = None
+        if ready is None or len(ready) == 0:
+            return None
+
+        if not final:
+            # Ngày cuối có thể còn tiếp ở chunk sau
+            last_day = ready.index[-1].normalize()
+            split = ready.index.searchsorted(last_day, side='left')
+            self.pending = ready.iloc[split:]
+            ready = ready.iloc[:split]
+            if len(ready) == 0:
+                return None
+
+        ready = compact_dtypes(add_daily_energy(ready))
+        self.stats['cleaned_rows'] += len(ready)
+        self.stats['clean_profile'].update(ready)
+        self.last_emitted = ready.index[-1]
+        return ready
+
+# ================== BÁO CÁO ==================
+
+def summarize_missing(stats):
+    """missing_info {col: {'count', 'percentage'}} từ thống kê raw"""
+    total = max(stats['raw_rows'], 1)
+    return {
+        col: {'count': count, 'percentage': count / total * 100}
+        for col, count in stats['missing'].items() if count > 0
+    }
+
+def generate_cleaning_report(stats, missing_info, outlier_info, cleaned_columns):
     """Generate comprehensive cleaning report"""
     report = []
     report.append("="*70)
     report.append("DATA CLEANING REPORT - Household Power Consumption")
     report.append("="*70)
-    
+
     # Original dataset info
     report.append(f"\n1. ORIGINAL DATASET")
-    report.append(f"   - Shape: {df_original.shape}")
-    report.append(f"   - Date range: {df_original.index[0]} to {df_original.index[-1]}")
-    report.append(f"   - Total records: {len(df_original):,}")
-    
+    report.append(f"   - Shape: ({stats['raw_rows']}, {len(stats['raw_columns'] or [])})")
+    report.append(f"   - Date range: {stats['first_timestamp']} to {stats['last_timestamp']}")
+    report.append(f"   - Total records: {stats['raw_rows']:,}")
+
     # Missing values
     report.append(f"\n2. MISSING VALUES")
     for col, info in missing_info.items():
-        pct = (info['count'] / len(df_original)) * 100
-        report.append(f"   - {col}: {info['count']:,} ({pct:.2f}%)")
-    
+        report.append(f"   - {col}: {info['count']:,} ({info['percentage']:.2f}%)")
+
     # Outliers
     report.append(f"\n3. OUTLIERS REMOVED")
     report.append(f"   - Records removed: {outlier_info['removed']:,}")
@@ -39,220 +295,575 @@ def generate_cleaning_report(df_original, df_cleaned, missing_info, outlier_info
     report.append(f"   - Criteria:")
     for criterion in outlier_info['criteria']:
         report.append(f"     • {criterion}")
-    
+
     # Cleaned dataset
     report.append(f"\n4. CLEANED DATASET")
-    report.append(f"   - Final shape: {df_cleaned.shape}")
-    report.append(f"   - Remaining records: {len(df_cleaned):,}")
-    report.append(f"   - Missing values after cleaning: {df_cleaned.isnull().sum().sum()}")
-    
+    report.append(f"   - Final shape: ({stats['cleaned_rows']}, {len(cleaned_columns)})")
+    report.append(f"   - Remaining records: {stats['cleaned_rows']:,}")
+    clean_profile = stats.get('clean_profile')
+    if clean_profile is not None:
+        remaining = sum(clean_profile.missing_counts().values())
+        report.append(f"   - Missing values after cleaning: {remaining:,}")
+
     # Features added
     report.append(f"\n5. FEATURES ENGINEERED")
-    new_features = ['hour', 'weekday', 'month', 'season', 
-                   'rolling_5', 'rolling_15', 'rolling_60', 'rolling_1440',
-                   'energy_per_day_kwh']
-    for feat in new_features:
-        if feat in df_cleaned.columns:
+    for feat in ENGINEERED_FEATURES:
+        if feat in cleaned_columns:
             report.append(f"   ✓ {feat}")
-    
+
+    # Thống kê từng cột (từ profiler streaming, không quét lại dữ liệu)
+    report.append(f"\n6. COLUMN STATISTICS")
+    for title, profile in [("Raw (before cleaning)", stats.get('raw_profile')),
+                           ("Cleaned", stats.get('clean_profile'))]:
+        if profile is not None:
+            report.append(f"   {title}:")
+            report.extend(format_profile(profile.summary()))
+
     report.append("\n" + "="*70)
-    
+
     return "\n".join(report)
 
-def main():
-    # --- 1. LOAD DATASET ---
-    print_section("STEP 1: LOADING DATASET")
-    
-    # Sử dụng raw string hoặc forward slash
-    filepath = "data/household_power_consumption.txt"
-    
+def format_profile(summary):
+    """Bảng kiểu describe(): mỗi cột một dòng; quantile xấp xỉ từ mẫu"""
+    fields = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+    lines = ["     " + f"{'column':<24}" + "".join(f"{field:>11}" for field in fields)]
+    for col, row in summary.items():
+        cells = [f"{row['count']:>11,}"] + [f"{row[field]:>11.3f}" for field in fields[1:]]
+        lines.append("     " + f"{col:<24}" + "".join(cells))
+    return lines
+
+# ================== PIPELINE ==================
+
+def watermark_path_for(output_file):
+    """cleaned_dataset.csv -> cleaned_dataset.watermark.pkl"""
+    root, _ = os.path.splitext(output_file)
+    return root + ".watermark.pkl"
+
+def _raw_signature(filepath, nbytes=65536):
+    """Hash phần đầu file raw - đổi nghĩa là file bị thay thế chứ không phải append"""
+    with open(filepath, 'rb') as f:
+        return hashlib.sha256(f.read(nbytes)).hexdigest()
+
+def _complete_lines_end(filepath):
+    """Vị trí byte ngay sau ký tự xuống dòng cuối cùng (bỏ dòng đang ghi dở)"""
+    size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            idx = block.rfind(b'\n')
+            if idx >= 0:
+                return pos - step + idx + 1
+            pos -= step
+    return 0
+
+def save_watermark(path, watermark):
+    """Ghi watermark atomic (file tạm + os.replace)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".watermark-", suffix=".pkl")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(watermark, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_watermark(path):
+    try:
+        with open(path, 'rb') as f:
+            watermark = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    return watermark if watermark.get('version') == WATERMARK_VERSION else None
+
+def _make_watermark(filepath, raw_offset, raw_columns, cleaner, csv_bytes, cleaned_columns, stats):
+    """
+    Watermark = trạng thái NGAY TRƯỚC finish(): vị trí byte đã đọc của raw,
+    trạng thái StreamingCleaner (carry, rolling context, ngày đang dở, thống kê)
+    và độ dài CSV tương ứng. Phần finish() ghi thêm sẽ bị cắt bỏ ở lần chạy sau.
+    `stats` là thống kê SAU finish() (khớp output hiện tại), trả về khi không có dòng mới.
+    """
+    return {
+        'version': WATERMARK_VERSION,
+        'raw_path': os.path.abspath(filepath),
+        'raw_signature': _raw_signature(filepath),
+        'raw_offset': raw_offset,
+        'raw_columns': raw_columns,
+        'cleaner': cleaner,
+        'csv_bytes': csv_bytes,
+        'cleaned_columns': list(cleaned_columns),
+        'emitted_until': cleaner.last_emitted,
+        'stats': stats
+    }
+
+def clean_file(filepath, output_file=OUTPUT_FILE, chunksize=DEFAULT_CHUNKSIZE, write_cache=True,
+               watermark=True):
+    """
+    Làm sạch file raw -> output_file (CSV) + columnar cache.
+    CSV và cache được ghi ra file tạm theo từng phần rồi os.replace khi xong.
+    watermark=True lưu trạng thái để lần sau chạy clean_incremental.
+    Chỉ đọc tới ký tự xuống dòng cuối cùng: dòng cuối chưa có '\n' coi như đang
+    ghi dở và được làm sạch ở lần incremental sau (watermark trỏ đúng tới đó).
+    Trả về (stats, cleaned_columns).
+    """
+    cleaner = StreamingCleaner()
+    raw_end = _complete_lines_end(filepath)
+    with open(filepath, 'rb') as f:
+        header_end = len(f.readline())
+    raw_columns = list(pd.read_csv(filepath, sep=";", nrows=0).columns)
+    chunks = _read_raw_from(filepath, header_end, raw_end, raw_columns, chunksize)
+
+    directory = os.path.dirname(os.path.abspath(output_file))
+    fd, tmp_csv = tempfile.mkstemp(dir=directory, prefix=".cleaned-", suffix=".csv")
+    os.close(fd)
+    cache_writer = ColumnarCacheWriter(cache_path_for(output_file)) if write_cache else None
+    cleaned_columns = []
+
+    def write(part):
+        if part is None or len(part) == 0:
+            return
+        header = not cleaned_columns
+        if header:
+            cleaned_columns.extend(part.columns)
+        part.to_csv(tmp_csv, mode='w' if header else 'a', header=header)
+        if cache_writer is not None:
+            cache_writer.write(part)
+
+    try:
+        for i, chunk in enumerate(chunks, 1):
+            write(cleaner.process(chunk))
+            if chunksize:
+                print(f"  • Chunk {i}: {cleaner.stats['raw_rows']:,} dòng raw → {cleaner.stats['cleaned_rows']:,} dòng sạch")
+        snapshot = copy.deepcopy(cleaner) if watermark else None
+        csv_bytes = os.path.getsize(tmp_csv)
+        write(cleaner.finish())
+        os.replace(tmp_csv, output_file)
+        if cache_writer is not None:
+            cache_writer.close()
+    except Exception:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+
+    if watermark:
+        save_watermark(watermark_path_for(output_file), _make_watermark(
+            filepath, raw_end, raw_columns, snapshot, csv_bytes, cleaned_columns, cleaner.stats))
+    return cleaner.stats, cleaned_columns
+
+class _ByteRange(io.RawIOBase):
+    """File-like chỉ đọc tới byte `end` của file đang mở (pandas tự chia chunk)"""
+
+    def __init__(self, f, end):
+        self._f = f
+        self._end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._end - self._f.tell())
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        buffer[:len(data)] = data
+        return len(data)
+
+def _read_raw_from(filepath, offset, end, raw_columns, chunksize):
+    """Đọc các dòng raw trong [offset, end) theo lô `chunksize` dòng (0/None = một lô)"""
+    if end <= offset:
+        return
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        reader = pd.read_csv(
+            io.BufferedReader(_ByteRange(f, end)),
+            sep=";",
+            header=None,
+            names=raw_columns,
+            na_values=['?', ''],
+            dtype={'Date': str, 'Time': str},
+            chunksize=chunksize or None
+        )
+        yield from (reader if chunksize else [reader])
+
+def _rewrite_cache(output_file, emitted_until, new_parts):
+    """
+    Cache mới = các row group cũ tới `emitted_until` + phần mới. Tháng đã xong được
+    chép nguyên row group dạng Arrow (pyarrow vẫn giải nén/nén lại từng trang nhưng
+    không chuyển qua pandas); chỉ row group chứa `emitted_until` được cắt qua pandas.
+    """
+    cache_path = cache_path_for(output_file)
+    with ColumnarCacheWriter(cache_path) as writer:
+        if os.path.exists(cache_path) and emitted_until is not None:
+            parquet_file = pq.ParquetFile(cache_path)
+            for i, _, group_max, _ in time_index(cache_path) or []:
+                if group_max <= emitted_until:
+                    writer.write_table(parquet_file.read_row_group(i))
+                    continue
+                part = parquet_file.read_row_group(i, use_pandas_metadata=True).to_pandas()
+                writer.write(part.loc[:emitted_until])
+                break
+        for part in new_parts:
+            writer.write(part)
+
+def clean_incremental(filepath=RAW_PATH, output_file=OUTPUT_FILE, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Chỉ làm sạch các dòng raw được append từ lần chạy trước (theo watermark) rồi
+    nối vào cleaned store. Kết quả giống hệt chạy lại toàn bộ. Không có watermark
+    hợp lệ (lần đầu, file raw bị thay) thì chạy full.
+    Trả về (stats, cleaned_columns, mode) với mode 'full' | 'incremental' | 'up-to-date'.
+    """
+    wm_path = watermark_path_for(output_file)
+    watermark = load_watermark(wm_path)
+    raw_end = _complete_lines_end(filepath)
+
+    valid = (
+        watermark is not None
+        and watermark['emitted_until'] is not None
+        and os.path.exists(output_file)
+        and watermark['raw_path'] == os.path.abspath(filepath)
+        and raw_end >= watermark['raw_offset']
+        and os.path.getsize(output_file) >= watermark['csv_bytes']
+        and _raw_signature(filepath) == watermark['raw_signature']
+    )
+    if not valid:
+        print("ℹ️ Không có watermark hợp lệ - làm sạch toàn bộ")
+        stats, cleaned_columns = clean_file(filepath, output_file, chunksize)
+        return stats, cleaned_columns, 'full'
+
+    cleaner = watermark['cleaner']
+    cleaned_columns = watermark['cleaned_columns']
+    if raw_end == watermark['raw_offset']:
+        print("✓ Không có dữ liệu raw mới")
+        return watermark['stats'], cleaned_columns, 'up-to-date'
+
+    # Bỏ phần finish() của lần trước (ngày dở, đuôi chưa có neo) rồi xử lý tiếp
+    with open(output_file, 'r+b') as f:
+        f.truncate(watermark['csv_bytes'])
+
+    new_parts = []
+    def write(part):
+        if part is None or len(part) == 0:
+            return
+        part.to_csv(output_file, mode='a', header=False)
+        new_parts.append(part)
+
+    for chunk in _read_raw_from(filepath, watermark['raw_offset'], raw_end, watermark['raw_columns'], chunksize):
+        write(cleaner.process(chunk))
+        print(f"  • +{len(chunk):,} dòng raw → {cleaner.stats['cleaned_rows']:,} dòng sạch")
+    snapshot = copy.deepcopy(cleaner)
+    csv_bytes = os.path.getsize(output_file)
+    write(cleaner.finish())
+
+    _rewrite_cache(output_file, watermark['emitted_until'], new_parts)
+    save_watermark(wm_path, _make_watermark(
+        filepath, raw_end, watermark['raw_columns'], snapshot, csv_bytes, cleaned_columns, cleaner.stats))
+    return cleaner.stats, cleaned_columns, 'incremental'
+
+# ================== SONG SONG THEO THÁNG ==================
+
+_line_offsets = None  # vị trí byte đầu mỗi dòng raw, nạp một lần cho mỗi worker
+
+def _init_partition_worker(offsets):
+    global _line_offsets
+    _line_offsets = offsets
+
+def scan_line_offsets(filepath, end, block_size=1 << 24):
+    """
+    Vị trí byte đầu của từng dòng trong [0, end): phần tử 0 là header,
+    phần tử i+1 là dòng dữ liệu i, phần tử cuối = end.
+    """
+    offsets = [np.zeros(1, dtype=np.int64)]
+    with open(filepath, 'rb') as f:
+        pos = 0
+        while pos < end:
+            block = f.read(min(block_size, end - pos))
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            offsets.append(newlines.astype(np.int64) + pos + 1)
+            pos += len(block)
+    offsets = np.concatenate(offsets)
+    return offsets if offsets[-1] == end else np.append(offsets, end)
+
+def partition_by_month(filepath, offsets, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Chia dòng raw thành các đoạn liên tiếp cùng tháng (theo cột Date):
+    list (month_start, first_line, n_lines). Dòng ngày lỗi đi theo đoạn đứng trước.
+    """
+    n_lines = len(offsets) - 2
+    if n_lines <= 0:
+        return []
+    months = []
+    reader = pd.read_csv(filepath, sep=";", header=None, skiprows=1, usecols=[0], dtype=str,
+                         nrows=n_lines, skip_blank_lines=False, chunksize=chunksize or DEFAULT_CHUNKSIZE)
+    for chunk in reader:
+        months.append(parse_dates(chunk[0]).astype('datetime64[M]'))
+    months = pd.Series(np.concatenate(months)).ffill().bfill().values
+    if pd.isna(months[0]):
+        return [(None, 0, n_lines)]
+
+    bounds = np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1]) + 1, [n_lines]])
+    tasks = [(pd.Timestamp(months[a]), int(a), int(b - a)) for a, b in zip(bounds[:-1], bounds[1:])]
+    starts = [month for month, _, _ in tasks]
+    if any(b <= a for a, b in zip(starts[:-1], starts[1:])):
+        raise ValueError("Dữ liệu raw không theo thứ tự tháng - hãy chạy tuần tự với chunksize=0")
+    return tasks
+
+def _read_lines(filepath, raw_columns, start, stop):
+    """Đọc dòng dữ liệu [start, stop) qua bảng offset (None nếu rỗng)"""
+    if stop <= start:
+        return None
+    with open(filepath, 'rb') as f:
+        f.seek(_line_offsets[start + 1])
+        data = f.read(_line_offsets[stop + 1] - _line_offsets[start + 1])
+    try:
+        return pd.read_csv(
+            io.BytesIO(data),
+            sep=";",
+            header=None,
+            names=raw_columns,
+            na_values=['?', ''],
+            dtype={'Date': str, 'Time': str}
+        )
+    except pd.errors.EmptyDataError:
+        return None
+
+def _clean_partition(task):
+    """
+    Làm sạch một tháng raw (chạy trong process con) và ghi ra parts_dir.
+    Đọc thêm overlap hai phía tới dòng neo (đủ mọi cột) gần nhất ngoài tháng để
+    nội suy/ffill/bfill giống hệt chạy cả file, và đủ 1439 dòng sạch trước tháng
+    cho rolling_1440. Overlap chưa đủ thì nhân đôi rồi đọc lại.
+    Trả về (stats của riêng các dòng trong tháng, tên partition hoặc None).
+    """
+    filepath, raw_columns, month_start, first, n, parts_dir, overlap = task
+    total = len(_line_offsets) - 2
+    month_end = month_start + pd.offsets.MonthBegin(1) if month_start is not None else None
+
+    stats = empty_stats()
+    own = _read_lines(filepath, raw_columns, first, first + n)
+    if own is None:
+        return stats, None
+    collect_raw_stats(stats, own, first_row=first)
+    own = parse_datetime(own)
+    stats['valid_rows'] = len(own)
+    if len(own):
+        stats['first_timestamp'] = own.index[0]
+        stats['last_timestamp'] = own.index[-1]
+    stats['outliers_removed'] = int((~outlier_mask(own)).sum())
+    if month_start is None:
+        month_start, month_end = pd.Timestamp.min, pd.Timestamp.max
+
+    left = right = overlap
+    while True:
+        lo, hi = max(0, first - left), min(total, first + n + right)
+        before_raw = _read_lines(filepath, raw_columns, lo, first)
+        after_raw = _read_lines(filepath, raw_columns, first + n, hi)
+        frames = [own]
+        if before_raw is not None:
+            frames.insert(0, parse_datetime(before_raw))
+        if after_raw is not None:
+            frames.append(parse_datetime(after_raw))
+        block = pd.concat(frames)
+        block = block[outlier_mask(block)]
+
+        complete = block.notna().all(axis=1).values
+        before = np.flatnonzero(complete & (block.index < month_start))
+        after = np.flatnonzero(complete & (block.index >= month_end))
+        if hi < total and len(after) == 0:
+            right *= 2
+            continue
+        if lo > 0 and len(before) == 0:
+            left *= 2
+            continue
+        start = before[0] if lo > 0 else 0
+        stop = after[0] + 1 if hi < total else len(block)
+        filled = fill_missing(block.iloc[start:stop]).dropna()
+        split = filled.index.searchsorted(month_start)
+        if lo > 0 and split < ROLLING_CONTEXT:
+            left *= 2
+            continue
+        break
+
+    context = filled['Global_active_power'].values[max(0, split - ROLLING_CONTEXT):split]
+    month = filled.iloc[split:filled.index.searchsorted(month_end)]
+    if len(month) == 0:
+        return stats, None
+    month = add_calendar_features(month.copy(), season_as='name')
+    month = add_rolling_features(month, context=context)
+    month = compact_dtypes(add_daily_energy(month))
+    stats['cleaned_rows'] = len(month)
+    stats['clean_profile'].update(month)
+
+    name = f"month={month.index[0]:%Y-%m}"
+    month.to_parquet(os.path.join(parts_dir, name + ".parquet"))
+    month.to_csv(os.path.join(parts_dir, name + ".csv"), header=False)
+    return stats, name
+
+def partitions_dir_for(output_file):
+    """cleaned_dataset.csv -> cleaned_dataset_partitions/ (cùng thư mục)"""
+    root, _ = os.path.splitext(output_file)
+    return root + "_partitions"
+
+def _publish_partitions(parts_dir, partitions_dir):
+    """Giữ các partition Parquet (month=YYYY-MM.parquet) ở partitions_dir, thay bộ cũ"""
+    for name in os.listdir(parts_dir):
+        if not name.endswith(".parquet"):
+            os.remove(os.path.join(parts_dir, name))
+    old_dir = None
+    if os.path.exists(partitions_dir):
+        old_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(partitions_dir)), prefix=".old-parts-")
+        os.replace(partitions_dir, os.path.join(old_dir, "parts"))
+    os.replace(parts_dir, partitions_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+def clean_parallel(filepath, output_file=OUTPUT_FILE, workers=None, write_cache=True,
+                   overlap=PARTITION_OVERLAP, partitions_dir=None):
+    """
+    Làm sạch song song theo tháng bằng process pool: mỗi worker xử lý một tháng
+    (kèm overlap biên) và ghi partition riêng; process chính nối các partition
+    thành output_file + columnar cache (mỗi tháng một row group) và gộp stats.
+    Kết quả giống hệt clean_file. Không lưu watermark (lần incremental sau chạy full).
+    partitions_dir: giữ lại partition Parquet của từng tháng ở đó (mặc định xóa
+    sau khi nối, dữ liệu đã có trong output_file + cache).
+    Trả về (stats, cleaned_columns).
+    """
+    raw_end = _complete_lines_end(filepath)
+    offsets = scan_line_offsets(filepath, raw_end)
+    raw_columns = list(pd.read_csv(filepath, sep=";", nrows=0).columns)
+    months = partition_by_month(filepath, offsets)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(months) or 1))
+    print(f"  • {len(months)} partition tháng, {workers} worker")
+
+    directory = os.path.dirname(os.path.abspath(output_file))
+    parts_dir = tempfile.mkdtemp(dir=directory, prefix=".cleaned-parts-")
+    fd, tmp_csv = tempfile.mkstemp(dir=directory, prefix=".cleaned-", suffix=".csv")
+    os.close(fd)
+    cache_writer = ColumnarCacheWriter(cache_path_for(output_file)) if write_cache else None
+    cleaned_columns = []
+    partition_stats = []
+
+    try:
+        tasks = [(filepath, raw_columns, month, first, n, parts_dir, overlap) for month, first, n in months]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_partition_worker,
+                                 initargs=(offsets,)) as pool, open(tmp_csv, 'wb') as out:
+            # map giữ thứ tự tháng: nối partition ngay khi tháng trước đó xong
+            for stats, name in pool.map(_clean_partition, tasks):
+                partition_stats.append(stats)
+                if name is None:
+                    continue
+                print(f"  • {name}: {stats['raw_rows']:,} dòng raw → {stats['cleaned_rows']:,} dòng sạch")
+                part_path = os.path.join(parts_dir, name)
+                part = pd.read_parquet(part_path + ".parquet")
+                if not cleaned_columns:
+                    cleaned_columns.extend(part.columns)
+                    out.write(part.iloc[:0].to_csv().encode('utf-8'))
+                with open(part_path + ".csv", 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                if cache_writer is not None:
+                    cache_writer.write(part)
+        os.replace(tmp_csv, output_file)
+        if cache_writer is not None:
+            cache_writer.close()
+        if partitions_dir:
+            _publish_partitions(parts_dir, partitions_dir)
+            print(f"  • Partition tháng giữ tại: {partitions_dir}")
+    except Exception:
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    # Watermark cũ không còn khớp với output mới
+    wm_path = watermark_path_for(output_file)
+    if os.path.exists(wm_path):
+        os.remove(wm_path)
+    return merge_stats(partition_stats), cleaned_columns
+
+def main(chunksize=DEFAULT_CHUNKSIZE, filepath=RAW_PATH, output_file=OUTPUT_FILE, incremental=False,
+         workers=0, keep_partitions=False):
+    # --- 1. LOAD & CLEAN (STREAMING) ---
+    print_section("STEP 1: STREAMING CLEAN")
+
     if not os.path.exists(filepath):
         print(f"❌ Error: File not found at '{filepath}'")
         return
-    
-    df = pd.read_csv(
-        filepath,
-        sep=";",
-        low_memory=False,
-        na_values=['?', '']  # Trực tiếp xử lý '?' thành NaN
-    )
-    print(f"✓ Dataset loaded successfully")
-    print(f"  Shape: {df.shape}")
-    print(f"  Columns: {list(df.columns)}")
-
-    # --- 2. DATA QUALITY CHECK ---
-    print_section("STEP 2: DATA QUALITY CHECK")
-    
-    # Store original info for report
-    original_shape = df.shape
-    
-    # Check missing values BEFORE processing
-    missing_before = df.isnull().sum()
-    missing_info = {}
+
+    if workers and not incremental:
+        mode = f"song song theo tháng, {workers} worker"
+    else:
+        mode = f"chunk {chunksize:,} dòng" if chunksize else "toàn bộ file"
+    print(f"✓ Đọc '{filepath}' ({mode}{', incremental' if incremental else ''})")
+    if workers and not incremental:
+        stats, cleaned_columns = clean_parallel(
+            filepath, output_file, workers,
+            partitions_dir=partitions_dir_for(output_file) if keep_partitions else None)
+    elif incremental:
+        stats, cleaned_columns, run_mode = clean_incremental(filepath, output_file, chunksize)
+        print(f"✓ Mode: {run_mode}")
+    else:
+        stats, cleaned_columns = clean_file(filepath, output_file, chunksize)
+
+    # --- 2. DATA QUALITY ---
+    print_section("STEP 2: DATA QUALITY")
+
+    missing_info = summarize_missing(stats)
     print("Missing values:")
-    for col in missing_before.index:
-        if missing_before[col] > 0:
-            pct = (missing_before[col] / len(df)) * 100
-            print(f"  - {col}: {missing_before[col]} ({pct:.2f}%)")
-            missing_info[col] = {'count': missing_before[col], 'percentage': pct}
-    
-    # Check data types
-    print(f"\nData types:\n{df.dtypes}")
-
-    # --- 3. CONVERT COLUMNS TO NUMERIC ---
-    print_section("STEP 3: CONVERTING TO NUMERIC")
-    
-    numeric_cols = [
-        'Global_active_power', 'Global_reactive_power',
-        'Voltage', 'Global_intensity',
-        'Sub_metering_1', 'Sub_metering_2', 'Sub_metering_3'
-    ]
-    
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    print(f"✓ Converted {len(numeric_cols)} columns to numeric")
-
-    # --- 4. CREATE DATETIME INDEX ---
-    print_section("STEP 4: CREATING DATETIME INDEX")
-    
-    df['Datetime'] = pd.to_datetime(
-        df['Date'] + ' ' + df['Time'],
-        format='%d/%m/%Y %H:%M:%S',
-        errors='coerce'
-    )
-    
-    # Remove rows with invalid datetime
-    df = df.dropna(subset=['Datetime'])
-    df = df.set_index('Datetime')
-    df = df.drop(columns=['Date', 'Time'])
-    df = df.sort_index()  # Đảm bảo sắp xếp theo thời gian
-    
-    print(f"✓ Datetime index created")
-    print(f"  Date range: {df.index[0]} to {df.index[-1]}")
-
-    # --- 5. HANDLE OUTLIERS & INVALID VALUES ---
-    print_section("STEP 5: REMOVING OUTLIERS & INVALID VALUES")
-    
-    len_before_outliers = len(df)
-    
-    # Xác định ngưỡng hợp lý dựa trên phân tích thực tế
-    # Global_active_power: min=0.076, max≈11, nên giới hạn [0.01, 15] là hợp lý
-    outlier_criteria = []
-    
-    # Loại bỏ giá trị <= 0 hoặc quá lớn
-    df = df[
-        (df['Global_active_power'] > 0) & (df['Global_active_power'] < 15) &
-        (df['Global_reactive_power'] >= 0) & (df['Global_reactive_power'] < 5) &
-        (df['Voltage'] > 200) & (df['Voltage'] < 260) &  # Điện áp châu Âu ~230V
-        (df['Global_intensity'] >= 0) & (df['Global_intensity'] < 50)
-    ]
-    
-    outlier_criteria = [
-        "Global_active_power: 0 < x < 15 kW",
-        "Global_reactive_power: 0 ≤ x < 5 kW",
-        "Voltage: 200V < x < 260V",
-        "Global_intensity: 0 ≤ x < 50A"
-    ]
-    
-    outliers_removed = len_before_outliers - len(df)
-    outlier_pct = (outliers_removed / len_before_outliers) * 100
-    
-    print(f"✓ Removed {outliers_removed:,} outlier records ({outlier_pct:.2f}%)")
-    
+    for col, info in missing_info.items():
+        print(f"  - {col}: {info['count']} ({info['percentage']:.2f}%)")
+    print(f"  Date range: {stats['first_timestamp']} to {stats['last_timestamp']}")
+
+    outlier_pct = stats['outliers_removed'] / max(stats['valid_rows'], 1) * 100
+    print(f"✓ Removed {stats['outliers_removed']:,} outlier records ({outlier_pct:.2f}%)")
     outlier_info = {
-        'removed': outliers_removed,
+        'removed': stats['outliers_removed'],
         'percentage': outlier_pct,
-        'criteria': outlier_criteria
+        'criteria': OUTLIER_CRITERIA
     }
 
-    # --- 6. HANDLE MISSING VALUES ---
-    print_section("STEP 6: HANDLING MISSING VALUES")
-    
-    # Interpolate chỉ khi khoảng trống <= 6 điểm (6 phút)
-    # Với khoảng trống lớn hơn, sử dụng forward fill
-    df = df.interpolate(method='linear', limit=6, limit_direction='forward')
-    
-    # Forward fill cho các missing còn lại (giới hạn 30 phút)
-    df = df.fillna(method='ffill', limit=30)
-    
-    # Nếu vẫn còn missing (đầu dataset), dùng backward fill
-    df = df.fillna(method='bfill', limit=30)
-    
-    # Drop các hàng vẫn còn missing (nếu có)
-    final_missing = df.isnull().sum().sum()
-    if final_missing > 0:
-        print(f"⚠ Dropping {final_missing} remaining missing values")
-        df = df.dropna()
-    
-    print(f"✓ Missing values handled")
-    print(f"  Remaining missing: {df.isnull().sum().sum()}")
-
-    # --- 7. FEATURE ENGINEERING ---
-    print_section("STEP 7: FEATURE ENGINEERING")
-    
-    # Time-based features
-    df['hour'] = df.index.hour
-    df['weekday'] = df.index.weekday  # 0=Monday, 6=Sunday
-    df['month'] = df.index.month
-    
-    # Season (Bắc bán cầu: châu Âu)
-    def get_season(month):
-        if month in [12, 1, 2]:
-            return 'Winter'
-        elif month in [3, 4, 5]:
-            return 'Spring'
-        elif month in [6, 7, 8]:
-            return 'Summer'
-        else:
-            return 'Autumn'
-    
-    df['season'] = df['month'].apply(get_season)
-    
-    # Rolling means (cửa sổ theo phút)
-    print("  Creating rolling averages...")
-    df['rolling_5'] = df['Global_active_power'].rolling(window=5, min_periods=1).mean()
-    df['rolling_15'] = df['Global_active_power'].rolling(window=15, min_periods=1).mean()
-    df['rolling_60'] = df['Global_active_power'].rolling(window=60, min_periods=1).mean()
-    df['rolling_1440'] = df['Global_active_power'].rolling(window=1440, min_periods=1).mean()  # 1 ngày
-    
-    # Energy per day (kWh) - tính tổng năng lượng mỗi ngày
-    # Global_active_power đơn vị: kilowatt, mỗi phút -> cần nhân 1/60 để ra kWh
-    df['energy_per_day_kwh'] = (
-        df.groupby(df.index.date)['Global_active_power']
-        .transform('sum') / 60  # Chia 60 vì mỗi điểm là 1 phút
-    )
-    
-    print(f"✓ Added {9} engineered features")
-
-    # --- 8. SAVE CLEANED DATASET ---
-    print_section("STEP 8: SAVING RESULTS")
-    
-    output_file = "cleaned_dataset.csv"
-    df.to_csv(output_file)
+    # --- 3. SAVE RESULTS ---
+    print_section("STEP 3: SAVING RESULTS")
     print(f"✓ Cleaned dataset saved: '{output_file}'")
-    print(f"  Final shape: {df.shape}")
-    
-    # --- 9. GENERATE & SAVE REPORT ---
-    report = generate_cleaning_report(
-        df_original=pd.DataFrame({'shape': [original_shape]}, 
-                                index=pd.date_range(df.index[0], df.index[-1], freq='min')[:original_shape[0]]),
-        df_cleaned=df,
-        missing_info=missing_info,
-        outlier_info=outlier_info
-    )
-    
-    report_file = "cleaning_report.txt"
-    with open(report_file, 'w', encoding='utf-8') as f:
+    print(f"  Final shape: ({stats['cleaned_rows']}, {len(cleaned_columns)})")
+    print(f"✓ Columnar cache saved: '{cache_path_for(output_file)}'")
+
+    # --- 4. GENERATE & SAVE REPORT ---
+    report = generate_cleaning_report(stats, missing_info, outlier_info, cleaned_columns)
+
+    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
         f.write(report)
-    
-    print(f"✓ Cleaning report saved: '{report_file}'")
-    
+
+    print(f"✓ Cleaning report saved: '{REPORT_FILE}'")
+
     # Print report to console
     print("\n" + report)
-    
+
     print("\n" + "="*60)
     print("✓ DATA CLEANING COMPLETED SUCCESSFULLY")
     print("="*60)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Chạy từ thư mục gốc của repo: python -m src.models.clean_data --workers 4
+    parser = argparse.ArgumentParser(description="Làm sạch household_power_consumption.txt")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="Số dòng raw mỗi chunk (0 = đọc cả file một lần)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Chỉ làm sạch dòng raw mới kể từ watermark lần trước")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Số process làm sạch song song theo tháng (0 = streaming tuần tự)")
+    parser.add_argument("--keep-partitions", action="store_true",
+                        help="Chế độ song song: giữ partition Parquet từng tháng (<output>_partitions/)")
+    args = parser.parse_args()
+    main(chunksize=args.chunksize, incremental=args.incremental, workers=args.workers,
+         keep_partitions=args.keep_partitions)
@@ -0,0 +1,189 @@
+# ============================================
+# hparam_search.py - Tìm hyperparameter bằng successive halving
+# - Lấy ngẫu nhiên n cấu hình từ lưới SEARCH_SPACES (không trùng)
+# - Rung 0: mọi cấu hình train trên một lát thời gian nhỏ (dữ liệu gần nhất
+#   trước validation); mỗi rung giữ 1/eta cấu hình tốt nhất và tăng lát dữ
+#   liệu eta lần, rung cuối dùng toàn bộ tập train
+# - Validation = đoạn cuối theo thời gian của tập train (test không bị chạm)
+# - Trial của mỗi rung chạy song song trong process pool (dữ liệu .npy memmap)
+# - Leaderboard: một dòng mỗi (model, trial, rung) + ước lượng CPU so với grid
+# ============================================
+
+import os
+import json
+import math
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from src.models.backtest import regression_metrics
+from src.models.lgb_training import VALIDATION_FRACTION, time_validation_split
+
+# Giá trị thử cho từng model (tên tham số theo estimator sklearn)
+SEARCH_SPACES = {
+    'LightGBM': {
+        'learning_rate': [0.02, 0.05, 0.1, 0.2],
+        'num_leaves': [15, 31, 63, 127],
+        'max_depth': [-1, 5, 7, 10],
+        'min_child_samples': [10, 20, 50, 100],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.0, 0.1, 1.0, 10.0]
+    },
+    'Random Forest': {
+        'n_estimators': [50, 100, 200],
+        'max_depth': [10, 20, 30, None],
+        'min_samples_split': [2, 10, 20],
+        'min_samples_leaf': [1, 4, 10],
+        'max_features': [1.0, 0.5, 'sqrt']
+    }
+}
+
+# ================== CẤU HÌNH & RUNG ==================
+
+def grid_size(space):
+    return int(np.prod([len(values) for values in space.values()]))
+
+def sample_configs(space, n_configs, seed=42):
+    """n cấu hình khác nhau lấy đều trên lưới (giải mã chỉ số phẳng -> giá trị)"""
+    names = list(space)
+    shape = [len(space[name]) for name in names]
+    rng = np.random.default_rng(seed)
+    flat = rng.choice(grid_size(space), size=min(n_configs, grid_size(space)), replace=False)
+    return [
+        {name: space[name][int(i)] for name, i in zip(names, index)}
+        for index in zip(*np.unravel_index(flat, shape))
+    ]
+
+def halving_schedule(n_configs, eta=3, min_fraction=1/9):
+    """
+    [(phần dữ liệu train, số cấu hình)] cho từng rung; rung cuối luôn dùng 100%
+    dữ liệu kể cả khi 1/min_fraction không phải lũy thừa của eta
+    """
+    n_rungs = max(1, int(round(math.log(1 / min_fraction, eta))) + 1)
+    schedule = []
+    for k in range(n_rungs):
+        fraction = 1.0 if k == n_rungs - 1 else min(1.0, min_fraction * eta ** k)
+        schedule.append((fraction, max(1, n_configs // eta ** k)))
+    return schedule
+
+# ================== WORKER ==================
+
+def _run_trial(name, trial, factory, params, data_dir, start, split, threads):
+    """
+    Chạy trong process con: fit trên X[start:split], đánh giá trên X[split:].
+    Estimator có fit_needs_datetime (EarlyStoppedLightGBM) nhận thêm mốc thời gian.
+    """
+    from threadpoolctl import threadpool_limits
+
+    X = np.load(os.path.join(data_dir, "X.npy"), mmap_mode='r')
+    y = np.load(os.path.join(data_dir, "y.npy"), mmap_mode='r')
+    datetimes = np.load(os.path.join(data_dir, "datetime.npy"), mmap_mode='r')
+    begin = time.time()
+    with threadpool_limits(limits=threads):
+        model = factory(n_jobs=threads, **params)
+        if getattr(model, 'fit_needs_datetime', False):
+            model.fit(X[start:split], y[start:split], pd.DatetimeIndex(datetimes[start:split]))
+        else:
+            model.fit(X[start:split], y[start:split])
+        y_pred = model.predict(X[split:])
+    metrics = regression_metrics(y[split:], y_pred, pd.DatetimeIndex(datetimes[split:]))
+    return name, trial, metrics, time.time() - begin
+
+# ================== ENGINE ==================
+
+def run_search(X_train, y_train, datetime_train, factories, spaces=None, n_configs=27, eta=3,
+               min_fraction=1/9, valid_fraction=VALIDATION_FRACTION, metric='R2',
+               workers=None, total_threads=None, seed=42):
+    """
+    Successive halving cho từng model trong factories = {tên: hàm(n_jobs, **params)}
+    (hàm cấp module để pickle được). metric: cột của regression_metrics, R2 thì
+    lớn hơn là tốt, còn lại nhỏ hơn là tốt.
+    Trả về (leaderboard_df, {tên: params tốt nhất ở rung cuối}).
+    """
+    spaces = spaces or SEARCH_SPACES
+    X_train = np.asarray(X_train)
+    y_train = np.asarray(y_train, dtype=np.float64)
+    split = time_validation_split(len(X_train), valid_fraction)
+    schedule = halving_schedule(n_configs, eta, min_fraction)
+    higher_better = metric == 'R2'
+    configs = {name: sample_configs(spaces[name], n_configs, seed) for name in factories}
+
+    total = max(1, total_threads or os.cpu_count() or 1)
+    workers = max(1, min(workers or total, len(factories) * n_configs))
+    threads = max(1, total // workers)
+
+    print("\n" + "="*60)
+    print(f"🔎 HYPERPARAMETER SEARCH (successive halving, eta={eta}, "
+          f"{workers} process x {threads} thread)")
+    print("="*60)
+    for k, (fraction, n_keep) in enumerate(schedule):
+        print(f"   • rung {k}: {n_keep} configs/model on {int(split * fraction):,} rows")
+
+    rows = []
+    alive = {name: list(range(len(configs[name]))) for name in factories}
+    start_time = time.time()
+    with tempfile.TemporaryDirectory(prefix="hparam-search-") as data_dir:
+        np.save(os.path.join(data_dir, "X.npy"), X_train)
+        np.save(os.path.join(data_dir, "y.npy"), y_train)
+        np.save(os.path.join(data_dir, "datetime.npy"), pd.DatetimeIndex(datetime_train).values)
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for rung, (fraction, _) in enumerate(schedule):
+                n_rows = max(1, int(split * fraction))
+                futures = [
+                    pool.submit(_run_trial, name, trial, factories[name], configs[name][trial],
+                                data_dir, split - n_rows, split, threads)
+                    for name in factories for trial in alive[name]
+                ]
+                scores = {name: {} for name in factories}
+                for future in as_completed(futures):
+                    name, trial, metrics, elapsed = future.result()
+                    scores[name][trial] = metrics[metric]
+                    rows.append({
+                        'model': name, 'trial': trial, 'rung': rung, 'n_train': n_rows,
+                        'params': json.dumps(configs[name][trial], sort_keys=True),
+                        **metrics, 'seconds': elapsed
+                    })
+
+                # Giữ 1/eta tốt nhất cho rung sau
+                if rung + 1 < len(schedule):
+                    n_next = schedule[rung + 1][1]
+                    for name in factories:
+                        ranked = sorted(alive[name], key=lambda t: scores[name][t], reverse=higher_better)
+                        alive[name] = ranked[:n_next]
+                best_line = ", ".join(
+                    f"{name} {(max if higher_better else min)(scores[name].values()):.4f}" for name in factories)
+                print(f"   ✅ rung {rung} done ({len(futures)} trials, best {metric}: {best_line})")
+
+    leaderboard = pd.DataFrame(rows).sort_values(
+        ['rung', metric], ascending=[False, not higher_better]).reset_index(drop=True)
+    best_params = {
+        name: json.loads(leaderboard[leaderboard['model'] == name].iloc[0]['params'])
+        for name in factories
+    }
+    _print_summary(leaderboard, best_params, metric, spaces, time.time() - start_time)
+    return leaderboard, best_params
+
+def _print_summary(leaderboard, best_params, metric, spaces, elapsed):
+    """Top cấu hình + CPU đã dùng so với chạy cả lưới trên toàn bộ dữ liệu (ước lượng)"""
+    last_rung = leaderboard['rung'].max()
+    print(f"\n   🏆 Best configs ({metric} on validation):")
+    for name, params in best_params.items():
+        row = leaderboard[leaderboard['model'] == name].iloc[0]
+        print(f"      {name}: {metric}={row[metric]:.4f} {params}")
+
+    spent = leaderboard['seconds'].sum()
+    full = leaderboard[leaderboard['rung'] == last_rung].groupby('model')['seconds'].mean()
+    grid_cost = sum(full[name] * grid_size(spaces[name]) for name in full.index)
+    # Cùng các cấu hình đã lấy mẫu nhưng mỗi cấu hình train trên toàn bộ dữ liệu
+    sampled = leaderboard[leaderboard['rung'] == 0].groupby('model').size()
+    sampled_cost = sum(full[name] * sampled[name] for name in full.index)
+    print(f"   ⏱️  Search: {elapsed:.1f}s wall-clock, {spent:.1f} CPU-s of trials")
+    print(f"      vs full-data estimates: sampled configs ≈ {sampled_cost:.0f} CPU-s "
+          f"({spent / max(sampled_cost, 1e-9) * 100:.0f}%), "
+          f"full grid ≈ {grid_cost:.0f} CPU-s ({spent / max(grid_cost, 1e-9) * 100:.1f}%)")
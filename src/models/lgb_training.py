@@ -0,0 +1,226 @@
+# ============================================
+# lgb_training.py - LightGBM với Dataset nhị phân được cache + early stopping
+# - Dataset (đã chia bin histogram) lưu bằng save_binary, key = hash dữ liệu +
+#   tham số bin + version LightGBM; lần sau nạp file .bin, bỏ qua bước chia bin
+# - Validation = đoạn cuối theo thời gian của tập train (test không bị chạm)
+# - Early stopping theo sai số kWh theo tháng trên validation: dừng khi
+#   Monthly_Error không còn giảm thay vì luôn dựng đủ số cây
+# - EarlyStoppedLightGBM: vỏ fit/predict để backtest / search train LightGBM
+#   đúng như bản deploy
+# ============================================
+
+import os
+import glob
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+LGB_DATASET_DIR = "checkpoints/lgb_datasets"
+MAX_DATASET_ENTRIES = 8   # số cặp train/valid .bin giữ lại (mỗi fold backtest / rung search một cặp)
+
+# Tương đương build_lightgbm() trong train_build.py (API gốc của LightGBM)
+LGB_PARAMS = {
+    'objective': 'regression',
+    'learning_rate': 0.05,
+    'max_depth': 7,
+    'num_leaves': 31,
+    'min_child_samples': 20,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'seed': 42,
+    'verbose': -1
+}
+# Tham số quyết định cách chia bin -> phải nằm trong key cache
+DATASET_PARAMS = {'max_bin': 255, 'min_data_in_bin': 3, 'verbose': -1}
+
+MAX_BOOST_ROUNDS = 1000
+# Tổng theo tháng triệt tiêu sai số từng phút (model hằng số ~ trung bình đã có
+# Monthly_Error thấp) -> chỉ xét dừng sau MIN_BOOST_ROUNDS cây để giữ độ chính xác theo phút
+MIN_BOOST_ROUNDS = 100
+EARLY_STOPPING_ROUNDS = 20
+EARLY_STOPPING_MIN_DELTA = 0.01   # kWh/tháng: cải thiện nhỏ hơn coi như đã bão hòa
+VALIDATION_FRACTION = 0.1
+
+
+def array_digest(*arrays):
+    """Hash nội dung các mảng (đọc theo block, memmap không bị nạp hết vào RAM)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array) if not isinstance(array, np.memmap) else array
+        digest.update(f"{array.dtype}{array.shape}".encode('utf-8'))
+        flat = array.reshape(-1)
+        step = max(1, (1 << 24) // max(flat.itemsize, 1))
+        for start in range(0, len(flat), step):
+            digest.update(np.ascontiguousarray(flat[start:start + step]).tobytes())
+    return digest.hexdigest()
+
+
+def time_validation_split(n_samples, fraction=VALIDATION_FRACTION):
+    """Vị trí cắt: [0, split) để train, [split, n) là validation (đoạn cuối theo thời gian)"""
+    return n_samples - max(1, int(n_samples * fraction))
+
+
+def cached_datasets(X_train, y_train, X_valid, y_valid, cache_dir=LGB_DATASET_DIR):
+    """
+    (train_set, valid_set) lgb.Dataset. Có file .bin khớp key thì nạp thẳng (bin đã
+    tính sẵn); chưa có thì construct từ mảng rồi save_binary. Valid dùng chung bin
+    của train (reference). cache_dir=None: không đọc/ghi cache.
+    """
+    if cache_dir is None:
+        train_set = lgb.Dataset(np.asarray(X_train), label=np.asarray(y_train),
+                                params=DATASET_PARAMS, free_raw_data=False).construct()
+        valid_set = lgb.Dataset(np.asarray(X_valid), label=np.asarray(y_valid), reference=train_set,
+                                params=DATASET_PARAMS, free_raw_data=False).construct()
+        return train_set, valid_set
+
+    key = hashlib.sha1(
+        f"{array_digest(X_train, y_train, X_valid, y_valid)}|{sorted(DATASET_PARAMS.items())}|{lgb.__version__}"
+        .encode('utf-8')
+    ).hexdigest()[:20]
+    train_path = os.path.join(cache_dir, f"{key}.train.bin")
+    valid_path = os.path.join(cache_dir, f"{key}.valid.bin")
+
+    if os.path.exists(train_path) and os.path.exists(valid_path):
+        print(f"   📂 LightGBM Dataset cache hit: {key}")
+        for path in (train_path, valid_path):
+            os.utime(path)  # đánh dấu vừa dùng (cho việc dọn entry cũ)
+        train_set = lgb.Dataset(train_path, params=DATASET_PARAMS).construct()
+        valid_set = lgb.Dataset(valid_path, reference=train_set, params=DATASET_PARAMS).construct()
+        return train_set, valid_set
+
+    train_set = lgb.Dataset(np.asarray(X_train), label=np.asarray(y_train),
+                            params=DATASET_PARAMS, free_raw_data=False).construct()
+    valid_set = lgb.Dataset(np.asarray(X_valid), label=np.asarray(y_valid), reference=train_set,
+                            params=DATASET_PARAMS, free_raw_data=False).construct()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for dataset, path in [(train_set, train_path), (valid_set, valid_path)]:
+            # Ghi file tạm rồi os.replace: process khác không đọc phải file dở
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".dataset-", suffix=".bin")
+            os.close(fd)
+            os.remove(tmp_path)
+            dataset.save_binary(tmp_path)
+            os.replace(tmp_path, path)
+        print(f"   💾 LightGBM Dataset cached: {cache_dir}/{key}.*.bin")
+        _prune(cache_dir, keep=key)
+    except OSError as e:
+        print(f"   ⚠️  Không lưu được LightGBM Dataset: {e}")
+    return train_set, valid_set
+
+
+def _prune(cache_dir, keep, max_entries=MAX_DATASET_ENTRIES):
+    """Xóa các cặp .bin ít dùng nhất khi vượt max_entries"""
+    entries = {}
+    for path in glob.glob(os.path.join(cache_dir, "*.train.bin")):
+        key = os.path.basename(path)[:-len(".train.bin")]
+        entries[key] = os.path.getmtime(path)
+    for key in sorted(entries, key=entries.get, reverse=True)[max_entries:]:
+        if key == keep:
+            continue
+        for suffix in (".train.bin", ".valid.bin"):
+            try:
+                os.remove(os.path.join(cache_dir, key + suffix))
+            except OSError:
+                pass
+
+
+def monthly_error_eval(datetime_valid):
+    """
+    feval cho lgb.train: MAE của kWh cộng theo tháng (kW x 1/60 h) trên validation,
+    cùng công thức Monthly_Error của calculate_metrics. Mã tháng tính sẵn một lần.
+    """
+    months = pd.DatetimeIndex(datetime_valid).to_period('M')
+    codes, uniques = pd.factorize(months)
+    n_months = len(uniques)
+
+    def feval(preds, eval_data):
+        labels = eval_data.get_label()
+        true_monthly = np.bincount(codes, weights=labels / 60, minlength=n_months)
+        pred_monthly = np.bincount(codes, weights=preds / 60, minlength=n_months)
+        return 'monthly_kwh_mae', float(np.mean(np.abs(true_monthly - pred_monthly))), False
+
+    return feval
+
+
+def monthly_plateau_stopping(stopping_rounds=EARLY_STOPPING_ROUNDS, min_delta=EARLY_STOPPING_MIN_DELTA,
+                             min_rounds=MIN_BOOST_ROUNDS, metric='monthly_kwh_mae'):
+    """
+    Callback cho lgb.train: từ cây thứ min_rounds, dừng khi `metric` không giảm thêm
+    ít nhất min_delta trong stopping_rounds vòng. state['best_iteration'] (số cây)
+    và state['best_score'] ghi lại điểm tốt nhất kể cả khi chạy hết num_boost_round.
+    """
+    state = {'best_iteration': 0, 'best_score': np.inf}
+
+    def callback(env):
+        score = next(result for _, name, result, _ in env.evaluation_result_list if name == metric)
+        n_trees = env.iteration + 1
+        if n_trees < min_rounds:
+            return
+        if score < state['best_score'] - min_delta or state['best_iteration'] == 0:
+            state['best_iteration'], state['best_score'] = n_trees, score
+            state['best_result'] = env.evaluation_result_list
+        elif n_trees - state['best_iteration'] >= stopping_rounds:
+            raise lgb.callback.EarlyStopException(state['best_iteration'] - 1, state['best_result'])
+
+    callback.order = 30
+    callback.state = state
+    return callback
+
+
+def train_lightgbm_early_stopped(X_train, y_train, datetime_train, n_jobs=None, params=None,
+                                 cache_dir=LGB_DATASET_DIR, max_rounds=MAX_BOOST_ROUNDS,
+                                 min_rounds=MIN_BOOST_ROUNDS, stopping_rounds=EARLY_STOPPING_ROUNDS,
+                                 min_delta=EARLY_STOPPING_MIN_DELTA):
+    """
+    Train LightGBM trên phần đầu của train, early stopping theo Monthly_Error của
+    đoạn validation cuối. Trả về Booster đã cắt còn best_iteration cây (để
+    tree_engine / predictor dùng đúng số cây).
+    """
+    split = time_validation_split(len(X_train))
+    train_set, valid_set = cached_datasets(
+        X_train[:split], y_train[:split], X_train[split:], y_train[split:], cache_dir)
+
+    params = {**LGB_PARAMS, **(params or {}), 'metric': 'None'}
+    if n_jobs is not None:
+        params['num_threads'] = n_jobs
+    stopping = monthly_plateau_stopping(stopping_rounds, min_delta, min(min_rounds, max_rounds))
+    booster = lgb.train(
+        params, train_set,
+        num_boost_round=max_rounds,
+        valid_sets=[valid_set], valid_names=['valid'],
+        feval=monthly_error_eval(datetime_train[split:]),
+        callbacks=[stopping]
+    )
+    best = stopping.state['best_iteration'] or booster.current_iteration()
+    score = stopping.state['best_score']
+    print(f"   ✅ LightGBM stopped at {best} trees (validation Monthly_Error {score:.2f} kWh)")
+    if best < booster.current_iteration():
+        booster = lgb.Booster(model_str=booster.model_to_string(num_iteration=best))
+    return booster
+
+
+class EarlyStoppedLightGBM:
+    """
+    Vỏ kiểu sklearn quanh train_lightgbm_early_stopped: backtest / search gọi
+    factory(n_jobs=...) rồi fit(X, y, datetime_index) -> cùng cách train, cùng
+    validation và điểm dừng với model được lưu.
+    """
+
+    fit_needs_datetime = True
+
+    def __init__(self, n_jobs=None, cache_dir=LGB_DATASET_DIR, **params):
+        self.n_jobs = n_jobs
+        self.cache_dir = cache_dir
+        self.params = params
+        self.booster_ = None
+
+    def fit(self, X, y, datetime_index):
+        self.booster_ = train_lightgbm_early_stopped(
+            X, y, datetime_index, n_jobs=self.n_jobs, params=self.params, cache_dir=self.cache_dir)
+        return self
+
+    def predict(self, X):
+        return self.booster_.predict(X)
@@ -0,0 +1,90 @@
+# ============================================
+# prepared_cache.py - Cache ma trận train đã chuẩn bị (.npy memmap)
+# Key = hash nội dung cleaned_dataset.csv + cấu hình chia/scale, nên chỉ khi
+# dữ liệu thật sự đổi mới phải đọc CSV, encode season, dựng X/y, fit scaler lại.
+# Lần sau mở bằng np.load(mmap_mode='r'): OS đọc trang khi cần, không có bản
+# copy thứ hai trong RAM, bắt đầu train sau vài giây.
+# ============================================
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import joblib
+
+PREPARED_CACHE_DIR = "checkpoints/prepared_data"
+PREPARED_VERSION = 1      # tăng khi đổi cách dựng X/y hoặc scaler
+MAX_ENTRIES = 3           # giữ vài phiên bản dữ liệu gần nhất
+
+ARRAY_NAMES = ['X', 'X_scaled', 'y', 'datetime']
+
+
+def file_digest(path, block_size=1 << 20):
+    """blake2b của nội dung file (đọc theo block, không giữ cả file trong RAM)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def prepared_key(data_path, **config):
+    """Key thư mục cache: hash dữ liệu + cấu hình (test_size...) + version"""
+    payload = json.dumps({'data': file_digest(data_path), 'version': PREPARED_VERSION, **config},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def load_prepared(key, cache_dir=PREPARED_CACHE_DIR):
+    """(arrays memmap, scaler, meta) nếu có entry hoàn chỉnh, ngược lại None"""
+    entry = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(entry, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in ARRAY_NAMES}
+        scaler = joblib.load(os.path.join(entry, "scaler.pkl"))
+    except (OSError, ValueError, EOFError):
+        return None
+    os.utime(entry)  # đánh dấu vừa dùng (cho việc dọn entry cũ)
+    return arrays, scaler, meta
+
+
+def save_prepared(key, arrays, scaler, meta, cache_dir=PREPARED_CACHE_DIR):
+    """
+    Ghi entry vào thư mục tạm rồi os.replace: process khác không bao giờ thấy
+    entry dở. Trả về (arrays memmap, scaler, meta) đọc lại từ cache để caller
+    bỏ được bản trong RAM.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".prepared-")
+    try:
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+        joblib.dump(scaler, os.path.join(tmp_dir, "scaler.pkl"))
+        with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.chmod(tmp_dir, 0o755)
+        entry = os.path.join(cache_dir, key)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(tmp_dir, entry)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    _prune(cache_dir, keep=key)
+    return load_prepared(key, cache_dir)
+
+
+def _prune(cache_dir, keep, max_entries=MAX_ENTRIES):
+    """Xóa entry ít dùng nhất khi vượt max_entries"""
+    entries = [
+        os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+        if not name.startswith('.') and os.path.isdir(os.path.join(cache_dir, name))
+    ]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for entry in entries[max_entries:]:
+        if os.path.basename(entry) != keep:
+            shutil.rmtree(entry, ignore_errors=True)
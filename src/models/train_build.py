@@ -1,8 +1,14 @@
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import time
+import tempfile
+import multiprocessing
 import warnings
 warnings.filterwarnings('ignore')
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.preprocessing import StandardScaler, LabelEncoder
@@ -19,6 +25,15 @@ from tqdm import tqdm
 import joblib
 from datetime import datetime
 
+from src.backend.tree_engine import export_compiled_model, compiled_path_for, file_sha256
+from src.backend.model_registry import ModelRegistry
+from src.backend.columnar_cache import read_csv_typed
+from src.backend.sequence_windows import sliding_windows, WindowBatches
+from src.models.backtest import run_backtest, mean_metrics
+from src.models.prepared_cache import PREPARED_CACHE_DIR, prepared_key, load_prepared, save_prepared
+from src.models.lgb_training import MAX_BOOST_ROUNDS, EarlyStoppedLightGBM, train_lightgbm_early_stopped
+from src.models.hparam_search import run_search
+
 #=============================================================================
 # 1. DATA LOADING & PREPARATION
 #=============================================================================
@@ -26,9 +41,7 @@ from datetime import datetime
 def load_and_prepare_data(filepath='data/cleaned_dataset.csv'):
     """Load and prepare data - FIXED VERSION"""
     print("📂 Loading data...")
-    df = pd.read_csv(filepath)
-    df['Datetime'] = pd.to_datetime(df['Datetime'])
-    df = df.set_index('Datetime')
+    df = read_csv_typed(filepath)  # parse Datetime theo ISO, set index
     
     # Encode categorical
     if 'season' in df.columns:
@@ -82,6 +95,42 @@ def time_split_and_scale(X, y, datetime_index, test_size=0.2):
     return (X_train_scaled, X_test_scaled, y_train, y_test, 
             scaler, datetime_train, datetime_test)
 
+def load_prepared_data(filepath='data/cleaned_dataset.csv', test_size=0.2, use_cache=True):
+    """
+    load_and_prepare_data + time_split_and_scale, có cache .npy memmap theo hash
+    nội dung file: dữ liệu không đổi thì chỉ mở memmap, không đọc CSV / fit scaler.
+    X_train / X_test là view của X_scaled trên memmap (không copy vào RAM).
+    """
+    key = prepared_key(filepath, test_size=test_size) if use_cache else None
+    cached = load_prepared(key) if use_cache else None
+    if cached is not None:
+        print(f"📂 Prepared data cache hit: {key}")
+    else:
+        X, y, feature_names, datetime_index = load_and_prepare_data(filepath)
+        (X_train, X_test, y_train, y_test, scaler,
+         datetime_train, datetime_test) = time_split_and_scale(X, y, datetime_index, test_size)
+        if not use_cache:
+            return (X, y, feature_names, datetime_index, X_train, X_test, y_train, y_test,
+                    scaler, datetime_train, datetime_test)
+        arrays = {
+            'X': X,
+            'X_scaled': np.concatenate([X_train, X_test]),
+            'y': y,
+            'datetime': datetime_index.values
+        }
+        meta = {'feature_names': feature_names, 'split_idx': len(X_train), 'source': filepath}
+        cached = save_prepared(key, arrays, scaler, meta)
+        print(f"   💾 Prepared data cached: {PREPARED_CACHE_DIR}/{key}")
+    
+    arrays, scaler, meta = cached
+    split_idx = meta['split_idx']
+    datetime_index = pd.DatetimeIndex(arrays['datetime'], name='Datetime')
+    X, y, X_scaled = arrays['X'], arrays['y'], arrays['X_scaled']
+    print(f"   ✅ Data shape: {X.shape}, Train: {split_idx}, Test: {len(X) - split_idx}")
+    return (X, y, meta['feature_names'], datetime_index,
+            X_scaled[:split_idx], X_scaled[split_idx:], y[:split_idx], y[split_idx:],
+            scaler, datetime_index[:split_idx], datetime_index[split_idx:])
+
 #=============================================================================
 # 2. EVALUATION METRICS (KW TO KWH CONVERSION)
 #=============================================================================
@@ -127,8 +176,8 @@ def calculate_metrics(y_true, y_pred, model_name="Model",
         pred_kwh = pred_series * dt_hours
         
         # Aggregate to monthly
-        true_monthly = true_kwh.resample('M').sum()
-        pred_monthly = pred_kwh.resample('M').sum()
+        true_monthly = true_kwh.resample('ME').sum()
+        pred_monthly = pred_kwh.resample('ME').sum()
         
         monthly_mae = mean_absolute_error(true_monthly, pred_monthly)
         monthly_error = monthly_mae
@@ -188,20 +237,12 @@ def baseline_models(y_train, y_test, datetime_test):
 # 4. TRADITIONAL ML MODELS
 #=============================================================================
 
-def train_traditional_ml(X_train, y_train, X_test, y_test, datetime_test):
-    """Train traditional ML models - FIXED VERSION"""
-    results = {}
-    models = {}
-    
-    print("\n" + "="*60)
-    print("🤖 TRADITIONAL ML MODELS")
-    print("="*60)
-    
-    # LightGBM (fastest and often best)
-    print("\n3️⃣ LightGBM...")
-    print("   Training 200 trees...")
-    
-    lgb_model = lgb.LGBMRegressor(
+def build_lightgbm(n_jobs=None, **params):
+    """
+    LightGBM (fastest and often best); n_jobs=None -> LightGBM tự chọn số thread
+    params (ví dụ kết quả run_search) ghi đè giá trị mặc định
+    """
+    config = dict(
         n_estimators=200,
         learning_rate=0.05,
         max_depth=7,
@@ -212,15 +253,56 @@ def train_traditional_ml(X_train, y_train, X_test, y_test, datetime_test):
         random_state=42,
         verbose=-1
     )
+    config.update(params)
+    return lgb.LGBMRegressor(n_jobs=n_jobs, **config)
+
+def build_random_forest(n_jobs=-1, **params):
+    config = dict(
+        n_estimators=100,
+        max_depth=20,
+        min_samples_split=10,
+        min_samples_leaf=4,
+        random_state=42,
+        verbose=0
+    )
+    config.update(params)
+    return RandomForestRegressor(n_jobs=n_jobs, **config)
+
+def train_traditional_ml(X_train, y_train, X_test, y_test, datetime_test, datetime_train=None,
+                         model_params=None):
+    """
+    Train traditional ML models - FIXED VERSION
+    datetime_train có -> LightGBM early stopping (lgb_training), không thì 200 cây cố định
+    model_params: {tên model: hyperparameter} (ví dụ từ run_search), mặc định dùng giá trị cố định
+    """
+    model_params = model_params or {}
+    lgb_params = model_params.get('LightGBM', {})
+    rf_params = model_params.get('Random Forest', {})
+    results = {}
+    models = {}
     
-    pbar_lgb = tqdm(total=200, desc="Training LightGBM", 
-                    bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} trees [{elapsed}<{remaining}]')
-    
-    def lgb_callback(env):
-        pbar_lgb.update(1)
+    print("\n" + "="*60)
+    print("🤖 TRADITIONAL ML MODELS")
+    print("="*60)
     
-    lgb_model.fit(X_train, y_train, callbacks=[lgb_callback])
-    pbar_lgb.close()
+    # LightGBM (fastest and often best)
+    print("\n3️⃣ LightGBM...")
+    if datetime_train is not None:
+        # Early stopping theo Monthly_Error trên đoạn cuối của train (Dataset .bin cache)
+        print(f"   Training up to {MAX_BOOST_ROUNDS} trees (early stopping)...")
+        lgb_model = train_lightgbm_early_stopped(X_train, y_train, datetime_train, params=lgb_params)
+    else:
+        print("   Training 200 trees...")
+        lgb_model = build_lightgbm(**lgb_params)
+        
+        pbar_lgb = tqdm(total=200, desc="Training LightGBM", 
+                        bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} trees [{elapsed}<{remaining}]')
+        
+        def lgb_callback(env):
+            pbar_lgb.update(1)
+        
+        lgb_model.fit(X_train, y_train, callbacks=[lgb_callback])
+        pbar_lgb.close()
     
     y_pred_lgb = lgb_model.predict(X_test)
     results['LightGBM'] = calculate_metrics(
@@ -231,22 +313,14 @@ def train_traditional_ml(X_train, y_train, X_test, y_test, datetime_test):
     
     # Random Forest
     print("\n4️⃣ Random Forest...")
-    print("   Training 100 trees...")
+    rf_model = build_random_forest(**rf_params)
+    n_trees = rf_model.n_estimators
+    print(f"   Training {n_trees} trees...")
     
-    rf_model = RandomForestRegressor(
-        n_estimators=100,
-        max_depth=20,
-        min_samples_split=10,
-        min_samples_leaf=4,
-        random_state=42,
-        n_jobs=-1,
-        verbose=0
-    )
-    
-    with tqdm(total=100, desc="Training Random Forest", 
+    with tqdm(total=n_trees, desc="Training Random Forest", 
               bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} trees [{elapsed}<{remaining}]') as pbar:
         rf_model.fit(X_train, y_train)
-        pbar.update(100)
+        pbar.update(n_trees)
     
     y_pred_rf = rf_model.predict(X_test)
     results['Random Forest'] = calculate_metrics(
@@ -268,15 +342,28 @@ def create_sequences(X, y, seq_length=60):
     FIXED: seq_length now represents MINUTES, not hours!
     - seq_length=60 → 1 hour lookback
     - seq_length=1440 → 1 day lookback
-    """
-    X_seq, y_seq = [], []
     
+    Trả về view stride (không copy) - đưa thẳng vào model.fit sẽ bị copy toàn bộ,
+    khi train hãy dùng WindowBatches / WindowSequence.
+    """
     print(f"   Creating sequences (length={seq_length} minutes = {seq_length/60:.1f} hours)...")
-    for i in tqdm(range(len(X) - seq_length), desc="Creating sequences"):
-        X_seq.append(X[i:i+seq_length])
-        y_seq.append(y[i+seq_length])
+    return sliding_windows(X, seq_length), np.asarray(y)[seq_length:]
+
+class WindowSequence(keras.utils.Sequence):
+    """Bọc WindowBatches thành keras Sequence: batch được cắt ra từ view khi cần"""
+    
+    def __init__(self, batches):
+        super().__init__()
+        self.batches = batches
+    
+    def __len__(self):
+        return len(self.batches)
+    
+    def __getitem__(self, index):
+        return self.batches[index]
     
-    return np.array(X_seq), np.array(y_seq)
+    def on_epoch_end(self):
+        self.batches.on_epoch_end()
 
 def build_lstm_model(input_shape):
     """Build LSTM model"""
@@ -294,7 +381,7 @@ def build_lstm_model(input_shape):
     return model
 
 def train_deep_learning(X_train_scaled, y_train, X_test_scaled, y_test, 
-                       datetime_train, datetime_test):
+                       datetime_train, datetime_test, seq_length=60, batch_size=64):
     """Train LSTM - FIXED VERSION"""
     results = {}
     
@@ -305,28 +392,26 @@ def train_deep_learning(X_train_scaled, y_train, X_test_scaled, y_test,
     # FIXED: Use proper sequence length
     # Option 1: 60 minutes (1 hour) - faster
     # Option 2: 1440 minutes (1 day) - more context but slower
-    seq_length = 60  # Start with 1 hour, can increase to 1440
+    # Cửa sổ là view stride, batch sinh khi cần -> 1440 vẫn vừa RAM
     
     print(f"\n⚙️  Using seq_length={seq_length} minutes ({seq_length/60:.1f} hours)")
     
-    # Create sequences
-    X_train_seq, y_train_seq = create_sequences(X_train_scaled, y_train, seq_length)
-    X_test_seq, y_test_seq = create_sequences(X_test_scaled, y_test, seq_length)
+    # Create sequences (không copy: một bản float32 của dữ liệu, cửa sổ là view)
+    train_windows = WindowBatches(X_train_scaled, y_train, seq_length, batch_size=batch_size)
+    test_windows = WindowBatches(X_test_scaled, y_test, seq_length, batch_size=batch_size * 4)
     
     # Adjust datetime indices (skip first seq_length samples)
-    datetime_train_seq = datetime_train[seq_length:]
     datetime_test_seq = datetime_test[seq_length:]
     
-    # Validation split
-    val_size = int(len(X_train_seq) * 0.2)
-    X_val = X_train_seq[-val_size:]
-    y_val = y_train_seq[-val_size:]
-    X_train_seq = X_train_seq[:-val_size]
-    y_train_seq = y_train_seq[:-val_size]
+    # Validation split (20% cửa sổ cuối của train, dùng chung mảng gốc)
+    n_train_seq = train_windows.sample_count
+    val_size = int(n_train_seq * 0.2)
+    train_set = train_windows.subset(0, n_train_seq - val_size, shuffle=True)
+    val_set = train_windows.subset(n_train_seq - val_size, n_train_seq, batch_size=batch_size * 4)
     
-    print(f"   ✅ Train sequences: {len(X_train_seq)}")
-    print(f"   ✅ Val sequences: {len(X_val)}")
-    print(f"   ✅ Test sequences: {len(X_test_seq)}")
+    print(f"   ✅ Train sequences: {train_set.sample_count}")
+    print(f"   ✅ Val sequences: {val_set.sample_count}")
+    print(f"   ✅ Test sequences: {test_windows.sample_count}")
     
     # Build and train LSTM
     print("\n5️⃣ LSTM...")
@@ -353,15 +438,15 @@ def train_deep_learning(X_train_scaled, y_train, X_test_scaled, y_test,
             self.pbar.close()
     
     history = lstm_model.fit(
-        X_train_seq, y_train_seq,
-        validation_data=(X_val, y_val),
+        WindowSequence(train_set),
+        validation_data=WindowSequence(val_set),
         epochs=100,
-        batch_size=64,
         callbacks=[early_stop, reduce_lr, ProgressBar()],
         verbose=0
     )
     
-    y_pred_lstm = lstm_model.predict(X_test_seq, verbose=0).flatten()
+    y_pred_lstm = lstm_model.predict(WindowSequence(test_windows), verbose=0).flatten()
+    y_test_seq = test_windows.target_values()
     results['LSTM'] = calculate_metrics(
         y_test_seq, y_pred_lstm, "LSTM",
         datetime_index=datetime_test_seq, convert_to_kwh=True
@@ -369,6 +454,124 @@ def train_deep_learning(X_train_scaled, y_train, X_test_scaled, y_test,
     
     return results, lstm_model
 
+#=============================================================================
+# 5b. PARALLEL TRAINING (PROCESS POOL)
+#=============================================================================
+
+# Tỉ trọng chia thread theo chi phí ước lượng: model chậm nhất nhận nhiều thread
+# nhất để thời gian tổng ~ thời gian model chậm nhất
+MODEL_THREAD_WEIGHTS = {'LightGBM': 1, 'Random Forest': 3, 'LSTM': 2}
+
+def plan_thread_budgets(model_names, total_threads=None):
+    """
+    Chia tổng số core cho các model chạy đồng thời (tổng budget <= số core, không
+    oversubscribe). Ít core hơn số model thì mỗi model 1 thread và pool chỉ chạy
+    `total` model một lúc. Trả về ({name: threads}, số process).
+    """
+    total = max(1, total_threads or os.cpu_count() or 1)
+    if total <= len(model_names):
+        return {name: 1 for name in model_names}, total
+    
+    weights = {name: MODEL_THREAD_WEIGHTS.get(name, 1) for name in model_names}
+    weight_sum = sum(weights.values())
+    budgets = {name: max(1, int(total * w / weight_sum)) for name, w in weights.items()}
+    # Core còn dư (do làm tròn xuống) -> model nặng nhất
+    for name in sorted(model_names, key=lambda n: -weights[n]):
+        if sum(budgets.values()) >= total:
+            break
+        budgets[name] += total - sum(budgets.values())
+    return budgets, len(model_names)
+
+def _train_candidate(name, data_dir, threads, lstm_seq_length=60, params=None):
+    """Chạy trong process con: train + đánh giá một model với đúng `threads` thread"""
+    params = params or {}
+    from threadpoolctl import threadpool_limits
+    
+    arrays = {key: np.load(os.path.join(data_dir, f"{key}.npy"), mmap_mode='r')
+              for key in ['X_train', 'y_train', 'X_test', 'y_test', 'datetime_train', 'datetime_test']}
+    datetime_test = pd.DatetimeIndex(arrays['datetime_test'])
+    start = time.time()
+    model = None
+    
+    # Giới hạn cả BLAS/OpenMP của numpy, sklearn bên trong worker
+    with threadpool_limits(limits=threads):
+        if name == 'LightGBM':
+            model = train_lightgbm_early_stopped(arrays['X_train'], arrays['y_train'],
+                                                 arrays['datetime_train'], n_jobs=threads,
+                                                 params=params)
+            y_pred = model.predict(arrays['X_test'])
+        elif name == 'Random Forest':
+            model = build_random_forest(n_jobs=threads, **params).fit(arrays['X_train'], arrays['y_train'])
+            y_pred = model.predict(arrays['X_test'])
+        elif name == 'LSTM':
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+            # Keras model không pickle được -> chỉ trả metrics
+            results, _ = train_deep_learning(
+                arrays['X_train'], arrays['y_train'], arrays['X_test'], arrays['y_test'],
+                None, datetime_test, seq_length=lstm_seq_length
+            )
+            return name, results['LSTM'], None, time.time() - start
+        else:
+            raise ValueError(f"Unknown model: {name}")
+    
+    metrics = calculate_metrics(
+        np.asarray(arrays['y_test']), y_pred, name,
+        datetime_index=datetime_test, convert_to_kwh=True
+    )
+    return name, metrics, model, time.time() - start
+
+def train_models_parallel(X_train, y_train, X_test, y_test, datetime_train, datetime_test,
+                          model_names=('LightGBM', 'Random Forest'), total_threads=None,
+                          lstm_seq_length=60, on_submitted=None, model_params=None):
+    """
+    Train các model ứng viên đồng thời trong process pool (spawn - an toàn với
+    TensorFlow/OpenMP), mỗi model một budget thread riêng. Dữ liệu được ghi .npy
+    một lần và worker mở bằng memmap thay vì pickle qua pipe.
+    Kết quả được thu theo thứ tự model nào xong trước.
+    on_submitted(): việc chạy ở process chính trong lúc chờ (ví dụ baseline).
+    model_params: {tên model: hyperparameter} truyền cho từng worker.
+    Trả về (results, models, extra) với extra là kết quả của on_submitted.
+    """
+    model_names = list(model_names)
+    model_params = model_params or {}
+    budgets, workers = plan_thread_budgets(model_names, total_threads)
+    
+    print("\n" + "="*60)
+    print(f"⚡ PARALLEL TRAINING ({workers} process)")
+    print("="*60)
+    for name in model_names:
+        print(f"   • {name}: {budgets[name]} thread")
+    
+    results, models = {}, {}
+    start = time.time()
+    with tempfile.TemporaryDirectory(prefix="train-data-") as data_dir:
+        for key, value in [('X_train', X_train), ('y_train', y_train), ('X_test', X_test),
+                           ('y_test', y_test), ('datetime_train', np.asarray(datetime_train)),
+                           ('datetime_test', np.asarray(datetime_test))]:
+            np.save(os.path.join(data_dir, f"{key}.npy"), np.asarray(value))
+        
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_train_candidate, name, data_dir, budgets[name], lstm_seq_length,
+                            model_params.get(name))
+                for name in model_names
+            ]
+            extra = on_submitted() if on_submitted is not None else None
+            
+            for future in as_completed(futures):
+                name, metrics, model, elapsed = future.result()
+                results[name] = metrics
+                if model is not None:
+                    models[name] = model
+                print(f"   ✅ {name} done in {elapsed:.1f}s "
+                      f"(R²={metrics['R2']:.4f}, {budgets[name]} thread)")
+    
+    print(f"   ⏱️  Wall-clock: {time.time() - start:.1f}s for {len(model_names)} models")
+    return results, models, extra
+
 #=============================================================================
 # 6. MODEL COMPARISON & SELECTION
 #=============================================================================
@@ -420,11 +623,15 @@ def compare_and_select_best(all_results):
 
 def plot_feature_importance(model, feature_names, model_name):
     """Plot feature importance"""
-    if not hasattr(model, 'feature_importances_'):
+    if hasattr(model, 'feature_importances_'):
+        importance = model.feature_importances_
+    elif isinstance(model, lgb.Booster):
+        # Booster của early stopping: số lần split, giống LGBMRegressor
+        importance = model.feature_importance()
+    else:
         print(f"   ⚠️  {model_name} doesn't support feature importance")
         return
     
-    importance = model.feature_importances_
     indices = np.argsort(importance)[::-1]
     top_k = min(20, len(importance))
     
@@ -462,6 +669,21 @@ def save_model_package(model, scaler, feature_names, metrics, model_name):
     filename = f'best_model_{model_name.replace(" ", "_").lower()}.pkl'
     joblib.dump(package, filename)
     print(f"\n   ✅ Model saved: {filename}")
+    
+    # Xuất bản cây đã làm phẳng cho inference NumPy (EnergyPredictor ưu tiên file này
+    # khi hash .pkl nguồn ghi trong file khớp với .pkl vừa lưu)
+    compiled_path = compiled_path_for(filename)
+    try:
+        export_compiled_model(package, compiled_path, file_sha256(filename))
+    except NotImplementedError as e:
+        print(f"   ⚠️  Skip compiled export: {e}")
+        # Bản compile cũ (của model trước) không còn đúng với package này
+        if os.path.exists(compiled_path):
+            os.remove(compiled_path)
+    
+    # Đăng ký vào registry (chưa promote - deploy bằng lệnh promote)
+    version = ModelRegistry().register(filename)
+    print(f"   💡 Deploy: python -m src.backend.model_registry promote {version}")
 
 def generate_report(model_name, metrics, comparison_df):
     """Generate final report"""
@@ -518,7 +740,9 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 # 9. MAIN PIPELINE
 #=============================================================================
 
-def main_pipeline(filepath='data/cleaned_dataset.csv', run_deep_learning=True):
+def main_pipeline(filepath='data/cleaned_dataset.csv', run_deep_learning=True, lstm_seq_length=60,
+                  parallel=False, total_threads=None, backtest_folds=0, use_cache=True,
+                  search_configs=0, search_eta=3):
     """
     FIXED Main forecasting pipeline
     
@@ -528,38 +752,96 @@ def main_pipeline(filepath='data/cleaned_dataset.csv', run_deep_learning=True):
     3. Added proper kW → kWh conversion
     4. Fixed moving average baseline
     5. Enhanced metrics with monthly aggregation
+    
+    parallel=True (tùy chọn, mặc định train tuần tự): các model train đồng thời (train_models_parallel),
+    total_threads = tổng số thread chia cho chúng (mặc định = số core)
+    backtest_folds > 0: xếp hạng model theo trung bình metric của rolling-origin
+    backtest (run_backtest) thay vì một lần chia 80/20; chỉ các model đã backtest
+    được xếp hạng, metric lưu trong package vẫn là metric test của model đó
+    search_configs > 0: tìm hyperparameter LightGBM / RF trước khi train bằng
+    successive halving (run_search, search_configs cấu hình mỗi model, giữ
+    1/search_eta mỗi rung, xếp hạng theo Monthly_Error), ghi hparam_leaderboard.csv
     """
     
     print("\n" + "="*70)
     print("🚀 POWER CONSUMPTION FORECASTING PIPELINE (FIXED)")
     print("="*70 + "\n")
     
-    # 1. Load and prepare data (FIXED)
-    X, y, feature_names, datetime_index = load_and_prepare_data(filepath)
-    (X_train, X_test, y_train, y_test, scaler, 
-     datetime_train, datetime_test) = time_split_and_scale(X, y, datetime_index)
-    
-    # 2. Baseline models
-    baseline_results = baseline_models(y_train, y_test, datetime_test)
-    
-    # 3. Traditional ML models
-    ml_results, ml_models = train_traditional_ml(
-        X_train, y_train, X_test, y_test, datetime_test
-    )
-    
-    # 4. Deep Learning
-    dl_results = {}
-    if run_deep_learning:
-        dl_results, lstm_model = train_deep_learning(
-            X_train, y_train, X_test, y_test,
-            datetime_train, datetime_test
+    # 1. Load and prepare data (FIXED) - qua cache memmap nếu dữ liệu không đổi
+    (X, y, feature_names, datetime_index, X_train, X_test, y_train, y_test, scaler,
+     datetime_train, datetime_test) = load_prepared_data(filepath, use_cache=use_cache)
+    
+    # 1b. Hyperparameter search (chỉ trên tập train, validation là đoạn cuối của train)
+    model_params = {}
+    if search_configs:
+        leaderboard, model_params = run_search(
+            X_train, y_train, datetime_train,
+            # Cùng trainer (early stopping) và cùng metric với model được lưu
+            {'LightGBM': EarlyStoppedLightGBM, 'Random Forest': build_random_forest},
+            n_configs=search_configs, eta=search_eta, metric='Monthly_Error',
+            total_threads=total_threads
+        )
+        leaderboard.to_csv('hparam_leaderboard.csv', index=False)
+        print("   ✅ Saved: hparam_leaderboard.csv")
+    
+    if parallel:
+        # 2-4. Các model train đồng thời; baseline chạy ở process chính trong lúc chờ
+        model_names = ['LightGBM', 'Random Forest'] + (['LSTM'] if run_deep_learning else [])
+        trained_results, ml_models, baseline_results = train_models_parallel(
+            X_train, y_train, X_test, y_test, datetime_train, datetime_test,
+            model_names=model_names, total_threads=total_threads,
+            lstm_seq_length=lstm_seq_length,
+            on_submitted=lambda: baseline_models(y_train, y_test, datetime_test),
+            model_params=model_params
+        )
+        ml_results = {name: trained_results[name] for name in model_names if name != 'LSTM'}
+        dl_results = {'LSTM': trained_results['LSTM']} if run_deep_learning else {}
+    else:
+        # 2. Baseline models
+        baseline_results = baseline_models(y_train, y_test, datetime_test)
+        
+        # 3. Traditional ML models
+        ml_results, ml_models = train_traditional_ml(
+            X_train, y_train, X_test, y_test, datetime_test, datetime_train,
+            model_params=model_params
         )
+        
+        # 4. Deep Learning
+        dl_results = {}
+        if run_deep_learning:
+            dl_results, lstm_model = train_deep_learning(
+                X_train, y_train, X_test, y_test,
+                datetime_train, datetime_test, seq_length=lstm_seq_length
+            )
     
     # 5. Combine all results
     all_results = {**baseline_results, **ml_results, **dl_results}
     
+    # 5b. Rolling-origin backtest (LightGBM / RF + baseline trên N mốc cắt)
+    if backtest_folds:
+        folds_df, backtest_summary = run_backtest(
+            X, y, datetime_index,
+            # LightGBM train đúng như bản được lưu (early stopping theo Monthly_Error)
+            {'LightGBM': partial(EarlyStoppedLightGBM, **model_params.get('LightGBM', {})),
+             'Random Forest': partial(build_random_forest, **model_params.get('Random Forest', {}))},
+            n_folds=backtest_folds, total_threads=total_threads
+        )
+        folds_df.to_csv('backtest_folds.csv', index=False)
+        backtest_summary.to_csv('backtest_summary.csv')
+        print("   ✅ Saved: backtest_folds.csv, backtest_summary.csv")
+        # Chỉ xếp hạng các model đã backtest (cùng cách đo); LSTM chỉ có metric
+        # của lần chia 80/20 nên không đưa vào chung bảng
+        ranking_results = mean_metrics(backtest_summary)
+        skipped = [name for name in all_results if name not in ranking_results]
+        if skipped:
+            print(f"   ℹ️  Not ranked (no backtest, 80/20 metrics only): {', '.join(skipped)}")
+    else:
+        ranking_results = all_results
+    
     # 6. Compare and select best
-    best_model_name, best_metrics, comparison_df = compare_and_select_best(all_results)
+    best_model_name, ranked_metrics, comparison_df = compare_and_select_best(ranking_results)
+    # Package / report giữ metric test của chính model được lưu (không phải trung bình fold)
+    best_metrics = all_results.get(best_model_name, ranked_metrics)
     
     # 7. Feature importance for best model
     print("\n" + "="*70)
@@ -598,6 +880,7 @@ def main_pipeline(filepath='data/cleaned_dataset.csv', run_deep_learning=True):
 #=============================================================================
 
 if __name__ == "__main__":
+    # Chạy từ thư mục gốc của repo: python -m src.models.train_build
     # Configuration
     DATA_PATH = 'data/cleaned_dataset.csv'
     
@@ -0,0 +1,77 @@
+"""
+Test Rolling-origin Backtest
+- Scaler tính từ tổng cộng dồn phải khớp StandardScaler fit lại trên từng prefix
+- Metric từng fold (chạy song song, block chuẩn hóa dùng chung) phải khớp
+  cách làm thủ công: fit scaler + model riêng cho từng fold
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+from src.models.backtest import rolling_origins, prefix_scalers, run_backtest, regression_metrics
+
+
+def _data(n=30000, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2007-01-01', periods=n, freq='min')
+    X = np.column_stack([
+        240 + rng.normal(0, 3, n),              # kiểu Voltage: trung bình lớn, phương sai nhỏ
+        rng.uniform(0, 20, n),
+        index.hour.values,
+        np.ones(n)                              # cột hằng -> scale = 1
+    ])
+    y = 0.2 * X[:, 1] + 0.05 * X[:, 2] + rng.normal(0, 0.3, n) + 1
+    return X, y, index
+
+
+def ridge(n_jobs=None):
+    return Ridge(alpha=1.0)
+
+
+def test_folds_and_prefix_scalers():
+    X, _, _ = _data()
+    folds = rolling_origins(len(X), n_folds=4, gap=30)
+    expected = [(tr[-1] + 1, te[0], te[-1] + 1) for tr, te in TimeSeriesSplit(4, gap=30).split(X)]
+    assert folds == expected
+
+    scalers = prefix_scalers(X, [train_end for train_end, _, _ in folds])
+    for train_end, _, _ in folds:
+        reference = StandardScaler().fit(X[:train_end])
+        mean, scale = scalers[train_end]
+        np.testing.assert_allclose(mean, reference.mean_, rtol=1e-12)
+        np.testing.assert_allclose(scale, reference.scale_, rtol=1e-9)
+
+
+def test_backtest_matches_per_fold_refit():
+    X, y, index = _data()
+    folds_df, summary = run_backtest(X, y, index, {'Ridge': ridge}, n_folds=3, workers=2)
+    assert set(folds_df['model']) == {'Ridge', 'Naive', 'Moving Average'}
+    assert list(summary.index)[0] == 'Ridge'
+
+    for fold, (train_end, test_start, test_end) in enumerate(rolling_origins(len(X), 3)):
+        scaler = StandardScaler().fit(X[:train_end])
+        model = ridge().fit(scaler.transform(X[:train_end]), y[:train_end])
+        expected = regression_metrics(y[test_start:test_end], model.predict(scaler.transform(X[test_start:test_end])),
+                                      index[test_start:test_end])
+        row = folds_df[(folds_df['fold'] == fold) & (folds_df['model'] == 'Ridge')].iloc[0]
+        assert row['n_train'] == train_end and row['n_test'] == test_end - test_start
+        for metric, value in expected.items():
+            assert np.isclose(row[metric], value, rtol=1e-7), (fold, metric)
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST ROLLING-ORIGIN BACKTEST")
+    print("=" * 70)
+    test_folds_and_prefix_scalers()
+    print("✅ Prefix-sum scalers match StandardScaler")
+    test_backtest_matches_per_fold_refit()
+    print("✅ Parallel backtest matches per-fold refit")
@@ -0,0 +1,245 @@
+"""
+Test Streaming Cleaner
+- Kết quả theo chunk (nhiều kích thước) phải giống hệt từng byte bản đọc cả file
+- So với pipeline gốc (interpolate/ffill/bfill + pandas rolling trên cả DataFrame)
+- Chế độ incremental (watermark) sau nhiều lần append phải giống làm sạch lại toàn bộ,
+  kể cả khi dòng cuối của lần trước chưa có '\n'
+- Chế độ song song theo tháng phải giống hệt bản streaming; partition tháng giữ lại được
+- Báo cáo ghi số missing đo được sau khi làm sạch
+- Thống kê trong báo cáo (profiler streaming) khớp describe() và không phụ thuộc cách chia chunk
+"""
+
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.models.clean_data import (
+    clean_file, clean_incremental, clean_parallel, parse_datetime, outlier_mask, fill_missing, add_daily_energy,
+    format_profile, generate_cleaning_report, summarize_missing
+)
+from src.backend.feature_engine import add_calendar_features, add_rolling_features, compact_dtypes
+from src.backend.columnar_cache import cache_path_for, read_columnar
+
+CHUNK_SIZES = [0, 997, 5000, 20000]
+
+
+def _write_raw(path, n=60000, seed=0):
+    """File raw giả lập định dạng UCI với '?', outlier và khoảng trống nhiều độ dài"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2007-01-30 17:24', periods=n, freq='min')
+    data = {
+        'Date': times.strftime('%d/%m/%Y').str.replace(r'^0', '', regex=True),
+        'Time': times.strftime('%H:%M:%S'),
+        'Global_active_power': np.round(rng.uniform(0.1, 5, n), 3),
+        'Global_reactive_power': np.round(rng.uniform(0, 0.5, n), 3),
+        'Voltage': np.round(rng.uniform(225, 250, n), 2),
+        'Global_intensity': np.round(rng.uniform(0.2, 20, n), 1),
+        'Sub_metering_1': rng.integers(0, 40, n).astype(float),
+        'Sub_metering_2': rng.integers(0, 40, n).astype(float),
+        'Sub_metering_3': rng.integers(0, 20, n).astype(float)
+    }
+    df = pd.DataFrame(data).astype({c: object for c in list(data)[2:]})
+
+    # Cả dòng '?' (giống dữ liệu thật), outlier, và NaN riêng từng cột
+    for start, length in [(100, 3), (5000, 40), (21000, 1500)]:
+        df.iloc[start:start + length, 2:] = '?'
+    df.loc[rng.choice(n, 50, replace=False), 'Voltage'] = 300
+    df.loc[:4, 'Sub_metering_1'] = '?'                       # đầu file
+    for start, length in [(997, 4), (1990, 9), (4999, 35), (9000, 80), (19999, 7)]:
+        df.iloc[start:start + length, 6] = '?'
+    df.iloc[30000:30070, 7] = '?'
+    df.iloc[42100:42250, 6] = '?'                              # vắt qua 01/03 00:00
+    df.iloc[n - 12:, 8] = '?'                                  # cuối file
+    df.to_csv(path, sep=';', index=False)
+
+
+def _reference_clean(path):
+    """Pipeline gốc: xử lý cả DataFrame một lần"""
+    df = pd.read_csv(path, sep=';', low_memory=False, na_values=['?', ''], dtype={'Date': str, 'Time': str})
+    df = parse_datetime(df)
+    df = fill_missing(df[outlier_mask(df)]).dropna()
+    df = add_rolling_features(add_calendar_features(df, season_as='name'))
+    return compact_dtypes(add_daily_energy(df))
+
+
+def _clean(path, chunksize):
+    output = os.path.join(os.path.dirname(path), f"cleaned_{chunksize}.csv")
+    stats, _ = clean_file(path, output, chunksize=chunksize)
+    with open(output, 'rb') as f:
+        return f.read(), read_columnar(cache_path_for(output)), stats
+
+
+def test_chunked_output_identical():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw)
+        batch_csv, batch_cache, batch_stats = _clean(raw, 0)
+        for chunksize in CHUNK_SIZES[1:]:
+            csv_bytes, cache, stats = _clean(raw, chunksize)
+            assert csv_bytes == batch_csv, f"CSV khác nhau với chunksize={chunksize}"
+            pd.testing.assert_frame_equal(cache, batch_cache)
+            assert stats['cleaned_rows'] == batch_stats['cleaned_rows']
+            assert stats['missing'] == batch_stats['missing']
+            assert stats['outliers_removed'] == batch_stats['outliers_removed']
+
+
+def test_matches_reference_pipeline():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw)
+        _, cleaned, _ = _clean(raw, 5000)
+        expected = _reference_clean(raw)
+        assert list(cleaned.index) == list(expected.index)
+        # Rolling gốc của pandas cộng dồn nên lệch ~1e-16 trước khi ép float32
+        pd.testing.assert_frame_equal(cleaned, expected, check_freq=False, rtol=1e-6)
+
+
+def _split_raw(raw, cuts):
+    """Chia file raw thành các đoạn dòng (giữ header ở đoạn đầu) để mô phỏng append"""
+    with open(raw, 'rb') as f:
+        lines = f.readlines()
+    edges = [0] + cuts + [len(lines)]
+    return [b''.join(lines[a:b]) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def test_incremental_matches_full():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw)
+        full_csv, full_cache, full_stats = _clean(raw, 5000)
+
+        # Cắt giữa ngày, giữa khoảng trống NaN và giữa tháng
+        parts = _split_raw(raw, [9030, 9050, 30035, 44000])
+        growing = os.path.join(tmp, "growing.txt")
+        output = os.path.join(tmp, "incremental.csv")
+        modes = []
+        for i, part in enumerate(parts):
+            with open(growing, 'ab') as f:
+                f.write(part)
+            modes.append(clean_incremental(growing, output, chunksize=5000)[2])
+        modes.append(clean_incremental(growing, output, chunksize=5000)[2])
+        assert modes == ['full'] + ['incremental'] * (len(parts) - 1) + ['up-to-date']
+
+        with open(output, 'rb') as f:
+            assert f.read() == full_csv
+        pd.testing.assert_frame_equal(read_columnar(cache_path_for(output)), full_cache)
+
+
+def test_incremental_without_trailing_newline():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw, n=20000)
+        full_csv, full_cache, full_stats = _clean(raw, 5000)
+
+        # Lần đầu file dừng giữa chừng, dòng cuối chưa có '\n'
+        head, tail = _split_raw(raw, [15001])
+        growing = os.path.join(tmp, "growing.txt")
+        output = os.path.join(tmp, "incremental.csv")
+        with open(growing, 'wb') as f:
+            f.write(head.rstrip(b'\n'))
+        stats, _, mode = clean_incremental(growing, output, chunksize=5000)
+        assert mode == 'full' and stats['raw_rows'] == 14999
+
+        with open(growing, 'ab') as f:
+            f.write(b'\n' + tail)
+        assert clean_incremental(growing, output, chunksize=5000)[2] == 'incremental'
+        stats, _, mode = clean_incremental(growing, output, chunksize=5000)
+        assert mode == 'up-to-date'
+        for key in ['raw_rows', 'cleaned_rows', 'outliers_removed', 'missing']:
+            assert stats[key] == full_stats[key], key
+        with open(output, 'rb') as f:
+            assert f.read() == full_csv
+        pd.testing.assert_frame_equal(read_columnar(cache_path_for(output)), full_cache)
+
+
+def test_parallel_matches_streaming():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw)
+        stream_csv, stream_cache, stream_stats = _clean(raw, 5000)
+        # overlap nhỏ để buộc worker tự mở rộng tới neo / đủ rolling context
+        for overlap in [50, 2880]:
+            output = os.path.join(tmp, f"parallel_{overlap}.csv")
+            stats, _ = clean_parallel(raw, output, workers=2, overlap=overlap)
+            with open(output, 'rb') as f:
+                assert f.read() == stream_csv, f"CSV khác nhau với overlap={overlap}"
+            pd.testing.assert_frame_equal(read_columnar(cache_path_for(output)), stream_cache)
+            for key in ['raw_rows', 'valid_rows', 'outliers_removed', 'missing', 'cleaned_rows',
+                        'first_timestamp', 'last_timestamp', 'raw_columns']:
+                assert stats[key] == stream_stats[key], key
+            for profile in ['raw_profile', 'clean_profile']:
+                assert (format_profile(stats[profile].summary())
+                        == format_profile(stream_stats[profile].summary())), profile
+
+        # Partition tháng được giữ (và thay bộ cũ khi chạy lại), nối lại = cache streaming
+        partitions = os.path.join(tmp, "partitions")
+        for _ in range(2):
+            clean_parallel(raw, os.path.join(tmp, "kept.csv"), workers=2, partitions_dir=partitions)
+        names = sorted(os.listdir(partitions))
+        assert names == ['month=2007-01.parquet', 'month=2007-02.parquet', 'month=2007-03.parquet']
+        parts = pd.concat([pd.read_parquet(os.path.join(partitions, name)) for name in names])
+        pd.testing.assert_frame_equal(parts, stream_cache, check_freq=False)
+        assert not [name for name in os.listdir(tmp) if name.startswith('.')]
+
+
+def test_profile_matches_describe():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw)
+        _, cleaned, stats = _clean(raw, 997)
+        _, _, batch_stats = _clean(raw, 0)
+        summary = stats['clean_profile'].summary()
+        describe = cleaned.describe()
+        for col, row in summary.items():
+            assert row['count'] == describe.loc['count', col]
+            for field in ['mean', 'std', 'min', 'max']:
+                assert np.isclose(row[field], describe.loc[field, col], rtol=1e-6), (col, field)
+            # quantile xấp xỉ từ mẫu 4096 dòng: hạng thực của giá trị ước lượng lệch ít
+            values = cleaned[col].astype(float)
+            for q, field in [(0.25, '25%'), (0.5, '50%'), (0.75, '75%')]:
+                assert (values <= row[field]).mean() >= q - 0.03, (col, field)
+                assert (values < row[field]).mean() <= q + 0.03, (col, field)
+        # Mẫu bottom-k không phụ thuộc chunksize
+        assert format_profile(summary) == format_profile(batch_stats['clean_profile'].summary())
+        assert stats['raw_profile'].missing_counts() == stats['missing']
+
+
+def test_report_measures_remaining_missing():
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, "raw.txt")
+        _write_raw(raw, n=20000)
+        _, cleaned, stats = _clean(raw, 5000)
+        outlier_info = {'removed': 0, 'percentage': 0.0, 'criteria': []}
+        report = generate_cleaning_report(stats, summarize_missing(stats), outlier_info, list(cleaned.columns))
+        expected = int(cleaned.isna().sum().sum())
+        assert f"Missing values after cleaning: {expected:,}" in report
+
+        # Giá trị đo từ profiler, không phải hằng số
+        stats['clean_profile'].missing['Voltage'] += 7
+        report = generate_cleaning_report(stats, summarize_missing(stats), outlier_info, list(cleaned.columns))
+        assert f"Missing values after cleaning: {expected + 7:,}" in report
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST STREAMING CLEANER")
+    print("=" * 70)
+    test_chunked_output_identical()
+    print("✅ Chunked output identical to whole-file output")
+    test_matches_reference_pipeline()
+    print("✅ Matches reference pipeline")
+    test_incremental_matches_full()
+    print("✅ Incremental runs match full re-clean")
+    test_incremental_without_trailing_newline()
+    print("✅ Unterminated last line is picked up by the next incremental run")
+    test_parallel_matches_streaming()
+    print("✅ Parallel month partitions match streaming output")
+    test_profile_matches_describe()
+    print("✅ Streaming profile matches describe()")
+    test_report_measures_remaining_missing()
+    print("✅ Report states the measured missing count after cleaning")
@@ -0,0 +1,123 @@
+"""
+Test Columnar Cache (đọc theo khoảng thời gian)
+- resolve_range: start/end giữ nguyên, `last` tính ngược từ end hoặc mốc cuối dữ liệu
+- select_range (DataFrame trong RAM) theo đúng quy ước start/end/last
+- read_columnar chỉ đọc row group liên quan nhưng ra kết quả giống lọc trên toàn bộ dữ liệu
+- Cache có index không tên (không có cột Datetime): đọc hết rồi lọc, load_dataset(last='24h') vẫn chạy
+"""
+
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.backend.columnar_cache import (
+    resolve_range, select_range, read_columnar, write_columnar_cache, time_index, cache_path_for
+)
+from src.backend.data_loader import load_dataset
+
+
+def _frame(n=60 * 24 * 75, seed=0):
+    """~2.5 tháng dữ liệu theo phút -> 3 row group"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2007-01-15', periods=n, freq='min', name='Datetime')
+    return pd.DataFrame({
+        'Global_active_power': rng.uniform(0.1, 5, n).astype(np.float32),
+        'Voltage': rng.uniform(225, 250, n).astype(np.float32),
+        'hour': index.hour.astype(np.int8)
+    }, index=index)
+
+
+def test_resolve_range():
+    end = pd.Timestamp('2007-03-01 12:00')
+    assert resolve_range() == (None, None, True)
+    assert resolve_range('2007-01-20', '2007-02-01') == (
+        pd.Timestamp('2007-01-20'), pd.Timestamp('2007-02-01'), True)
+    # last tính từ mốc cuối của dữ liệu, bỏ đầu trái
+    assert resolve_range(last='24h', data_end=end) == (end - pd.Timedelta('24h'), end, False)
+    # end tường minh được ưu tiên hơn mốc cuối dữ liệu; start bị bỏ qua khi có last
+    assert resolve_range(start='2007-01-01', end='2007-02-01', last='7D', data_end=end) == (
+        pd.Timestamp('2007-01-25'), pd.Timestamp('2007-02-01'), False)
+    # Không có mốc nào để neo -> coi như không lọc theo last
+    assert resolve_range(last='24h') == (None, None, True)
+
+
+def test_select_range():
+    df = _frame(n=60 * 24 * 3)
+    assert select_range(df) is df
+    last = select_range(df, last='24h')
+    assert len(last) == 1440
+    pd.testing.assert_frame_equal(last, df.tail(1440))
+    window = select_range(df, start='2007-01-15 06:00', end='2007-01-15 07:00')
+    assert window.index[0] == pd.Timestamp('2007-01-15 06:00')
+    assert window.index[-1] == pd.Timestamp('2007-01-15 07:00')
+    assert len(window) == 61
+    assert len(select_range(df.iloc[:0], last='24h')) == 0
+
+
+def test_read_columnar_ranges():
+    df = _frame()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cleaned.parquet")
+        write_columnar_cache(df, path)
+        index = time_index(path)
+        assert [entry[3] for entry in index] == [17 * 1440, 28 * 1440, 30 * 1440]
+
+        pd.testing.assert_frame_equal(read_columnar(path), df, check_freq=False)
+        cases = [
+            dict(last='24h'),
+            dict(last='45D'),
+            dict(start='2007-01-31 23:00', end='2007-02-01 01:00'),   # vắt qua 2 row group
+            dict(start='2007-02-10'),
+            dict(end='2007-01-20 00:00'),
+            dict(end='2007-02-15', last='36h'),
+        ]
+        for kwargs in cases:
+            expected = select_range(df, **kwargs)
+            result = read_columnar(path, **kwargs)
+            pd.testing.assert_frame_equal(result, expected, check_freq=False, obj=str(kwargs))
+
+        # Chỉ các cột yêu cầu, index Datetime luôn giữ
+        result = read_columnar(path, columns=['Voltage', 'Datetime', 'missing'], last='24h')
+        assert list(result.columns) == ['Voltage'] and result.index.name == 'Datetime'
+        assert len(result) == 1440
+
+        # Khoảng nằm ngoài dữ liệu -> rỗng nhưng giữ schema
+        empty = read_columnar(path, start='2010-01-01')
+        assert len(empty) == 0 and list(empty.columns) == list(df.columns)
+
+
+def test_unnamed_index_full_read():
+    df = _frame(n=60 * 24 * 40)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ['Datetime', None]:
+            csv_path = os.path.join(tmp, f"cleaned_{name}.csv")
+            write_columnar_cache(df.rename_axis(name), cache_path_for(csv_path))
+            assert (time_index(cache_path_for(csv_path)) is None) == (name is None)
+
+            result = read_columnar(cache_path_for(csv_path), last='24h')
+            pd.testing.assert_frame_equal(result, df.tail(1440).rename_axis(name), check_freq=False)
+
+            # Chỉ có cache (không có CSV) -> load_dataset đọc cache
+            loaded = load_dataset(csv_path, last='24h')
+            assert len(loaded) == 1440
+            assert loaded.index[-1] == df.index[-1]
+            np.testing.assert_array_equal(loaded['Voltage'].values, df['Voltage'].values[-1440:])
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST COLUMNAR CACHE")
+    print("=" * 70)
+    test_resolve_range()
+    print("✅ resolve_range")
+    test_select_range()
+    print("✅ select_range")
+    test_read_columnar_ranges()
+    print("✅ read_columnar range reads match in-memory filtering")
+    test_unnamed_index_full_read()
+    print("✅ Cache without a Datetime column falls back to a full read")
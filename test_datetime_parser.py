@@ -0,0 +1,85 @@
+"""
+Test Datetime Parser
+- parse_date_time khớp pd.to_datetime(Date + ' ' + Time) trên dữ liệu dạng UCI:
+  ngày/tháng một chữ số, dòng '?' / thiếu / sai định dạng -> NaT
+- parse_dates khớp pd.to_datetime trên cột ngày
+- Benchmark (chạy trực tiếp file): so thời gian với parse chuỗi ghép
+"""
+
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.backend.datetime_parser import parse_date_time, parse_dates, RAW_DATE_FORMAT, RAW_TIME_FORMAT
+
+FORMAT = f"{RAW_DATE_FORMAT} {RAW_TIME_FORMAT}"
+
+
+def _raw_columns(n=60 * 24 * 40, seed=0):
+    """Date/Time giống file UCI: '1/2/2007' (không có số 0 đầu), kèm '?' và giá trị lỗi"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2007-01-28 17:24', periods=n, freq='min')
+    dates = pd.Series([f"{t.day}/{t.month}/{t.year}" for t in times])
+    clock = pd.Series(times.strftime('%H:%M:%S'))
+    for column in (dates, clock):
+        column[rng.choice(n, 30, replace=False)] = '?'
+    dates[rng.choice(n, 5, replace=False)] = np.nan
+    clock[rng.choice(n, 5, replace=False)] = ''
+    dates[7] = '31/2/2007'      # ngày không tồn tại
+    clock[8] = '25:00:00'       # giờ không hợp lệ
+    return dates, clock
+
+
+def _reference(dates, times):
+    return pd.to_datetime(dates + ' ' + times, format=FORMAT, errors='coerce')
+
+
+def test_matches_string_concat():
+    dates, times = _raw_columns()
+    expected = _reference(dates, times)
+    result = parse_date_time(dates, times)
+    assert expected.isna().sum() > 70
+    pd.testing.assert_series_equal(result, expected, check_dtype=False)
+    # Ngày/tháng một chữ số được parse đúng
+    assert dates[0] == '28/1/2007' and result[0] == pd.Timestamp('2007-01-28 17:24')
+
+    # Index của `dates` được giữ (chunk đọc từ giữa file)
+    shifted_dates, shifted_times = dates.copy(), times.copy()
+    shifted_dates.index = shifted_times.index = np.arange(1000, 1000 + len(dates))
+    assert list(parse_date_time(shifted_dates, shifted_times).index) == list(shifted_dates.index)
+
+
+def test_parse_dates():
+    dates, _ = _raw_columns(n=60 * 24 * 5)
+    expected = pd.to_datetime(dates, format=RAW_DATE_FORMAT, errors='coerce').values
+    np.testing.assert_array_equal(parse_dates(dates), expected)
+
+
+def benchmark_parse(n=2_000_000, repeats=3):
+    """In thời gian parse_date_time so với pd.to_datetime trên chuỗi ghép"""
+    dates, times = _raw_columns(n=n)
+    for name, fn in [("to_datetime(Date + ' ' + Time)", lambda: _reference(dates, times)),
+                     ("parse_date_time", lambda: parse_date_time(dates, times))]:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        print(f"   {name:<32} {best * 1000:>9.1f} ms ({n:,} rows)")
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST DATETIME PARSER")
+    print("=" * 70)
+    test_matches_string_concat()
+    print("✅ parse_date_time matches pd.to_datetime on concatenated strings")
+    test_parse_dates()
+    print("✅ parse_dates matches pd.to_datetime")
+    print("\n⏱️ Benchmark:")
+    benchmark_parse()
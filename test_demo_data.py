@@ -0,0 +1,65 @@
+"""
+Test Demo Data
+- Tất định: cùng seed cho cùng dữ liệu, seed khác cho dữ liệu khác
+- Nhiễu khóa theo ngày: sinh một đoạn (start/end/last) cho đúng giá trị của đoạn
+  đó trong bản sinh dài hơn, kể cả rolling_1440 ở đầu đoạn
+- load_demo không ghi cache khi seed khác mặc định
+"""
+
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import pandas as pd
+
+from src.backend.demo_data import generate_demo, load_demo, DEMO_END, DEMO_START
+
+
+def test_deterministic_by_seed():
+    window = dict(start='2008-05-01', end='2008-05-03 23:59')
+    first = generate_demo(**window)
+    pd.testing.assert_frame_equal(first, generate_demo(**window))
+    assert len(first) == 3 * 1440
+    other = generate_demo(seed=7, **window)
+    assert not first['Global_active_power'].equals(other['Global_active_power'])
+
+
+def test_sub_range_matches_longer_range():
+    wide = generate_demo(start='2008-02-25', end='2008-03-10 23:59')
+    for start, end in [('2008-03-01 00:00', '2008-03-01 23:59'),     # đúng một ngày
+                       ('2008-03-04 13:17', '2008-03-06 02:03'),     # giữa ngày, qua nhiều ngày
+                       ('2008-02-29 23:00', '2008-03-01 01:00')]:    # qua mốc đổi tháng
+        part = generate_demo(start=start, end=end)
+        expected = wide.loc[start:end]
+        pd.testing.assert_frame_equal(part, expected, check_freq=False, obj=f"{start}..{end}")
+
+    # last tính từ cuối bộ demo
+    tail = generate_demo(last='2D')
+    assert tail.index[-1] == DEMO_END and len(tail) == 2 * 1440
+    pd.testing.assert_frame_equal(tail, generate_demo(start=DEMO_END - pd.Timedelta('3D'))
+                                  .iloc[-len(tail):], check_freq=False)
+    # Ngày đầu tiên: không có phút nào trước DEMO_START
+    assert generate_demo(end=DEMO_START + pd.Timedelta(hours=1)).index[0] == DEMO_START
+
+
+def test_custom_seed_skips_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "demo.parquet")
+        df = load_demo(last='1D', columns=['Global_active_power', 'rolling_60'], cache_path=cache_path, seed=3)
+        assert not os.path.exists(cache_path)
+        assert list(df.columns) == ['Global_active_power', 'rolling_60'] and len(df) == 1440
+        pd.testing.assert_frame_equal(df, generate_demo(last='1D', seed=3)[['Global_active_power', 'rolling_60']])
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST DEMO DATA")
+    print("=" * 70)
+    test_deterministic_by_seed()
+    print("✅ Deterministic per seed")
+    test_sub_range_matches_longer_range()
+    print("✅ Any sub-range matches the same minutes of a longer range")
+    test_custom_seed_skips_cache()
+    print("✅ Custom seed does not touch the demo cache")
@@ -0,0 +1,120 @@
+"""
+Test Feature Engine
+- StreamingFeatureState (warm start + update từng phút) khớp add_rolling_features /
+  add_calendar_features tính trên cả DataFrame
+- RollingWindowState sau nhiều vòng ring buffer vẫn khớp trung bình tính lại từ đầu
+- compact_dtypes: kiểu gọn giữ nguyên qua columnar cache và CSV, giá trị chỉ lệch ở mức float32
+"""
+
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.backend.feature_engine import (
+    ROLLING_WINDOWS, RollingWindowState, StreamingFeatureState, add_calendar_features,
+    add_rolling_features, compact_dtypes, encode_season
+)
+from src.backend.columnar_cache import write_columnar_cache, read_columnar, read_csv_typed
+
+
+def _minutes(n=4000, seed=0, start='2007-02-27 20:00'):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n, freq='min', name='Datetime')
+    return pd.DataFrame({
+        'Global_active_power': rng.uniform(0.1, 5, n),
+        'Global_reactive_power': rng.uniform(0, 0.5, n),
+        'Voltage': rng.uniform(225, 250, n),
+        'Global_intensity': rng.uniform(0.2, 20, n),
+        'Sub_metering_1': rng.integers(0, 40, n).astype(float),
+        'Sub_metering_2': rng.integers(0, 40, n).astype(float),
+        'Sub_metering_3': rng.integers(0, 20, n).astype(float)
+    }, index=index)
+
+
+def test_streaming_state_matches_batch():
+    df = _minutes()
+    expected = add_rolling_features(add_calendar_features(df.copy(), season_as='code'))
+
+    # Warm start ngắn hơn cửa sổ lớn nhất, rồi cập nhật từng phút qua mốc đổi tháng
+    warm = 600
+    state = StreamingFeatureState().warm_start(df.iloc[:warm])
+    for i in range(warm, len(df)):
+        state.update(df.index[i], df.iloc[i].to_dict())
+        if i % 97 and i != len(df) - 1:
+            continue
+        feats = state.features()
+        row = expected.iloc[i]
+        for w in ROLLING_WINDOWS:
+            assert np.isclose(feats[f'rolling_{w}'], row[f'rolling_{w}'], rtol=1e-9), (i, w)
+        for col in ['hour', 'weekday', 'month', 'season']:
+            assert feats[col] == row[col], (i, col)
+        assert feats['Voltage'] == row['Voltage']
+
+    # Warm start trên cả lịch sử = dòng cuối của bản batch
+    feats = StreamingFeatureState().warm_start(df).features()
+    for w in ROLLING_WINDOWS:
+        assert np.isclose(feats[f'rolling_{w}'], expected[f'rolling_{w}'].iloc[-1], rtol=1e-9)
+
+
+def test_ring_buffer_long_run():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 10, 5000)
+    state = RollingWindowState((1, 7, 24, 100), capacity=100)
+    state.extend(values[:50])
+    for i in range(50, len(values)):
+        state.push(values[i])
+        if i % 37 == 0 or i == len(values) - 1:
+            seen = values[:i + 1]
+            for w in (1, 7, 24, 100):
+                assert np.isclose(state.mean(w), seen[-w:].mean(), rtol=1e-12), (i, w)
+            assert state.lag(24) == seen[-24]
+
+
+def test_compact_dtypes_round_trip():
+    df = add_rolling_features(add_calendar_features(_minutes(n=3000), season_as='name'))
+    df['energy_per_day_kwh'] = df['Global_active_power'].groupby(df.index.date).transform('sum') / 60
+    original = df.copy()
+    compact = compact_dtypes(df)
+
+    assert all(compact[c].dtype == np.float32 for c in ['Global_active_power', 'Voltage', 'rolling_1440',
+                                                          'energy_per_day_kwh'])
+    assert all(compact[c].dtype == np.int8 for c in ['hour', 'weekday', 'month'])
+    assert isinstance(compact['season'].dtype, pd.CategoricalDtype)
+    for col in original.columns:
+        if col == 'season':
+            assert list(compact[col].astype(str)) == list(original[col])
+        else:
+            np.testing.assert_allclose(compact[col].astype(np.float64), original[col], rtol=1e-6)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Parquet: giữ nguyên kiểu và giá trị
+        path = os.path.join(tmp, "cache.parquet")
+        write_columnar_cache(compact, path)
+        pd.testing.assert_frame_equal(read_columnar(path), compact, check_freq=False)
+
+        # CSV: ghi rồi đọc lại + compact ra đúng các giá trị float32 ban đầu
+        csv_path = os.path.join(tmp, "cleaned.csv")
+        compact.to_csv(csv_path)
+        reloaded = compact_dtypes(read_csv_typed(csv_path))
+        pd.testing.assert_frame_equal(reloaded, compact, check_freq=False)
+
+        # Season dạng mã số (như model dùng) cũng gọn về int8
+        coded = compact_dtypes(encode_season(reloaded.copy()))
+        assert coded['season'].dtype == np.int8
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST FEATURE ENGINE")
+    print("=" * 70)
+    test_streaming_state_matches_batch()
+    print("✅ StreamingFeatureState matches batch rolling/calendar features")
+    test_ring_buffer_long_run()
+    print("✅ Ring buffer sums stay exact over many wraps")
+    test_compact_dtypes_round_trip()
+    print("✅ Compact dtypes survive Parquet and CSV round trips")
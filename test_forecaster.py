@@ -0,0 +1,139 @@
+"""
+Test Recursive Forecaster
+- Đặc trưng rolling/lag của từng bước (ring buffer O(1)) khớp trung bình tính lại
+  trực tiếp trên chuỗi lịch sử theo giờ + các dự báo trước đó, kể cả khi buffer quay vòng
+- Bước đầu dùng rolling theo phút tại gốc như lúc train
+- Gốc mặc định là cuối lịch sử (không phải giờ hệ thống); cột ngoại sinh theo
+  trung bình từng giờ trong ngày của cửa sổ warm start
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.backend.forecaster import RecursiveForecaster
+from src.backend.feature_engine import MODEL_FEATURES, add_rolling_features, derive_intensity
+
+
+def _history(days=3, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2007-03-01', periods=days * 1440, freq='min', name='Datetime')
+    power = 1.0 + np.exp(-((index.hour - 19) ** 2) / 8) + rng.normal(0, 0.1, len(index))
+    return pd.DataFrame({
+        'Global_active_power': np.clip(power, 0.2, 5.0),
+        'Global_reactive_power': 0.1,
+        'Voltage': 240.0,
+        'Global_intensity': 5.0,
+        'Sub_metering_1': 0.0, 'Sub_metering_2': 1.0, 'Sub_metering_3': 6.0
+    }, index=index)
+
+
+class _RecordingModel:
+    """Model giả: ghi lại mọi dòng đặc trưng, dự báo phụ thuộc rolling_60 và giờ"""
+
+    def __init__(self):
+        self.rows = []
+        self.col = {name: j for j, name in enumerate(MODEL_FEATURES)}
+
+    def __call__(self, X):
+        self.rows.append(np.array(X[0], copy=True))
+        return 0.7 * X[:, self.col['rolling_60']] + 0.05 * X[:, self.col['hour']] + 0.1
+
+
+def test_recursive_state_matches_exact_rolling():
+    history = _history()
+    model = _RecordingModel()
+    forecaster = RecursiveForecaster(model, MODEL_FEATURES, step_minutes=60)
+    origin = history.index[-1] + pd.Timedelta(minutes=1)
+    steps = 24 * 5   # > capacity (24 bước) -> ring buffer quay vòng nhiều lần
+    predictions = forecaster.warm_start(history, origin).forecast(steps)
+    assert len(predictions) == steps and len(model.rows) == steps
+
+    hourly = history['Global_active_power'].resample('60min').mean().values
+    series = np.concatenate([hourly, predictions])
+    col = model.col
+
+    # Bước đầu: rolling theo phút tại gốc
+    exact = add_rolling_features(history.copy()).iloc[-1]
+    for w in (5, 15, 60, 1440):
+        assert np.isclose(model.rows[0][col[f'rolling_{w}']], exact[f'rolling_{w}'])
+
+    for i in range(1, steps):
+        seen = series[:len(hourly) + i]
+        row = model.rows[i]
+        # rolling_5 / rolling_15 ngắn hơn một bước -> giá trị bước gần nhất
+        assert np.isclose(row[col['rolling_5']], seen[-1], rtol=1e-12), i
+        assert np.isclose(row[col['rolling_15']], seen[-1], rtol=1e-12), i
+        assert np.isclose(row[col['rolling_60']], seen[-1], rtol=1e-12), i
+        assert np.isclose(row[col['rolling_1440']], seen[-24:].mean(), rtol=1e-12), i
+        # Lịch đi theo từng giờ kể từ gốc
+        assert row[col['hour']] == (origin + pd.Timedelta(hours=i + 1)).hour
+        # Dự báo được đưa lại đúng vào trạng thái
+        assert np.isclose(predictions[i], max(0.1, 0.7 * seen[-1] + 0.05 * row[col['hour']] + 0.1))
+
+    # Trạng thái cuối = trung bình tính lại từ đầu
+    assert np.isclose(forecaster.state.mean(24), series[-24:].mean(), rtol=1e-12)
+
+
+def test_direct_forecast_uses_origin_state():
+    history = _history(days=2, seed=1)
+    model = _RecordingModel()
+    forecaster = RecursiveForecaster(model, MODEL_FEATURES).warm_start(history, history.index[-1])
+    horizons = np.array([1, 6, 24, 48])
+    predictions = forecaster.forecast_direct(horizons)
+    exact = add_rolling_features(history.copy()).iloc[-1]
+    expected = 0.7 * exact['rolling_60'] + 0.05 * ((history.index[-1].hour + horizons) % 24) + 0.1
+    np.testing.assert_allclose(predictions, np.maximum(0.1, expected))
+
+
+def test_default_origin_and_hourly_exogenous():
+    history = _history(days=3, seed=2)
+    hour = history.index.hour
+    history['Voltage'] = 235.0 + hour              # khác nhau theo từng giờ
+    history['Sub_metering_3'] = np.where((hour >= 18) & (hour < 22), 15.0, 1.0)
+    history['Global_reactive_power'] = 0.05 + 0.01 * hour
+    model = _RecordingModel()
+    steps = 48
+    predictions = RecursiveForecaster(model, MODEL_FEATURES).warm_start(history).forecast(steps)
+
+    col = model.col
+    hourly = history.groupby(history.index.hour).mean()
+    for i, row in enumerate(model.rows):
+        # Lịch nối tiếp mốc cuối của lịch sử
+        t = history.index[-1] + pd.Timedelta(hours=i + 1)
+        assert (row[col['hour']], row[col['weekday']], row[col['month']]) == (t.hour, t.weekday(), t.month), i
+        for name in ['Voltage', 'Sub_metering_3', 'Global_reactive_power']:
+            assert np.isclose(row[col[name]], hourly.loc[t.hour, name]), (i, name)
+        if i:
+            expected = derive_intensity(predictions[i - 1], hourly.loc[t.hour, 'Global_reactive_power'],
+                                        hourly.loc[t.hour, 'Voltage'])
+            assert np.isclose(row[col['Global_intensity']], expected), i
+    # Bước đầu: Global_intensity là giá trị quan sát cuối
+    assert model.rows[0][col['Global_intensity']] == history['Global_intensity'].iloc[-1]
+
+    # Giờ không có trong cửa sổ warm start -> giá trị cuối
+    short = history.iloc[-120:]
+    model = _RecordingModel()
+    RecursiveForecaster(model, MODEL_FEATURES).warm_start(short).forecast(24)
+    last_voltage = short['Voltage'].iloc[-1]
+    seen_hours = set(short.index.hour)
+    for i, row in enumerate(model.rows):
+        h = (short.index[-1] + pd.Timedelta(hours=i + 1)).hour
+        if h not in seen_hours:
+            assert row[col['Voltage']] == last_voltage, i
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST RECURSIVE FORECASTER")
+    print("=" * 70)
+    test_recursive_state_matches_exact_rolling()
+    print("✅ Ring-buffer state matches exact rolling means")
+    test_direct_forecast_uses_origin_state()
+    print("✅ Direct forecast uses the origin state")
+    test_default_origin_and_hourly_exogenous()
+    print("✅ Default origin is the end of history, exogenous columns follow the hourly profile")
@@ -0,0 +1,83 @@
+"""
+Test Hyperparameter Search (successive halving)
+- Lịch rung: số cấu hình giảm eta lần, lát dữ liệu tăng tới 100%
+- Chỉ cấu hình tốt nhất của rung trước được lên rung sau, best lấy ở rung cuối
+- LightGBM được tìm bằng chính trainer early stopping của bản deploy, xếp theo Monthly_Error
+"""
+
+import sys
+import os
+import json
+from functools import partial
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeRegressor
+
+from src.models.hparam_search import halving_schedule, sample_configs, run_search
+from src.models.lgb_training import EarlyStoppedLightGBM
+
+SPACE = {'max_depth': [1, 2, 3, 4, 6, 8, 10, 12, 14], 'min_samples_leaf': [1, 20]}
+
+
+def build_tree(n_jobs=None, **params):
+    return DecisionTreeRegressor(random_state=0, **params)
+
+
+def test_schedule_and_sampling():
+    assert halving_schedule(27, eta=3, min_fraction=1/9) == [(1/9, 27), (1/3, 9), (1.0, 3)]
+    # 1/9 không phải lũy thừa của 2: rung cuối vẫn phải là toàn bộ dữ liệu
+    assert halving_schedule(16, eta=2, min_fraction=1/9) == [(1/9, 16), (2/9, 8), (4/9, 4), (1.0, 2)]
+    assert halving_schedule(16, eta=4, min_fraction=1/10) == [(1/10, 16), (4/10, 4), (1.0, 1)]
+    configs = sample_configs(SPACE, 10, seed=1)
+    assert len(configs) == 10
+    assert len({json.dumps(c, sort_keys=True) for c in configs}) == 10
+    assert sample_configs(SPACE, 10, seed=1) == configs
+
+
+def test_successive_halving_promotes_best():
+    rng = np.random.default_rng(0)
+    n = 60 * 24 * 20
+    X = rng.normal(size=(n, 3))
+    y = np.sin(3 * X[:, 0]) + X[:, 1] * X[:, 2] + rng.normal(scale=0.1, size=n)
+    datetimes = pd.date_range('2007-01-01', periods=n, freq='min')
+
+    leaderboard, best = run_search(X, y, datetimes, {'Tree': build_tree}, spaces={'Tree': SPACE},
+                                   n_configs=9, eta=3, min_fraction=1/3, workers=1)
+    assert list(leaderboard.groupby('rung').size()) == [9, 3]
+    rung0 = leaderboard[leaderboard['rung'] == 0].sort_values('R2', ascending=False)
+    rung1 = leaderboard[leaderboard['rung'] == 1]
+    assert set(rung1['trial']) == set(rung0['trial'][:3])
+    assert rung1['n_train'].iloc[0] > rung0['n_train'].iloc[0]
+    assert best['Tree'] == json.loads(rung1.sort_values('R2', ascending=False)['params'].iloc[0])
+    assert best['Tree']['max_depth'] >= 4
+
+
+def test_lightgbm_search_uses_early_stopping():
+    rng = np.random.default_rng(0)
+    n = 60 * 24 * 40
+    X = rng.normal(size=(n, 3))
+    y = 1.5 + X[:, 0] + 0.5 * X[:, 1] ** 2 + rng.normal(scale=0.3, size=n)
+    datetimes = pd.date_range('2007-01-01', periods=n, freq='min')
+    space = {'num_leaves': [7, 31], 'learning_rate': [0.05, 0.2]}
+
+    leaderboard, best = run_search(X, y, datetimes, {'LightGBM': partial(EarlyStoppedLightGBM, cache_dir=None)},
+                                   spaces={'LightGBM': space}, n_configs=4, eta=2, min_fraction=1/2,
+                                   metric='Monthly_Error', workers=1)
+    assert list(leaderboard.groupby('rung').size()) == [4, 2]
+    last = leaderboard[leaderboard['rung'] == 1].sort_values('Monthly_Error')
+    assert best['LightGBM'] == json.loads(last['params'].iloc[0])
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST HYPERPARAMETER SEARCH")
+    print("=" * 70)
+    test_schedule_and_sampling()
+    print("✅ Rung schedule and config sampling")
+    test_successive_halving_promotes_best()
+    print("✅ Successive halving promotes the best configs")
+    test_lightgbm_search_uses_early_stopping()
+    print("✅ LightGBM search uses the early-stopped trainer and Monthly_Error")
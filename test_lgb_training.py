@@ -0,0 +1,118 @@
+"""
+Test LightGBM Early Stopping + Dataset Cache
+- feval Monthly_Error khớp regression_metrics trên validation
+- Lần chạy thứ hai nạp Dataset .bin từ cache và ra cùng model
+- Early stopping dừng trước max_rounds (không sớm hơn min_rounds), Booster trả về đã cắt còn best_iteration
+- Cache Dataset giữ tối đa MAX_DATASET_ENTRIES cặp, xóa cặp ít dùng nhất
+- EarlyStoppedLightGBM (dùng cho backtest / search) ra đúng model của train_lightgbm_early_stopped
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.models.lgb_training import (
+    monthly_error_eval, time_validation_split, train_lightgbm_early_stopped, cached_datasets,
+    EarlyStoppedLightGBM, MAX_DATASET_ENTRIES
+)
+from src.models.backtest import regression_metrics
+
+
+def _data(n=60 * 24 * 90, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5))
+    y = 1.5 + X[:, 0] + 0.5 * X[:, 1] ** 2 + rng.normal(scale=0.3, size=n)
+    datetimes = pd.date_range('2007-01-01', periods=n, freq='min')
+    return X, y, datetimes
+
+
+class _Labels:
+    def __init__(self, y):
+        self.y = y
+
+    def get_label(self):
+        return self.y
+
+
+def test_monthly_feval_matches_metrics():
+    _, y, datetimes = _data(n=60 * 24 * 70)
+    preds = y + np.random.default_rng(1).normal(scale=0.5, size=len(y))
+    name, value, higher_better = monthly_error_eval(datetimes)(preds, _Labels(y))
+    assert name == 'monthly_kwh_mae' and not higher_better
+    assert np.isclose(value, regression_metrics(y, preds, datetimes)['Monthly_Error'])
+
+
+def test_early_stopping_and_dataset_cache():
+    X, y, datetimes = _data()
+    with tempfile.TemporaryDirectory() as tmp:
+        kwargs = dict(n_jobs=1, cache_dir=tmp, max_rounds=400, min_rounds=30)
+        first = train_lightgbm_early_stopped(X, y, datetimes, **kwargs)
+        assert len([f for f in os.listdir(tmp) if f.endswith('.bin')]) == 2
+        assert 30 <= first.current_iteration() < 400
+
+        second = train_lightgbm_early_stopped(X, y, datetimes, **kwargs)
+        assert second.current_iteration() == first.current_iteration()
+        split = time_validation_split(len(X))
+        np.testing.assert_allclose(first.predict(X[split:]), second.predict(X[split:]))
+        assert len(first.dump_model()['tree_info']) == first.current_iteration()
+
+
+def test_dataset_cache_pruned():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        keys = []
+        for i in range(MAX_DATASET_ENTRIES):
+            X, y = rng.normal(size=(200, 3)), rng.normal(size=200)
+            before = set(os.listdir(tmp))
+            cached_datasets(X[:150], y[:150], X[150:], y[150:], tmp)
+            keys.append(next(f for f in os.listdir(tmp) if f not in before).split('.')[0])
+            # mtime tăng dần rõ ràng
+            for name in os.listdir(tmp):
+                if name.startswith(keys[-1]):
+                    stamp = time.time() - 100 + i
+                    os.utime(os.path.join(tmp, name), (stamp, stamp))
+            if i == 0:
+                first = (X, y)
+        # Cache hit làm mới entry đầu tiên -> không bị xóa dù tạo sớm nhất
+        X, y = first
+        cached_datasets(X[:150], y[:150], X[150:], y[150:], tmp)
+        assert len(os.listdir(tmp)) == 2 * MAX_DATASET_ENTRIES
+        for _ in range(2):
+            X, y = rng.normal(size=(200, 3)), rng.normal(size=200)
+            before = set(os.listdir(tmp))
+            cached_datasets(X[:150], y[:150], X[150:], y[150:], tmp)
+            keys.append(next(f for f in os.listdir(tmp) if f not in before).split('.')[0])
+
+        files = os.listdir(tmp)
+        kept = {f.split('.')[0] for f in files}
+        assert len(files) == 2 * MAX_DATASET_ENTRIES and len(kept) == MAX_DATASET_ENTRIES
+        assert keys[0] in kept and keys[-1] in kept
+        assert keys[1] not in kept and keys[2] not in kept
+
+
+def test_wrapper_matches_trainer():
+    X, y, datetimes = _data(n=60 * 24 * 40)
+    direct = train_lightgbm_early_stopped(X, y, datetimes, n_jobs=1, params={'num_leaves': 15}, cache_dir=None)
+    model = EarlyStoppedLightGBM(n_jobs=1, cache_dir=None, num_leaves=15).fit(X, y, datetimes)
+    assert model.booster_.current_iteration() == direct.current_iteration()
+    np.testing.assert_allclose(model.predict(X[:1000]), direct.predict(X[:1000]))
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST LIGHTGBM EARLY STOPPING")
+    print("=" * 70)
+    test_monthly_feval_matches_metrics()
+    print("✅ Monthly error feval matches regression_metrics")
+    test_early_stopping_and_dataset_cache()
+    print("✅ Early stopping + binary Dataset cache")
+    test_dataset_cache_pruned()
+    print("✅ Dataset cache pruned to the most recently used entries")
+    test_wrapper_matches_trainer()
+    print("✅ EarlyStoppedLightGBM matches the deployed trainer")
@@ -1,7 +1,7 @@
 import joblib
 import os
 
-model_path = 'checkpoints/best_model_random_forest.pkl'
+model_path = 'checkpoints/best_model_lightgbm.pkl'
 
 if os.path.exists(model_path):
     print("✅ File tồn tại!")
@@ -0,0 +1,153 @@
+"""
+Test Model Registry
+- register() không tự promote; version id = max + 1 (không trùng sau khi xóa version)
+- Ghi manifest atomic: lỗi giữa chừng giữ nguyên manifest cũ, không để lại file tạm
+- promote / rollback đổi version active, kiểm tra hash
+- ManagedPredictor swap sang version mới sau promote mà không tạo lại object
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import joblib
+
+from src.backend import model_registry
+from src.backend.model_registry import ModelRegistry, ManagedPredictor
+
+MODEL_PATH = 'checkpoints/best_model_lightgbm.pkl'
+
+
+def _package(tmp, name):
+    """Bản copy của model thật với timestamp khác -> hash khác"""
+    package = joblib.load(MODEL_PATH)
+    package['timestamp'] = name
+    path = os.path.join(tmp, f"{name}.pkl")
+    joblib.dump(package, path)
+    return path
+
+
+def test_register_ids_and_no_auto_promote():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, "registry"))
+        v1 = registry.register(_package(tmp, "a"))
+        assert v1 == "lightgbm-v1"
+        assert registry.active_version() is None
+
+        # Package trùng hash -> cùng version
+        assert registry.register(os.path.join(tmp, "a.pkl")) == v1
+        v2 = registry.register(_package(tmp, "b"))
+        v3 = registry.register(_package(tmp, "c"))
+        assert (v2, v3) == ("lightgbm-v2", "lightgbm-v3")
+
+        # Xóa v2 khỏi manifest -> id mới vẫn không trùng v3
+        manifest = registry.load_manifest()
+        del manifest['versions'][v2]
+        registry._write_manifest(manifest)
+        assert registry.register(_package(tmp, "d")) == "lightgbm-v4"
+        assert registry.active_version() is None
+
+        assert registry.register(_package(tmp, "e"), promote=True) == "lightgbm-v5"
+        assert registry.active_version() == "lightgbm-v5"
+
+
+def test_manifest_write_is_atomic():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, "registry"))
+        version = registry.register(_package(tmp, "a"))
+        with open(registry.manifest_path, "rb") as f:
+            before = f.read()
+
+        original = json.dump
+
+        def failing_dump(obj, f, **kwargs):
+            f.write('{"active": ')  # ghi dở rồi lỗi
+            raise RuntimeError("disk full")
+
+        model_registry.json.dump = failing_dump
+        try:
+            registry.promote(version)
+            raise AssertionError("promote phải báo lỗi")
+        except RuntimeError:
+            pass
+        finally:
+            model_registry.json.dump = original
+
+        with open(registry.manifest_path, "rb") as f:
+            assert f.read() == before
+        assert registry.active_version() is None
+        assert [f for f in os.listdir(registry.root) if f.startswith(".manifest-")] == []
+
+
+def test_promote_and_rollback():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, "registry"))
+        v1 = registry.register(_package(tmp, "a"))
+        v2 = registry.register(_package(tmp, "b"))
+        try:
+            registry.rollback()
+            raise AssertionError("rollback khi chưa promote phải báo lỗi")
+        except ValueError:
+            pass
+
+        registry.promote(v1)
+        registry.promote(v2)
+        assert registry.active_version() == v2
+        assert registry.rollback() == v1
+        assert registry.active_version() == v1
+        assert registry.active_model_path() == os.path.join(registry.root, v1, "model.pkl")
+
+        # File bị sửa sau khi đăng ký -> không được promote
+        with open(registry.model_path(v2), "ab") as f:
+            f.write(b"tampered")
+        try:
+            registry.promote(v2)
+            raise AssertionError("promote file sai hash phải báo lỗi")
+        except ValueError:
+            pass
+        assert registry.active_version() == v1
+
+
+def test_managed_predictor_hot_swap():
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(os.path.join(tmp, "registry"))
+        v1 = registry.register(_package(tmp, "a"), promote=True)
+        v2 = registry.register(_package(tmp, "b"))
+
+        managed = ManagedPredictor(registry, check_interval=0.0)
+        first = managed.get()
+        assert managed.version == v1
+
+        # Chưa promote -> vẫn phục vụ v1
+        assert managed.get() is first
+
+        # mtime_ns có thể trùng nếu ghi quá nhanh -> chờ nhẹ để chữ ký đổi
+        time.sleep(0.01)
+        registry.promote(v2)
+        deadline = time.time() + 30
+        while managed.version != v2 and time.time() < deadline:
+            managed.get()
+            time.sleep(0.05)
+        assert managed.version == v2
+        second = managed.get()
+        assert second is not first
+        assert second.model_path == registry.model_path(v2)
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST MODEL REGISTRY")
+    print("=" * 70)
+    test_register_ids_and_no_auto_promote()
+    print("✅ Version ids use max + 1 and register never auto-promotes")
+    test_manifest_write_is_atomic()
+    print("✅ Failed manifest write leaves the old manifest intact")
+    test_promote_and_rollback()
+    print("✅ Promote / rollback with hash check")
+    test_managed_predictor_hot_swap()
+    print("✅ ManagedPredictor swaps to the promoted version")
@@ -0,0 +1,142 @@
+"""
+Test Prediction Cache
+- Key ổn định: form tương đương (thứ tự, kiểu số, khoảng trắng, numpy scalar) cho cùng key;
+  model, lịch sử, số ngày hoặc tháng khác cho key khác
+- LRU: vượt max_entries thì loại entry ít dùng nhất
+- TTL (khi bật) làm entry hết hạn; mặc định không hết hạn theo giờ
+- Tầng đĩa dùng chung giữa các instance, giới hạn số file
+- invalidate(fingerprint) chỉ xóa kết quả của cửa sổ lịch sử đó
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+
+from src.backend import prediction_cache
+from src.backend.prediction_cache import PredictionCache, make_key, normalize_params
+
+FINGERPRINT = (1440, '2025-01-01 00:00:00', '2025-01-01 23:59:00', 1.2, 0.8)
+
+
+def _key(fingerprint=FINGERPRINT, **params):
+    return make_key(params, 'model@1', fingerprint, days=30)
+
+
+def test_key_stability():
+    defaults = {'house_type': 'Nhà phố', 'num_people': 2}
+    a = make_key({'num_people': 4, 'area_m2': 80.0, 'house_type': ' Chung cư '}, 'm@1', FINGERPRINT,
+                 defaults=defaults)
+    b = make_key({'house_type': 'Chung cư', 'area_m2': np.int64(80), 'num_people': np.float64(4.0)},
+                 'm@1', list(FINGERPRINT), days=30.0, defaults=defaults)
+    assert a == b and hash(a) == hash(b)
+    # None = dùng mặc định
+    assert normalize_params({'num_people': None}, defaults) == normalize_params({}, defaults)
+    # Model, lịch sử hoặc số ngày khác -> key khác
+    assert make_key({'num_people': 4}, 'm@2', FINGERPRINT) != make_key({'num_people': 4}, 'm@1', FINGERPRINT)
+    assert make_key({'num_people': 4}, 'm@1', (1441,)) != make_key({'num_people': 4}, 'm@1', FINGERPRINT)
+    assert make_key({'num_people': 4}, 'm@1', FINGERPRINT, days=7) != make_key({'num_people': 4}, 'm@1', FINGERPRINT)
+    # Tháng (hệ số mùa) khác -> key khác
+    assert make_key({'num_people': 4}, 'm@1', FINGERPRINT, month=6) != \
+        make_key({'num_people': 4}, 'm@1', FINGERPRINT, month=12)
+    assert make_key({}, 'm@1', FINGERPRINT, month=np.int64(6)) == make_key({}, 'm@1', FINGERPRINT, month=6.0)
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_entries=3)
+    for i in range(3):
+        cache.put(_key(num_ac=i), {'total_kwh': i})
+    assert cache.get(_key(num_ac=0)) == {'total_kwh': 0}  # 0 thành mới dùng nhất
+    cache.put(_key(num_ac=3), {'total_kwh': 3})
+    assert cache.get(_key(num_ac=1)) is None
+    assert cache.get(_key(num_ac=0)) == {'total_kwh': 0}
+    assert cache.get(_key(num_ac=3)) == {'total_kwh': 3}
+    stats = cache.stats()
+    assert stats['size'] == 3 and stats['evictions'] == 1 and stats['misses'] == 1
+
+    # Giá trị trả về là bản sao: sửa kết quả không làm hỏng cache
+    cache.get(_key(num_ac=3))['total_kwh'] = -1
+    assert cache.get(_key(num_ac=3)) == {'total_kwh': 3}
+
+
+def test_ttl():
+    assert PredictionCache().ttl is None
+    clock = [1000.0]
+    original = prediction_cache.time.time
+    prediction_cache.time.time = lambda: clock[0]
+    try:
+        cache = PredictionCache(ttl=60)
+        cache.put(_key(), {'total_kwh': 1})
+        clock[0] += 59
+        assert cache.get(_key()) == {'total_kwh': 1}
+        clock[0] += 2
+        assert cache.get(_key()) is None
+        assert cache.stats()['expired'] == 1
+
+        forever = PredictionCache(ttl=None)
+        forever.put(_key(), {'total_kwh': 1})
+        clock[0] += 10 ** 6
+        assert forever.get(_key()) == {'total_kwh': 1}
+    finally:
+        prediction_cache.time.time = original
+
+
+def test_disk_tier():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = PredictionCache(max_entries=4, disk_dir=tmp)
+        writer.put(_key(num_ac=1), {'total_kwh': 1})
+
+        # Instance khác (process khác) đọc được từ đĩa rồi giữ trong RAM
+        reader = PredictionCache(max_entries=4, disk_dir=tmp)
+        assert reader.get(_key(num_ac=1)) == {'total_kwh': 1}
+        assert reader.get(_key(num_ac=1)) == {'total_kwh': 1}
+        stats = reader.stats()
+        assert stats['disk_hits'] == 1 and stats['hits'] == 1
+
+        # Số file bị giới hạn, giữ các file mới nhất
+        for i in range(2, 8):
+            writer.put(_key(num_ac=i), {'total_kwh': i})
+            time.sleep(0.01)
+        assert len([f for f in os.listdir(tmp) if f.endswith('.pkl')]) == 4
+        fresh = PredictionCache(max_entries=4, disk_dir=tmp)
+        assert fresh.get(_key(num_ac=7)) == {'total_kwh': 7}
+        assert fresh.get(_key(num_ac=1)) is None
+
+        writer.clear()
+        assert [f for f in os.listdir(tmp) if f.endswith('.pkl')] == []
+        assert writer.get(_key(num_ac=7)) is None
+
+
+def test_invalidate_fingerprint():
+    with tempfile.TemporaryDirectory() as tmp:
+        other = (1440, '2025-01-02 00:00:00', '2025-01-02 23:59:00', 0.9, 1.1)
+        cache = PredictionCache(disk_dir=tmp)
+        cache.put(_key(num_ac=1), {'total_kwh': 1})
+        cache.put(_key(num_ac=2), {'total_kwh': 2})
+        cache.put(_key(other, num_ac=1), {'total_kwh': 3})
+
+        assert cache.invalidate(FINGERPRINT) == 2
+        assert cache.get(_key(num_ac=1)) is None
+        assert cache.get(_key(other, num_ac=1)) == {'total_kwh': 3}
+        # Tầng đĩa cũng đã xóa
+        assert PredictionCache(disk_dir=tmp).get(_key(num_ac=2)) is None
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST PREDICTION CACHE")
+    print("=" * 70)
+    test_key_stability()
+    print("✅ Equivalent forms share a key")
+    test_lru_eviction()
+    print("✅ LRU eviction")
+    test_ttl()
+    print("✅ Optional TTL expiry")
+    test_disk_tier()
+    print("✅ Disk tier shared across instances and bounded")
+    test_invalidate_fingerprint()
+    print("✅ Invalidation by history fingerprint")
@@ -0,0 +1,301 @@
+"""
+Test Predictor (batch / what-if)
+- scenario_sweep dùng lại baseline đã tính: không chạy lại dự báo đệ quy
+- Mỗi dòng của sweep khớp predict_user_consumption với cùng tham số
+- calculate_evn_bill_array khớp calculate_evn_bill (scalar) ở mọi bậc giá
+- Đề xuất giờ cao điểm chỉ dựa trên lịch sử của chính người dùng (không lấy profile
+  của lần gọi trước)
+- Cache kết quả theo tháng: sang tháng khác (hệ số mùa khác) thì không trả kết quả cũ
+- Fingerprint ổn định khi giá trị đầu/cuối là NaN (cache vẫn hit); profile cache
+  an toàn khi nhiều session cùng dùng một predictor
+- predict_next_24h với history_df (model thật): dự báo có hình dạng theo giờ,
+  không phải hằng số như khi các cột đo lường/rolling bị điền 0
+- predict_horizon luôn trả đúng `hours` giá trị, kể cả khi model lỗi
+- predict_many: từng dòng khớp predict_user_consumption với cùng tham số
+- Lazy load: nhiều thread cùng gọi lần đầu thì model chỉ được load một lần
+"""
+
+import sys
+import os
+import time
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from src.backend import predictor as predictor_module
+from src.backend.predictor import EnergyPredictor
+from src.backend.logic_engine import calculate_evn_bill, calculate_evn_bill_array
+from src.backend.prediction_cache import PredictionCache
+from src.backend.demo_data import generate_demo
+
+MODEL_PATH = 'checkpoints/best_model_lightgbm.pkl'
+RESULT_COLUMNS = ['total_kwh', 'lower_bound', 'upper_bound', 'confidence', 'daily_avg_kwh',
+                  'device_kwh', 'baseline_kwh']
+
+
+def _history(n=1440, seed=0):
+    index = pd.date_range('2025-01-01', periods=n, freq='min')
+    rng = np.random.default_rng(seed)
+    power = 1.0 + np.exp(-((index.hour - 19) ** 2) / 8) + rng.normal(0, 0.1, n)
+    return pd.DataFrame({'Global_active_power': np.clip(power, 0.3, 5.0), 'hour': index.hour}, index=index)
+
+
+def _counting_predictor():
+    """Predictor với model thật, đếm số lần chạy dự báo đệ quy"""
+    predictor = EnergyPredictor(MODEL_PATH, cache=PredictionCache(disk_dir=None))
+    calls = []
+    forecast = predictor.forecast_recursive
+
+    def counted(*args, **kwargs):
+        calls.append(kwargs.get('hours'))
+        return forecast(*args, **kwargs)
+
+    predictor.forecast_recursive = counted
+    return predictor, calls
+
+
+def test_sweep_reuses_baseline():
+    history = _history()
+    predictor, calls = _counting_predictor()
+    user_params = {'num_people': 4, 'area_m2': 80, 'num_ac': 2, 'num_water_heater': 1}
+    grid = {'num_ac': [0, 1, 2, 3], 'house_type': ['Chung cư', 'Nhà phố', 'Biệt thự']}
+
+    result = predictor.predict_user_consumption(history, user_params, days=7, use_cache=False)
+    n_calls = len(calls)
+    reused = predictor.scenario_sweep(history, grid, base_params=user_params, days=7,
+                                      baseline_monthly=result['baseline_kwh'])
+    assert len(calls) == n_calls, "scenario_sweep chạy lại dự báo đệ quy"
+
+    fresh = predictor.scenario_sweep(history, grid, base_params=user_params, days=7)
+    assert len(calls) == n_calls + 1
+    pd.testing.assert_frame_equal(reused, fresh)
+
+    # Từng kịch bản khớp bản scalar
+    for (num_ac, house_type), row in reused.iterrows():
+        params = {**predictor.USER_PARAM_DEFAULTS, **user_params, 'num_ac': num_ac, 'house_type': house_type}
+        expected = predictor.predict_user_consumption(history, params, days=7, use_cache=False)
+        for column in RESULT_COLUMNS:
+            assert np.isclose(row[column], expected[column]), (num_ac, house_type, column)
+        assert row['cost'] == calculate_evn_bill(expected['total_kwh'])[0]
+
+
+def test_evn_bill_array_matches_scalar():
+    # Biên từng bậc (50, 100, 200, 300, 400) và giá trị lẻ
+    kwh = np.array([0, 0.4, 49.99, 50, 50.01, 99.5, 100, 150, 200, 200.3, 299.99, 300,
+                    350, 400, 400.01, 523.7, 1000, 2500.25])
+    expected = [calculate_evn_bill(value)[0] for value in kwh]
+    np.testing.assert_array_equal(calculate_evn_bill_array(kwh), expected)
+    # Giữ nguyên shape (cube của scenario_cube)
+    assert calculate_evn_bill_array(kwh.reshape(3, 6)).shape == (3, 6)
+
+
+def test_recommendations_use_own_profile():
+    predictor, _ = _counting_predictor()
+    user_params = {'num_people': 4, 'area_m2': 80, 'num_ac': 2, 'num_water_heater': 1}
+    history = _history()
+    result = predictor.predict_user_consumption(history, user_params, days=7, use_cache=False)
+    assert result['peak_hours']
+    without_peaks = {k: v for k, v in result.items() if k != 'peak_hours'}
+
+    def has_peak_advice(recommendations):
+        return any(r['device'].startswith('⏰') for r in recommendations)
+
+    # Profile của người dùng trước đó đã nằm trong predictor nhưng không được dùng
+    assert not has_peak_advice(predictor.get_saving_recommendations(without_peaks, user_params))
+    flat = _history(seed=1)
+    flat['Global_active_power'] = 1.0
+    assert not has_peak_advice(predictor.get_saving_recommendations(without_peaks, user_params, flat))
+    assert has_peak_advice(predictor.get_saving_recommendations(without_peaks, user_params, history))
+    assert has_peak_advice(predictor.get_saving_recommendations(result, user_params))
+
+
+def test_cache_misses_when_month_changes():
+    history = _history()
+    predictor, calls = _counting_predictor()
+    user_params = {'num_people': 4, 'num_ac': 2}
+    today = [datetime(2025, 6, 15, 12, 0)]
+
+    class FixedClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return today[0]
+
+    original = predictor_module.datetime
+    predictor_module.datetime = FixedClock
+    try:
+        june = predictor.predict_user_consumption(history, user_params, days=2)
+        assert june['adjustment_details']['season'] == 'summer'
+        assert predictor.predict_user_consumption(history, user_params, days=2) == june
+        n_calls = len(calls)
+
+        today[0] = datetime(2025, 12, 15, 12, 0)
+        december = predictor.predict_user_consumption(history, user_params, days=2)
+        assert len(calls) == n_calls + 1
+        assert december['adjustment_details']['season'] == 'winter'
+        assert december['device_kwh'] < june['device_kwh']
+        stats = predictor.cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 2
+    finally:
+        predictor_module.datetime = original
+
+    # Tháng truyền tường minh cũng là một phần của key
+    assert predictor.predict_user_consumption(history, user_params, days=2, current_month=6) == june
+
+
+def test_nan_edge_fingerprint_hits_cache():
+    history = _history()
+    history.iloc[0, 0] = np.nan
+    history.iloc[-1, 0] = np.nan
+    fingerprint = EnergyPredictor.history_fingerprint(history)
+    assert fingerprint == EnergyPredictor.history_fingerprint(history.copy())
+    assert fingerprint[3] is None and fingerprint[4] is None
+
+    predictor, calls = _counting_predictor()
+    user_params = {'num_people': 4, 'num_ac': 1}
+    first = predictor.predict_user_consumption(history, user_params, days=2)
+    n_calls = len(calls)
+    assert predictor.predict_user_consumption(history.copy(), user_params, days=2) == first
+    assert len(calls) == n_calls
+    assert predictor.cache.stats()['hits'] == 1
+    assert len(predictor._profile_cache) == 1
+
+
+def test_profile_cache_concurrent_access():
+    predictor = EnergyPredictor(MODEL_PATH, cache=PredictionCache(disk_dir=None))
+    windows = [_history(n=240, seed=seed) for seed in range(predictor.PROFILE_CACHE_SIZE * 2)]
+    expected = [tuple(predictor._extract_hourly_pattern(w)) for w in windows]
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                j = (i + offset) % len(windows)
+                assert predictor.get_hourly_profile(windows[j])['shape'] == expected[j]
+                if i % 50 == 0:
+                    predictor.invalidate_profile_cache()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(predictor._profile_cache) <= predictor.PROFILE_CACHE_SIZE
+
+
+def test_next_24h_uses_history_features():
+    predictor = EnergyPredictor(MODEL_PATH, cache=PredictionCache(disk_dir=None))
+    history = generate_demo(last='2D')
+    last_24 = history['Global_active_power'].values[-24:]
+
+    forecast = predictor.predict_next_24h(last_24, history_df=history)
+    assert forecast.shape == (24,)
+    assert np.ptp(forecast) > 0.5, forecast
+    assert (forecast > 0.1).all()
+    # Cùng đường dự báo đệ quy, gốc mặc định là cuối lịch sử
+    np.testing.assert_allclose(forecast, predictor.forecast_recursive(history, hours=24))
+    start = history.index[-1]
+    np.testing.assert_allclose(predictor.predict_next_24h(last_24, history_df=history, start_time=start), forecast)
+
+    # Không có lịch sử: đặc trưng đo lường/rolling = 0 -> gần như hằng số
+    assert np.ptp(predictor.predict_next_24h(last_24)) < np.ptp(forecast)
+
+
+def test_predict_horizon_fallback_length():
+    predictor, _ = _counting_predictor()
+    last_sequence = np.linspace(0.5, 2.0, 60)
+    start = pd.Timestamp('2025-01-02 00:00')
+    assert len(predictor.predict_horizon(last_sequence, hours=48, start_time=start)) == 48
+
+    def broken(X):
+        raise RuntimeError("model lỗi")
+
+    predictor._model_predict = broken
+    for hours in [1, 24, 72]:
+        fallback = predictor.predict_horizon(last_sequence, hours=hours, start_time=start)
+        assert fallback.shape == (hours,)
+        assert np.allclose(fallback, last_sequence.mean())
+
+
+def test_predict_many_matches_scalar():
+    history = _history()
+    predictor, calls = _counting_predictor()
+    params_frame = pd.DataFrame([
+        {'num_people': 1, 'area_m2': 30, 'house_type': 'Chung cư', 'num_ac': 0},
+        {'num_people': 4, 'area_m2': 80, 'house_type': 'Nhà phố', 'num_ac': 2, 'num_water_heater': 1},
+        {'num_people': 6, 'area_m2': 250, 'house_type': 'Biệt thự', 'num_ac': 5, 'num_tv': 3, 'num_washer': 1},
+        {'num_people': 3, 'area_m2': 60, 'house_type': 'Nhà phố', 'num_fridge': 2},
+    ], index=['a', 'b', 'c', 'd'])
+    batch = predictor.predict_many(history, params_frame, days=7)
+    assert len(calls) == 1, "predict_many phải chạy dự báo đệ quy đúng một lần"
+    assert list(batch.index) == list(params_frame.index)
+
+    for name, row in params_frame.iterrows():
+        params = {k: v for k, v in row.items() if pd.notna(v)}
+        expected = predictor.predict_user_consumption(history, params, days=7, use_cache=False)
+        for column in RESULT_COLUMNS:
+            assert np.isclose(batch.loc[name, column], expected[column]), (name, column)
+        for device_name, kwh in expected['adjustment_details']['device_kwh'].items():
+            assert np.isclose(batch.loc[name, f'kwh_{device_name}'], kwh), (name, device_name)
+    assert batch.attrs['peak_hours'] == expected['peak_hours']
+
+
+def test_lazy_load_once_under_concurrency():
+    loads = []
+
+    class SlowLoading(EnergyPredictor):
+        def _load_package(self):
+            loads.append(threading.get_ident())
+            time.sleep(0.2)  # đủ lâu để các thread khác cùng chờ
+            super()._load_package()
+
+    predictor = SlowLoading(MODEL_PATH, cache=PredictionCache(disk_dir=None))
+    assert not predictor._loaded and loads == []
+
+    barrier = threading.Barrier(8)
+    models = []
+
+    def worker():
+        barrier.wait()
+        models.append(predictor.model)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(models) == 8 and all(model is models[0] for model in models)
+    assert models[0] is not None and predictor.feature_names
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST PREDICTOR")
+    print("=" * 70)
+    test_sweep_reuses_baseline()
+    print("✅ scenario_sweep reuses the computed baseline and matches per-row predictions")
+    test_evn_bill_array_matches_scalar()
+    print("✅ Vectorized EVN bill matches scalar tariff")
+    test_recommendations_use_own_profile()
+    print("✅ Peak-hour advice only uses the caller's own history")
+    test_cache_misses_when_month_changes()
+    print("✅ Cached predictions are keyed by month")
+    test_nan_edge_fingerprint_hits_cache()
+    print("✅ NaN at the window edges still gives a stable cache key")
+    test_profile_cache_concurrent_access()
+    print("✅ Hourly profile cache is safe under concurrent sessions")
+    test_next_24h_uses_history_features()
+    print("✅ 24h forecast with history is not constant")
+    test_predict_horizon_fallback_length()
+    print("✅ predict_horizon fallback has the requested length")
+    test_predict_many_matches_scalar()
+    print("✅ predict_many matches predict_user_consumption row by row")
+    test_lazy_load_once_under_concurrency()
+    print("✅ Lazy model load runs once under concurrent first calls")
@@ -0,0 +1,79 @@
+"""
+Test Prepared Data Cache
+- Ghi rồi đọc lại: giá trị giữ nguyên, mảng là memmap chỉ đọc (không copy vào RAM)
+- Key đổi khi nội dung file hoặc cấu hình đổi, không đổi khi chỉ touch file
+- Giữ tối đa MAX_ENTRIES entry
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from src.models.prepared_cache import prepared_key, load_prepared, save_prepared, MAX_ENTRIES
+
+
+def _arrays(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    scaler = StandardScaler().fit(X[:800])
+    return {
+        'X': X,
+        'X_scaled': scaler.transform(X),
+        'y': rng.normal(size=n),
+        'datetime': pd.date_range('2007-01-01', periods=n, freq='min').values
+    }, scaler
+
+
+def test_roundtrip_memmap():
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "cleaned.csv")
+        with open(data, 'w') as f:
+            f.write("Datetime,a\n2007-01-01 00:00:00,1\n")
+        cache_dir = os.path.join(tmp, "cache")
+        key = prepared_key(data, test_size=0.2)
+        assert load_prepared(key, cache_dir) is None
+
+        arrays, scaler = _arrays()
+        save_prepared(key, arrays, scaler, {'feature_names': ['a', 'b', 'c', 'd'], 'split_idx': 800}, cache_dir)
+        loaded, loaded_scaler, meta = load_prepared(key, cache_dir)
+        for name, value in arrays.items():
+            assert isinstance(loaded[name], np.memmap) and not loaded[name].flags.writeable
+            np.testing.assert_array_equal(loaded[name], value)
+        np.testing.assert_array_equal(loaded_scaler.mean_, scaler.mean_)
+        assert meta['split_idx'] == 800
+
+        # touch không đổi key, đổi nội dung hoặc cấu hình thì đổi key
+        os.utime(data, (time.time() + 10, time.time() + 10))
+        assert prepared_key(data, test_size=0.2) == key
+        assert prepared_key(data, test_size=0.3) != key
+        with open(data, 'a') as f:
+            f.write("2007-01-01 00:01:00,2\n")
+        assert prepared_key(data, test_size=0.2) != key
+
+
+def test_prune_keeps_recent_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        arrays, scaler = _arrays(n=50)
+        for i in range(MAX_ENTRIES + 2):
+            save_prepared(f"key{i}", arrays, scaler, {'split_idx': 40}, tmp)
+            os.utime(os.path.join(tmp, f"key{i}"), (i, i))
+        entries = sorted(os.listdir(tmp))
+        assert len(entries) == MAX_ENTRIES
+        assert f"key{MAX_ENTRIES + 1}" in entries
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST PREPARED DATA CACHE")
+    print("=" * 70)
+    test_roundtrip_memmap()
+    print("✅ Memmap roundtrip and content-hash keys")
+    test_prune_keeps_recent_entries()
+    print("✅ Old entries pruned")
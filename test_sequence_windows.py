@@ -0,0 +1,82 @@
+"""
+Test Sequence Windows
+- Cửa sổ stride phải trùng với create_sequences kiểu vòng lặp cũ
+- Không copy: cửa sổ là view trên mảng gốc, chỉ batch được copy
+- Lookback 1440 phút trên 1.6 triệu dòng vẫn tạo được (không vật chất hóa)
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+
+from src.backend.sequence_windows import sliding_windows, WindowBatches
+
+
+def _loop_sequences(X, y, seq_length):
+    """create_sequences cũ (vòng lặp Python + np.array)"""
+    X_seq, y_seq = [], []
+    for i in range(len(X) - seq_length):
+        X_seq.append(X[i:i + seq_length])
+        y_seq.append(y[i + seq_length])
+    return np.array(X_seq), np.array(y_seq)
+
+
+def test_windows_match_loop():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 7)).astype(np.float32)
+    y = rng.normal(size=500).astype(np.float32)
+    for seq_length in [1, 10, 60]:
+        expected_X, expected_y = _loop_sequences(X, y, seq_length)
+        windows = sliding_windows(X, seq_length)
+        assert np.shares_memory(windows, X)
+        np.testing.assert_array_equal(windows, expected_X)
+
+        batches = WindowBatches(X, y, seq_length, batch_size=64)
+        got_X = np.concatenate([bx for bx, _ in batches])
+        got_y = np.concatenate([by for _, by in batches])
+        np.testing.assert_array_equal(got_X, expected_X)
+        np.testing.assert_array_equal(got_y, expected_y)
+
+
+def test_subset_and_shuffle():
+    X = np.arange(300 * 3, dtype=np.float32).reshape(300, 3)
+    y = np.arange(300, dtype=np.float32)
+    batches = WindowBatches(X, y, 20, batch_size=32)
+    train = batches.subset(0, 200, shuffle=True)
+    val = batches.subset(200, 280)
+    assert np.shares_memory(train.windows, val.windows)
+
+    seen = np.concatenate([by for _, by in train])
+    assert sorted(seen) == list(y[20:220])            # mỗi cửa sổ đúng một lần
+    for bx, by in train:
+        np.testing.assert_array_equal(bx[:, -1, 0] / 3 + 1, by)   # target = dòng ngay sau cửa sổ
+    first = train[0][1].copy()
+    train.on_epoch_end()
+    assert not np.array_equal(first, train[0][1])     # thứ tự đổi mỗi epoch
+    np.testing.assert_array_equal(val.target_values(), y[220:300])
+
+
+def test_day_lookback_fits_in_memory():
+    # 1.6M x 13 float32 ≈ 83 MB; bản copy đầy đủ với seq_length=1440 sẽ là ~120 GB
+    X = np.zeros((1_600_000, 13), dtype=np.float32)
+    y = np.zeros(1_600_000, dtype=np.float32)
+    batches = WindowBatches(X, y, 1440, batch_size=64)
+    assert batches.windows.shape == (1_600_000 - 1440, 1440, 13)
+    assert np.shares_memory(batches.windows, batches.X)
+    bx, by = batches[len(batches) - 1]
+    assert bx.shape[1:] == (1440, 13) and len(bx) == len(by)
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("🧪 TEST SEQUENCE WINDOWS")
+    print("=" * 70)
+    test_windows_match_loop()
+    print("✅ Stride windows match loop-based create_sequences")
+    test_subset_and_shuffle()
+    print("✅ Train/val subsets share memory, shuffle per epoch")
+    test_day_lookback_fits_in_memory()
+    print("✅ 1440-minute lookback on 1.6M rows without materializing")
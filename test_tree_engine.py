@@ -0,0 +1,142 @@
+"""
+Test Compiled Tree Engine
+- Parity: kết quả NumPy engine phải trùng với model gốc (LightGBM / RandomForest)
+- Bản compile cạnh checkpoint phải có và khớp hash .pkl; bản cũ (hash lệch) không được phục vụ
+- Latency: so sánh thời gian dự báo theo batch size 1 → 10,000
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import numpy as np
+import joblib
+from sklearn.ensemble import RandomForestRegressor
+
+from src.backend.tree_engine import (
+    CompiledTreeEnsemble, flatten_model, compiled_path_for, export_from_checkpoint, file_sha256
+)
+from src.backend.predictor import EnergyPredictor
+from src.backend.prediction_cache import PredictionCache
+
+MODEL_PATH = 'checkpoints/best_model_lightgbm.pkl'
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def _load_package():
+    package = joblib.load(MODEL_PATH)
+    arrays = flatten_model(package['model'])
+    arrays['scaler_mean'] = package['scaler'].mean_
+    arrays['scaler_scale'] = package['scaler'].scale_
+    return package, CompiledTreeEnsemble(arrays)
+
+
+def _sample_inputs(package, n, seed=0):
+    """Sinh input quanh phân phối train (mean ± k*std của scaler)"""
+    rng = np.random.default_rng(seed)
+    scaler = package['scaler']
+    return scaler.mean_ + rng.normal(size=(n, len(scaler.mean_))) * scaler.scale_
+
+
+def _reference_predict(package, X):
+    return package['model'].predict(package['scaler'].transform(X))
+
+
+def test_lightgbm_parity():
+    """Engine phải cho kết quả giống LightGBM (kể cả khi có NaN)"""
+    package, engine = _load_package()
+    X = _sample_inputs(package, 5000)
+    assert np.allclose(engine.predict(X), _reference_predict(package, X), atol=1e-9)
+
+    X[::3, 2] = np.nan
+    assert np.allclose(engine.predict(X), _reference_predict(package, X), atol=1e-9)
+
+
+def test_random_forest_parity():
+    """Engine phải cho kết quả giống RandomForestRegressor"""
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(3000, 8))
+    y = X[:, 0] * 2 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=3000)
+    rf = RandomForestRegressor(n_estimators=20, max_depth=10, random_state=42).fit(X, y)
+
+    engine = CompiledTreeEnsemble(flatten_model(rf))
+    X_test = rng.normal(size=(2000, 8))
+    assert np.allclose(engine.predict(X_test), rf.predict(X_test), atol=1e-9)
+
+
+def test_compiled_checkpoint_matches_package():
+    """File .trees.pkl cạnh checkpoint phải khớp với package .pkl"""
+    compiled_path = compiled_path_for(MODEL_PATH)
+    assert os.path.exists(compiled_path), f"Thiếu {compiled_path}: python -m src.backend.tree_engine"
+    package = joblib.load(MODEL_PATH)
+    engine = CompiledTreeEnsemble.load(compiled_path)
+    assert engine.source_sha256 == file_sha256(MODEL_PATH)
+    X = _sample_inputs(package, 1000, seed=2)
+    assert np.allclose(engine.predict(X), _reference_predict(package, X), atol=1e-9)
+
+
+def test_stale_compiled_falls_back_to_package():
+    """Thay .pkl mà không export lại -> predictor dùng package gốc và đổi model_version"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = os.path.join(tmp, "model.pkl")
+        package = joblib.load(MODEL_PATH)
+        joblib.dump(package, model_path)
+        export_from_checkpoint(model_path)
+
+        fresh = EnergyPredictor(model_path, cache=PredictionCache(disk_dir=None))
+        assert isinstance(fresh.model, CompiledTreeEnsemble)
+
+        # Train lại (ở đây: package khác nội dung) nhưng export bị bỏ qua
+        package['timestamp'] = 'retrained'
+        joblib.dump(package, model_path)
+        stale = EnergyPredictor(model_path, cache=PredictionCache(disk_dir=None))
+        assert not isinstance(stale.model, CompiledTreeEnsemble)
+        assert stale.model is not None and stale.feature_names == list(package['feature_names'])
+
+        # Export lại -> bản compile được dùng và model_version đổi theo file .trees.pkl
+        version = stale.model_version
+        os.utime(compiled_path_for(model_path), ns=(0, 0))
+        assert stale.model_version != version
+        export_from_checkpoint(model_path)
+        assert isinstance(EnergyPredictor(model_path, cache=None).model, CompiledTreeEnsemble)
+
+
+def benchmark_latency(repeats=20):
+    """In bảng latency (ms/lần) của model gốc và engine NumPy theo batch size"""
+    package, engine = _load_package()
+    X = _sample_inputs(package, max(BATCH_SIZES))
+
+    print(f"\n{'Batch':>8} | {'Library (ms)':>13} | {'Compiled (ms)':>13} | {'Speedup':>8}")
+    print("-" * 52)
+    for n in BATCH_SIZES:
+        X_batch = X[:n]
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            _reference_predict(package, X_batch)
+        lib_ms = (time.perf_counter() - start) / repeats * 1000
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            engine.predict(X_batch)
+        compiled_ms = (time.perf_counter() - start) / repeats * 1000
+
+        print(f"{n:>8} | {lib_ms:>13.3f} | {compiled_ms:>13.3f} | {lib_ms / compiled_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("🧪 TEST COMPILED TREE ENGINE")
+    print("="*70)
+
+    for test in [test_lightgbm_parity, test_random_forest_parity, test_compiled_checkpoint_matches_package,
+                 test_stale_compiled_falls_back_to_package]:
+        test()
+        print(f"✅ {test.__name__}: PASSED")
+
+    print("\n⏱️ Latency comparison:")
+    benchmark_latency()
+    print("\n" + "="*70)